@@ -1,69 +1,109 @@
 # rag_cli.py
 # ---------------------------------------
-# 🔑 Replace YOUR_API_KEY_HERE below with your actual OpenAI API key
-#OPENAI_API_KEY = ""
+# 🔑 OPENAI_API_KEY is read from the environment (or .env)
 # rag_cli.py
 # ---------------------------------------
 
-from openai import OpenAI
-from pathlib import Path
+import os
+from contextlib import nullcontext
+from openai import NotFoundError, OpenAI
+
+import psycopg2
+
+from config import (
+    DB_SETTINGS, EMBEDDING_MODEL, EMBEDDING_PROVIDER, NUMPY_INDEX_PATH, RETRIEVAL_BACKEND, RETRIEVAL_MODE,
+    RETRIEVAL_TOP_K, VECTOR_MANIFEST_PATH, VECTOR_STORE_NAME,
+)
+from bulk_upload import BulkUploader, expand_paths, print_progress
+from embeddings import make_embedder
+from retrieval import PgVectorRetriever, build_messages, chapter_filter, check_backend, parse_chapter
+from vector_manifest import VectorManifest, resolve_store_id, sync_store_files
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 MODEL = "gpt-4o-mini"
-VECTOR_STORE_NAME = "vector1"  # use only this store
 
 # initialize client
 client = OpenAI(api_key=OPENAI_API_KEY)
 
-def get_vector_store_by_name(name: str):
-    """Find a vector store by name (does NOT create new ones)."""
-    cursor = None
-    while True:
-        page = client.vector_stores.list(after=cursor) if cursor else client.vector_stores.list()
-        for vs in page.data:
-            if vs.name == name:
-                return vs
-        if not page.has_more:
-            break
-        cursor = page.last_id
-    return None
-
-store = get_vector_store_by_name(VECTOR_STORE_NAME)
-if not store:
-    print(f"❌ Vector store '{VECTOR_STORE_NAME}' not found. Exiting.")
-    raise SystemExit
-
-def list_files_in_store(store_id: str):
-    """List all files in the given store."""
-    out = []
-    cursor = None
-    while True:
-        page = client.vector_stores.files.list(vector_store_id=store_id, after=cursor) if cursor \
-               else client.vector_stores.files.list(vector_store_id=store_id)
-        out.extend(page.data)
-        if not page.has_more:
-            break
-        cursor = page.last_id
-    return out
-
-def attach_local_file(store_id: str, path: str):
-    """Attach a local file to the store."""
-    p = Path(path)
-    if not p.exists():
-        print(f"❌ File not found: {path}")
+_manifest = None
+_store_id = None
+
+def get_manifest() -> VectorManifest:
+    global _manifest
+    if _manifest is None:
+        _manifest = VectorManifest(VECTOR_MANIFEST_PATH)
+    return _manifest
+
+def get_store_id(refresh: bool = False):
+    """Id of VECTOR_STORE_NAME, from the manifest unless ``refresh`` (does NOT create stores)."""
+    global _store_id
+    if _store_id is None or refresh:
+        _store_id = resolve_store_id(client, get_manifest(), VECTOR_STORE_NAME, refresh=refresh)
+    return _store_id
+
+def with_store(fn):
+    """Call ``fn(store_id)``; a cached id the API no longer knows is looked up again once."""
+    if not get_store_id():
+        print(f"❌ Vector store '{VECTOR_STORE_NAME}' not found.")
+        return None
+    try:
+        return fn(get_store_id())
+    except NotFoundError:
+        store_id = get_store_id(refresh=True)
+        if not store_id:
+            raise
+        return fn(store_id)
+
+def list_files_in_store(store_id: str, full: bool = False):
+    """List the files in the given store, syncing the manifest first."""
+    sync_store_files(client, get_manifest(), store_id, full=full)
+    return get_manifest().files(store_id)
+
+def attach_local_files(store_id: str, spec: str):
+    """Upload and attach the files, directories or globs in ``spec``."""
+    paths = expand_paths(spec)
+    if not paths:
+        print(f"❌ No files match: {spec}")
         return
-    f = client.files.create(file=open(p, "rb"), purpose="assistants")
-    client.vector_stores.files.create(vector_store_id=store_id, file_id=f.id)
-    print(f"✅ Attached {p.name} to '{VECTOR_STORE_NAME}'.")
-
-def ask(store_id: str, question: str, chapter: str | None):
-    """Send a retrieval-augmented query."""
-    prefix = f"Only use content from Chapter {chapter}. " if chapter else ""
-    prompt = prefix + question
-    resp = client.responses.create(
-        model=MODEL,
-        input=prompt,
-        tools=[{"type": "file_search", "vector_store_ids": [store_id]}],
-    )
+    # Pick up files attached elsewhere so their hashes count as duplicates.
+    sync_store_files(client, get_manifest(), store_id)
+    stats = BulkUploader(client, get_manifest(), store_id, progress=print_progress).run(paths)
+    print(f"\n✅ {stats.summary()} ('{VECTOR_STORE_NAME}').")
+
+_retriever = None
+
+def get_retriever():
+    """Local retriever (pgvector, or the offline NumPy index), opened on first use."""
+    global _retriever
+    if _retriever is None:
+        embedder = make_embedder(EMBEDDING_PROVIDER, client, EMBEDDING_MODEL)
+        if RETRIEVAL_BACKEND == "numpy":
+            from numpy_index import NumpyRetriever
+
+            _retriever = NumpyRetriever(NUMPY_INDEX_PATH, embedder)
+        else:
+            conn = psycopg2.connect(**DB_SETTINGS)
+            _retriever = PgVectorRetriever(embedder, connect=lambda: nullcontext(conn), mode=RETRIEVAL_MODE)
+    return _retriever
+
+def ask(store_id: str | None, question: str, chapter: int | None):
+    """Send a retrieval-augmented query, searching only ``chapter`` when set."""
+    if RETRIEVAL_BACKEND in ("local", "numpy"):
+        chunks = get_retriever().search(question, k=RETRIEVAL_TOP_K, chapter=chapter)
+        resp = client.responses.create(
+            model=MODEL,
+            input=build_messages(question, chunks),
+        )
+    else:
+        tool = {"type": "file_search", "vector_store_ids": [store_id]}
+        if chapter is not None:
+            tool["filters"] = chapter_filter(chapter)
+        resp = client.responses.create(
+            model=MODEL,
+            input=question,
+            tools=[tool],
+        )
     print("\n--- Answer ---")
     print(resp.output_text.strip())
     print("--------------\n")
@@ -71,9 +111,10 @@ def ask(store_id: str, question: str, chapter: str | None):
 def help_text():
     print(
 """Commands:
-/chapter <num|name>   – Set a chapter scope (use /chapter off to clear)
-/list                 – List files in the vector store
-/add <path>           – Upload and attach a local file
+/chapter <num>        – Only search one chapter (use /chapter off to clear)
+/list                 – List files in the vector store (syncs new files)
+/refresh              – Re-resolve the store and resync its full file list
+/add <path|dir|glob>  – Upload and attach files (ones already stored are skipped)
 /help                 – Show help
 /quit                 – Exit program
 Just type your question to ask the model.
@@ -81,8 +122,18 @@ Just type your question to ask the model.
     )
 
 def main():
+    check_backend(RETRIEVAL_BACKEND)
     chapter = None
-    print(f"\n✅ Connected to vector store '{VECTOR_STORE_NAME}' ({store.id})")
+    if RETRIEVAL_BACKEND == "remote":
+        store_id = get_store_id()
+        if not store_id:
+            print(f"❌ Vector store '{VECTOR_STORE_NAME}' not found. Exiting.")
+            raise SystemExit
+        print(f"\n✅ Connected to vector store '{VECTOR_STORE_NAME}' ({store_id})")
+    elif RETRIEVAL_BACKEND == "numpy":
+        print(f"\n✅ Searching the local index at {NUMPY_INDEX_PATH}")
+    else:
+        print(f"\n✅ Searching the local index in database '{DB_SETTINGS['dbname']}'")
     print("💬 Type /help for available commands.\n")
 
     while True:
@@ -109,26 +160,39 @@ def main():
                 if arg.lower() in ("", "off", "none"):
                     chapter = None
                     print("🔹 Chapter scope cleared.")
+                elif parse_chapter(arg) is None:
+                    print("Usage: /chapter <number>, e.g. /chapter 3")
                 else:
-                    chapter = arg
+                    chapter = parse_chapter(arg)
                     print(f"🔹 Chapter scope set to: {chapter}")
-            elif cmd == "/list":
-                files = list_files_in_store(store.id)
+                    if RETRIEVAL_BACKEND in ("local", "numpy") and chapter not in get_retriever().chapters():
+                        print(f"⚠️ No indexed material for chapter {chapter} yet.")
+            elif cmd in ("/list", "/refresh"):
+                full = cmd == "/refresh"
+                if full and not get_store_id(refresh=True):
+                    print(f"❌ Vector store '{VECTOR_STORE_NAME}' not found.")
+                    continue
+                files = with_store(lambda sid: list_files_in_store(sid, full=full))
+                if files is None:
+                    continue
                 if not files:
                     print("No files in store.")
                 else:
                     for f in files:
-                        print(f"- {f.id}  name={getattr(f,'file','?')}")
+                        print(f"- {f.id}  status={f.status or '?'}")
             elif cmd == "/add":
                 if not arg:
-                    print("Usage: /add <path-to-file>")
+                    print("Usage: /add <file|directory|glob> ...")
                 else:
-                    attach_local_file(store.id, arg)
+                    with_store(lambda sid: attach_local_files(sid, arg))
             else:
                 print("Unknown command. Try /help.")
             continue
 
-        ask(store.id, line, chapter)
+        if RETRIEVAL_BACKEND == "remote":
+            with_store(lambda sid: ask(sid, line, chapter))
+        else:
+            ask(None, line, chapter)  # the hosted store is only needed for /list and /add
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,251 @@
+"""HTTP API over service.CourseHelperService.
+
+    uvicorn api:app --workers 4 --port 8000
+
+Each worker process builds its own service on startup. Endpoints:
+
+    GET  /health
+    GET  /chapters                        {"chapters": [1, 2, ...]}
+    GET  /chapters/{chapter}/flashcards   {"chapter": 1, "cards": [{"id", "question", "answer"}]}
+    GET  /flashcards/search?q&chapter?    {"cards": [...]}, best full-text match first
+    POST /grade    {"card_id", "answer"}  {"correct", "method", "confidence", "feedback"}
+    POST /chat     {"question", "history"?, "summary"?, "conversation_id"?, "chapter"?}
+    GET  /metrics                         Prometheus text of the worker that answers
+
+``/chat`` answers with server-sent events: one ``meta`` event naming the
+answer's source ("syllabus", "fallback", "cache" or "llm"), ``delta`` events
+with the text as it is generated, and a final ``done`` event carrying the full
+text, time to first token, prompt tokens and the updated rolling summary. The
+API keeps no conversation state: clients send the earlier messages as
+``history`` and the ``summary`` from the previous ``done`` event; with a
+``conversation_id`` both turns are also stored (see chat_store.py). A
+``chapter`` scopes the question to that chapter.
+
+Metrics live in each worker process, so with several workers ``/metrics``
+only shows whichever one took the request. Set METRICS_PORT to have every
+worker serve its own registry on the first free port from METRICS_PORT
+(up to METRICS_WORKER_PORTS of them), and scrape each of those ports.
+"""
+
+import json
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from config import METRICS_PORT
+from conversation import RollingSummary
+from service import SOURCE_LLM, CardNotFound, build_service
+from streaming import StreamResult, record_ttft
+from telemetry import REGISTRY, new_trace, span, start_metrics_server
+from transcript import now_in_app_tz
+
+METRICS_WORKER_PORTS = 16  # ports tried from METRICS_PORT, one per worker
+
+
+class BadRequest(Exception):
+    pass
+
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def read_json(request: Request) -> dict:
+    try:
+        body = await request.json()
+    except ValueError:
+        raise BadRequest("body must be JSON")
+    if not isinstance(body, dict):
+        raise BadRequest("body must be a JSON object")
+    return body
+
+
+def parse_history(raw) -> list:
+    if raw is None:
+        return []
+    if not isinstance(raw, list) or not all(
+        isinstance(m, dict) and m.get("role") in ("user", "assistant") and isinstance(m.get("content"), str)
+        for m in raw
+    ):
+        raise BadRequest("history must be a list of {role: user|assistant, content}")
+    return [{"role": m["role"], "content": m["content"]} for m in raw]
+
+
+def parse_summary(raw) -> RollingSummary:
+    if raw is None:
+        return RollingSummary()
+    try:
+        return RollingSummary(str(raw.get("text", "")), int(raw.get("covered", 0)))
+    except (AttributeError, TypeError, ValueError):
+        raise BadRequest("summary must be {text, covered}")
+
+
+def parse_conversation_id(raw):
+    if raw is None:
+        return None
+    try:
+        return str(uuid.UUID(str(raw)))
+    except ValueError:
+        raise BadRequest("conversation_id must be a UUID")
+
+
+def parse_chapter(raw):
+    if raw is None:
+        return None
+    if not isinstance(raw, int) or isinstance(raw, bool):
+        raise BadRequest("chapter must be an integer")
+    return raw
+
+
+def bad_request(request: Request, exc: BadRequest):
+    return JSONResponse({"error": str(exc)}, status_code=400)
+
+
+async def health(request: Request):
+    return JSONResponse({"status": "ok"})
+
+
+async def chapters(request: Request):
+    return JSONResponse({"chapters": list(await run_in_threadpool(request.app.state.service.chapters))})
+
+
+async def flashcards(request: Request):
+    chapter = request.path_params["chapter"]
+    deck = await run_in_threadpool(request.app.state.service.deck, chapter)
+    cards = [{"id": c.id, "question": c.question, "answer": c.answer} for c in deck]
+    return JSONResponse({"chapter": chapter, "cards": cards})
+
+
+async def search_flashcards(request: Request):
+    query = request.query_params.get("q", "").strip()
+    if not query:
+        raise BadRequest("q is required")
+    chapter = request.query_params.get("chapter")
+    try:
+        chapter = int(chapter) if chapter is not None else None
+    except ValueError:
+        raise BadRequest("chapter must be an integer")
+    cards = await run_in_threadpool(request.app.state.service.search_flashcards, query, chapter)
+    return JSONResponse({"cards": [{"id": c.id, "question": c.question, "answer": c.answer} for c in cards]})
+
+
+async def grade(request: Request):
+    body = await read_json(request)
+    card_id, answer = body.get("card_id"), body.get("answer")
+    if not isinstance(card_id, int) or not isinstance(answer, str):
+        raise BadRequest("expected {card_id: int, answer: str}")
+    new_trace()
+    try:
+        verdict = await run_in_threadpool(request.app.state.service.grade, card_id, answer)
+    except CardNotFound:
+        return JSONResponse({"error": f"no flashcard {card_id}"}, status_code=404)
+    return JSONResponse(asdict(verdict))
+
+
+async def chat(request: Request):
+    body = await read_json(request)
+    question = body.get("question")
+    if not isinstance(question, str) or not question.strip():
+        raise BadRequest("question is required")
+    history = parse_history(body.get("history"))
+    summary = parse_summary(body.get("summary"))
+    conversation_id = parse_conversation_id(body.get("conversation_id"))
+    chapter = parse_chapter(body.get("chapter"))
+    service = request.app.state.service
+    new_trace()
+    plan = await run_in_threadpool(service.plan_answer, question, history, summary, chapter)
+    if conversation_id:
+        service.record(conversation_id, {"role": "user", "content": question, "ts": now_in_app_tz().isoformat()})
+
+    async def events():
+        yield sse("meta", {"source": plan.source})
+        ttft, completed, failed = None, False, False
+        parts = []
+        start = time.monotonic()
+        try:
+            if plan.source != SOURCE_LLM:
+                ttft = 0.0
+                parts.append(plan.text)
+                yield sse("delta", {"text": plan.text})
+            else:
+                with span("llm.stream", model=service.model):
+                    deltas = await service.open_stream(plan)
+                    try:
+                        async for delta in deltas:
+                            if ttft is None:
+                                ttft = time.monotonic() - start
+                                record_ttft(ttft)
+                            parts.append(delta)
+                            yield sse("delta", {"text": delta})
+                    finally:
+                        # Also reached when the client disconnects mid-stream.
+                        deltas.close()
+            completed = True
+        except Exception as e:
+            failed = True
+            parts = [f"⚠️ API error: {e}"]
+            yield sse("error", {"error": str(e)})
+        finally:
+            text = "".join(parts)
+            # A reply cut short by a disconnect is not stored as an answer.
+            if conversation_id and text and (completed or failed):
+                service.record(conversation_id, {
+                    "role": "assistant", "content": text, "ts": now_in_app_tz().isoformat(),
+                    "ttft": ttft, "prompt_tokens": plan.prompt_tokens,
+                })
+        if plan.source == SOURCE_LLM and completed:
+            await run_in_threadpool(service.finish, plan, StreamResult(text, ttft, time.monotonic() - start))
+        # The client carries the summary, so it is brought up to date after
+        # the reply but before ``done``.
+        await run_in_threadpool(service.update_summary, plan)
+        yield sse("done", {
+            "text": text,
+            "source": plan.source,
+            "ttft": ttft,
+            "prompt_tokens": plan.prompt_tokens,
+            "summary": asdict(summary),
+        })
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def metrics(request: Request):
+    return PlainTextResponse(REGISTRY.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+def create_app(service_factory=build_service, metrics_port: int = METRICS_PORT) -> Starlette:
+    @asynccontextmanager
+    async def lifespan(app):
+        app.state.service = await run_in_threadpool(service_factory)
+        server = start_metrics_server(metrics_port, ports=METRICS_WORKER_PORTS) if metrics_port else None
+        yield
+        if server is not None:
+            server.shutdown()
+        if app.state.service.chat_store is not None:
+            await run_in_threadpool(app.state.service.chat_store.close)
+
+    return Starlette(
+        routes=[
+            Route("/health", health),
+            Route("/chapters", chapters),
+            Route("/chapters/{chapter:int}/flashcards", flashcards),
+            Route("/flashcards/search", search_flashcards),
+            Route("/grade", grade, methods=["POST"]),
+            Route("/chat", chat, methods=["POST"]),
+            Route("/metrics", metrics),
+        ],
+        exception_handlers={BadRequest: bad_request},
+        lifespan=lifespan,
+    )
+
+
+app = create_app()
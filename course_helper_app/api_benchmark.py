@@ -0,0 +1,124 @@
+"""Load test for the HTTP API (api.py), independent of the Streamlit UI.
+
+    uvicorn api:app --workers 4 --port 8000      # e.g. with OPENAI_BASE_URL
+                                                 # pointing at fake_openai.py
+    python api_benchmark.py --url http://localhost:8000 --clients 50 --requests 20
+
+Each client thread sends a random mix of chat questions (read as server-sent
+events), flashcard deck fetches and grading requests, and the run reports
+latency percentiles per endpoint and time to first chat delta.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+from pathlib import Path
+
+from benchmark import QUESTIONS, summarize
+
+MIX = {"chat": 0.5, "flashcards": 0.3, "grade": 0.2}
+
+
+def request(url: str, body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    return urllib.request.urlopen(req, timeout=120)
+
+
+def chat(base: str, question: str):
+    """Send one chat question; returns seconds to the first delta."""
+    start = time.perf_counter()
+    ttft = None
+    with request(f"{base}/chat", {"question": question}) as resp:
+        for line in resp:
+            if ttft is None and line.startswith(b"event: delta"):
+                ttft = time.perf_counter() - start
+    return ttft
+
+
+def run_client(base: str, n: int, rng: random.Random, chapters: list, latencies, ttfts, errors, lock):
+    kinds, weights = zip(*MIX.items())
+    for _ in range(n):
+        kind = rng.choices(kinds, weights)[0]
+        start = time.perf_counter()
+        try:
+            if kind == "chat":
+                ttft = chat(base, rng.choice(QUESTIONS))
+            elif kind == "flashcards":
+                with request(f"{base}/chapters/{rng.choice(chapters)}/flashcards") as resp:
+                    cards = json.load(resp)["cards"]
+            else:
+                with request(f"{base}/chapters/{rng.choice(chapters)}/flashcards") as resp:
+                    cards = json.load(resp)["cards"]
+                if cards:
+                    card = rng.choice(cards)
+                    start = time.perf_counter()
+                    request(f"{base}/grade", {"card_id": card["id"], "answer": card["answer"][:20]}).close()
+        except Exception:
+            with lock:
+                errors[kind] += 1
+            continue
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies[kind].append(elapsed)
+            if kind == "chat" and ttft is not None:
+                ttfts.append(ttft)
+
+
+def run(base: str, clients: int, requests_per_client: int, seed: int = 0) -> dict:
+    with request(f"{base}/chapters") as resp:
+        chapters = json.load(resp)["chapters"] or [1]
+    latencies, ttfts, errors = defaultdict(list), [], defaultdict(int)
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(
+            target=run_client,
+            args=(base, requests_per_client, random.Random(seed + i), chapters, latencies, ttfts, errors, lock),
+        )
+        for i in range(clients)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    total = sum(len(v) for v in latencies.values())
+    return {
+        "url": base,
+        "clients": clients,
+        "wall_seconds": wall,
+        "requests_per_second": total / wall if wall else None,
+        "errors": dict(errors),
+        "latency_seconds": {kind: summarize(v) for kind, v in latencies.items()},
+        "ttft_seconds": summarize(ttfts),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test for the course helper HTTP API.")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--clients", type=int, default=20, help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=10, help="requests per client")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run(args.url.rstrip("/"), args.clients, args.requests, args.seed)
+    print(f"{args.clients} clients, {results['requests_per_second']:.1f} req/s, errors {results['errors'] or 0}")
+    for kind, stats in results["latency_seconds"].items():
+        print(f"  {kind:<11} n={stats['count']:<5} p50={stats['p50'] * 1000:7.1f}ms "
+              f"p95={stats['p95'] * 1000:7.1f}ms p99={stats['p99'] * 1000:7.1f}ms")
+    ttft = results["ttft_seconds"]
+    if ttft["count"]:
+        print(f"  chat ttft   n={ttft['count']:<5} p50={ttft['p50'] * 1000:7.1f}ms p95={ttft['p95'] * 1000:7.1f}ms")
+    if args.out:
+        args.out.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
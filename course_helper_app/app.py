@@ -1,52 +1,41 @@
 import streamlit as st
-import psycopg2
-import time
-import os
+import uuid
 from dotenv import load_dotenv
-from openai import OpenAI
-import base64
-from datetime import datetime
-from typing import Optional
-from html import escape
-try:
-   from zoneinfo import ZoneInfo  
-except Exception:
-   ZoneInfo = None  
+from functools import lru_cache
+from assets import asset_url
+from config import METRICS_PORT, SESSION_BACKEND, SESSION_TTL_DAYS
+from conversation import RollingSummary
+from deck_cache import Deck
+from service import build_service
+from session_state import make_backend, open_session
+from streaming import ttft_percentile
+from telemetry import new_trace, span, start_metrics_server, start_profiler_from_env
+from transcript import HISTORY_WINDOW, hidden_count, make_message, now_in_app_tz, transcript_html
 
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-TZ_NAME = "America/New_York"
-def get_tz():
-   if ZoneInfo is None:
-       return None
-   try:
-       return ZoneInfo(TZ_NAME)
-   except Exception:
-       return None
 
-APP_TZ = get_tz()
+@st.cache_resource
+def init_telemetry():
+   profiler = start_profiler_from_env()
+   server = start_metrics_server(METRICS_PORT) if METRICS_PORT else None
+   return profiler, server
 
-def now_in_app_tz() -> datetime:
-   if APP_TZ:
-       return datetime.now(APP_TZ)
-   return datetime.now()  
 
-def format_ts(dt: datetime) -> str:
-   """Format datetime to 'H:MM AM/PM' cross-platform."""
-   try:
-       return dt.strftime("%-I:%M %p")   
-   except Exception:
-       return dt.strftime("%#I:%M %p")   
+init_telemetry()
+new_trace()
+# Reruns cut short by st.rerun() never reach rerun.end() and are not recorded.
+rerun = span("rerun").start()
 
-def set_custom_theme():
+@lru_cache(maxsize=None)
+def theme_css() -> str:
+   """Theme stylesheet, built once per process."""
    primary_color = "#4A4A4A"
    background_color = "#FCF7E6"
    secondary_background_color = "#E0DAC9"
    text_color = "#4A4A4A"
 
-   st.markdown(
-       f"""
+   return f"""
        <style>
        :root {{
            --primary-color: {primary_color};
@@ -116,14 +105,14 @@ def set_custom_theme():
            color: #3e2723;
        }}
        </style>
-       """,
-       unsafe_allow_html=True,
-   )
+       """
+
+def set_custom_theme():
+   st.markdown(theme_css(), unsafe_allow_html=True)
 
 def add_background(image_file):
    try:
-       with open(image_file, "rb") as f:
-           encoded = base64.b64encode(f.read()).decode()
+       url = asset_url(image_file, max_width=1920)
    except FileNotFoundError:
        st.error(f"Error: Background image file not found at {image_file}")
        return
@@ -132,7 +121,7 @@ def add_background(image_file):
    page_bg = f"""
    <style>
    [data-testid="stAppViewContainer"] {{
-       background-image: url("data:image/png;base64,{encoded}");
+       background-image: url("{url}");
        background-size: cover;
        background-position: center;
        background-repeat: no-repeat;
@@ -147,8 +136,7 @@ def add_background(image_file):
 
 def add_textbook_frame(image_file):
    try:
-       with open(image_file, "rb") as f:
-           encoded = base64.b64encode(f.read()).decode()
+       url = asset_url(image_file, max_width=1280)
    except FileNotFoundError:
        st.warning(f"Textbook frame image not found at {image_file}")
        return
@@ -171,7 +159,7 @@ def add_textbook_frame(image_file):
        z-index: 1;
    }}
    </style>
-   <img class="textbook-frame" src="data:image/png;base64,{encoded}" />
+   <img class="textbook-frame" src="{url}" />
    """
    st.markdown(frame_html, unsafe_allow_html=True)
 
@@ -179,7 +167,7 @@ set_custom_theme()
 add_background("assets/wood_background.png")
 add_textbook_frame("assets/textbook_frame.png")
 
-st.markdown("""
+CHAT_CSS = """
 <style>
 .chat-row {
  display: flex;
@@ -254,105 +242,144 @@ h1 {
    left: 150px;
 }
 </style>
-""", unsafe_allow_html=True)
+"""
+st.markdown(CHAT_CSS, unsafe_allow_html=True)
+
+@st.cache_resource
+def init_service():
+   return build_service()
+
+
+service = init_service()
 
-DB_NAME = "coursehelper"
-DB_USER = "postgres"
-DB_PASS = "postgres"
-DB_HOST = "db"
-DB_PORT = "5432"
 
 @st.cache_resource
-def init_connection():
-   return psycopg2.connect(
-       dbname=DB_NAME, user=DB_USER, password=DB_PASS, host=DB_HOST, port=DB_PORT
+def init_session_backend():
+   backend = make_backend(SESSION_BACKEND, service.connect)
+   if hasattr(backend, "purge"):
+       try:
+           backend.purge(SESSION_TTL_DAYS * 86400)
+       except Exception:
+           pass  # the database may still be starting
+   return backend
+
+
+SESSION_DEFAULTS = {
+   "screen": "chatbot",  # chatbot, flashcards, quiz
+   "chapter": None,
+   "card_index": 0,
+   "card_id": None,
+   "show_answer": False,
+   "last_result": None,
+   "feedback": None,
+}
+# The messages themselves are reloaded from the chat store; ``message_count``
+# places the rolling summary in them again.
+CONVERSATION_KEYS = ("conversation_id", "message_count", "history_window", "summary")
+
+
+# The session token is kept in the URL (``?s=...``) so a reconnect to another
+# replica finds the same stored state. Only tokens this app issued are taken.
+if "persisted" not in st.session_state:
+   st.session_state.persisted, token = open_session(
+       init_session_backend(), st.query_params.get("s"), tuple(SESSION_DEFAULTS) + CONVERSATION_KEYS
    )
+   st.query_params["s"] = token
+persisted = st.session_state.persisted
 
+for key, default in SESSION_DEFAULTS.items():
+   if key not in st.session_state:
+       st.session_state[key] = persisted.get(key, default)
 
-def get_flashcards(conn, chapter=None):
-   with conn.cursor() as cur:
-       if chapter:
-           cur.execute("SELECT question, answer FROM flashcards WHERE chapter = %s;", (chapter,))
-       else:
-           cur.execute("SELECT question, answer FROM flashcards;")
-       return cur.fetchall()
-
-
-def get_fallback_message(conn):
-   with conn.cursor() as cur:
-       cur.execute("SELECT fallback_message FROM fallbacks LIMIT 1;")
-       result = cur.fetchone()
-       return result[0] if result else (
-           "I’m sorry, I cannot help you with that. "
-           "That question falls out of scope with the course material and syllabus. "
-           "I’m here to help with questions more relevant to your Software Engineering course."
-       )
 
-if "screen" not in st.session_state:
-   st.session_state.screen = "chatbot"  # chatbot, flashcards, quiz
-if "messages" not in st.session_state:
+def start_conversation(conversation_id=None):
+   """Switch the session to ``conversation_id``, or to a new conversation.
+
+   The id is kept in the URL (``?c=...``) so that a refresh, reconnect or app
+   restart picks the same conversation up again.
+   """
+   st.session_state.conversation_id = conversation_id or str(uuid.uuid4())
+   st.query_params["c"] = st.session_state.conversation_id
    st.session_state.messages = []
-if "chapter" not in st.session_state:
-   st.session_state.chapter = None
-if "card_index" not in st.session_state:
+   st.session_state.history_window = HISTORY_WINDOW
+   st.session_state.history_cursor = None
+   st.session_state.history_has_more = False
+   st.session_state.summary = RollingSummary()
+   if conversation_id:
+       load_history_page()
+       # The newest page is sent to the model as it is; nothing is summarized yet.
+       st.session_state.summary = RollingSummary()
+
+
+def load_history_page():
+   """Prepend the next older page of stored messages to the session.
+
+   The rolling summary describes a prefix of ``messages`` (see
+   conversation.py), so it is moved past the prepended page: older messages
+   are shown again but not sent back to the model. Returns whether a page
+   was loaded; a failure is shown as a warning.
+   """
+   try:
+       page = service.chat_store.load_page(
+           st.session_state.conversation_id, st.session_state.history_cursor, HISTORY_WINDOW
+       )
+   except Exception as e:
+       st.warning(f"Could not load earlier messages: {e}")
+       return False
+   st.session_state.messages[:0] = [
+       make_message(m.role, m.content, m.ts, ttft=m.ttft, prompt_tokens=m.prompt_tokens)
+       for m in page.messages
+   ]
+   st.session_state.summary.covered += len(page.messages)
+   if page.messages:
+       st.session_state.history_cursor = page.cursor
+   st.session_state.history_has_more = page.has_more
+   return True
+
+
+def requested_conversation():
+   try:
+       return str(uuid.UUID(st.query_params.get("c", "")))
+   except ValueError:
+       return None
+
+
+if "conversation_id" not in st.session_state:
+   conversation_id = requested_conversation()
+   stored = {key: persisted.get(key) for key in CONVERSATION_KEYS} if conversation_id else {}
+   start_conversation(conversation_id)
+   # Back on a session another replica served: resume it as it was left,
+   # rolling summary included, over the newest page of stored messages.
+   if conversation_id and stored["conversation_id"] == conversation_id and stored["message_count"] is not None:
+       st.session_state.history_window = stored["history_window"] or HISTORY_WINDOW
+       summary = stored["summary"] or RollingSummary()
+       unsummarized = stored["message_count"] - summary.covered
+       summary.covered = max(0, len(st.session_state.messages) - unsummarized)
+       st.session_state.summary = summary
+
+def load_chapters():
+   try:
+       return service.chapters()
+   except Exception:
+       return ()
+
+
+def select_chapter(chapter):
+   """Scope the chatbot and the flashcards to ``chapter`` (None for all)."""
+   st.session_state.chapter = chapter
    st.session_state.card_index = 0
-if "show_answer" not in st.session_state:
+   st.session_state.card_id = None
    st.session_state.show_answer = False
-if "last_result" not in st.session_state:
    st.session_state.last_result = None
-if "feedback" not in st.session_state:
    st.session_state.feedback = None
 
+
 try:
-   conn = init_connection()
-   fallback_message = get_fallback_message(conn)
+   service.fallback_message()
+   db_available = True
 except Exception as e:
-   fallback_message = "⚠️ Could not connect to the database."
    st.error(f"Database error: {e}")
-   conn = None
-
-def render_bubble(role: str, text: str, ts_iso: Optional[str] = None):
-   """
-   Renders a message bubble with timestamp below.
-   role: "user" | "assistant"
-   ts_iso: ISO string. If naive or None, we treat it as APP_TZ 'now'.
-   """
-   if ts_iso:
-       try:
-           dt = datetime.fromisoformat(ts_iso.replace("Z", "+00:00"))
-           if dt.tzinfo is None and APP_TZ:
-               dt = dt.replace(tzinfo=APP_TZ)
-       except Exception:
-           dt = now_in_app_tz()
-   else:
-       dt = now_in_app_tz()
-
-
-   time_str = format_ts(dt)
-   safe_text = escape(text)
-
-
-   if role == "user":
-       row_class = "user-row"
-       bubble_class = "user-bubble"
-       meta_class = "user-meta"
-       content_html = f'<span class="avatar-emoji">🧑</span><div class="bubble {bubble_class}">{safe_text}</div>'
-   else:
-       row_class = "assistant-row"
-       bubble_class = "assistant-bubble"
-       meta_class = "assistant-meta"
-       content_html = f'<div class="bubble {bubble_class}">{safe_text}</div><span class="avatar-emoji">🤖</span>'
-
-
-   st.markdown(
-       f"""
-       <div class="chat-row {row_class}">
-         {content_html}
-       </div>
-       <div class="chat-meta {meta_class}">{time_str}</div>
-       """,
-       unsafe_allow_html=True,
-   )
+   db_available = False
 
 with st.sidebar:
    st.header("Controls")
@@ -373,17 +400,45 @@ with st.sidebar:
 
    if st.session_state.screen == "chatbot":
        if st.button("Clear Chat History 🗑️"):
-           st.session_state.messages = []
+           start_conversation()
+           st.rerun()
+       stats = service.response_cache.stats
+       if stats.lookups:
+           st.caption(
+               f"Answer cache: {stats.hit_rate:.0%} hit rate, "
+               f"{stats.saved_seconds:.1f}s of LLM latency saved"
+           )
+       embedding = service.embedder.stats() if service.embedder is not None else None
+       if embedding and embedding["batches"]:
+           st.caption(
+               f"Embeddings: {embedding['hit_rate']:.0%} cached, "
+               f"{embedding['mean_batch_size']:.1f} texts per batch"
+           )
+       p50, p95 = ttft_percentile(50), ttft_percentile(95)
+       if p95 is not None:
+           st.caption(f"Time to first token: p50 {p50:.2f}s, p95 {p95:.2f}s")
+       last = next((m for m in reversed(st.session_state.messages) if m.get("prompt_tokens")), None)
+       if last:
+           st.caption(f"Last prompt: {last['prompt_tokens']} tokens")
+       # Questions only search the material of the selected chapter.
+       options = (None, *load_chapters())
+       scope = st.selectbox(
+           "Chapter",
+           options,
+           index=options.index(st.session_state.chapter) if st.session_state.chapter in options else 0,
+           format_func=lambda c: "All chapters" if c is None else f"Chapter {c}",
+       )
+       if scope != st.session_state.chapter:
+           select_chapter(scope)
            st.rerun()
    else:
        st.markdown("### Chapters")
-       for i in [1, 2, 3, 4, 5, 6, 8, 9, 12, 23]:
+       chapters = load_chapters()
+       if not chapters:
+           st.caption("Chapters are unavailable while the database is down.")
+       for i in chapters:
            if st.button(f"Chapter {i}"):
-               st.session_state.chapter = i
-               st.session_state.card_index = 0
-               st.session_state.show_answer = False
-               st.session_state.last_result = None
-               st.session_state.feedback = None
+               select_chapter(i)
                st.rerun()
 
 if st.session_state.screen == "chatbot":
@@ -403,69 +458,62 @@ if st.session_state.screen == "chatbot":
            unsafe_allow_html=True
        )
 
-   for message in st.session_state.messages:
-       render_bubble(
-           message.get("role", "assistant"),
-           message.get("content", ""),
-           message.get("ts")
+   # Messages carry their rendered HTML, so a rerun only joins the strings
+   # of the visible window and sends them as one element.
+   hidden = hidden_count(st.session_state.messages, st.session_state.history_window)
+   if hidden or st.session_state.history_has_more:
+       if st.button("Load earlier messages"):
+           loaded = True
+           if hidden < HISTORY_WINDOW and st.session_state.history_has_more:
+               loaded = load_history_page()
+           if loaded:
+               st.session_state.history_window += HISTORY_WINDOW
+               st.rerun()
+   if st.session_state.messages:
+       st.markdown(
+           transcript_html(st.session_state.messages, st.session_state.history_window),
+           unsafe_allow_html=True
        )
 
    prompt = st.chat_input("Ask me anything about the course material or syllabus…")
    if prompt:
-       user_dt = now_in_app_tz()
-       st.session_state.messages.append({
-           "role": "user",
-           "content": prompt,
-           "ts": user_dt.isoformat()
-       })
-       render_bubble("user", prompt, user_dt.isoformat())
+       history = st.session_state.messages[:]
+       user_message = make_message("user", prompt, now_in_app_tz().isoformat())
+       st.session_state.messages.append(user_message)
+       service.record(st.session_state.conversation_id, user_message)
+       st.markdown(user_message["html"], unsafe_allow_html=True)
 
        message_placeholder = st.empty()
-       full_response = ""
 
-       try:
-           response = client.chat.completions.create(
-               model="gpt-5-nano",
-               messages=[
-                   {"role": "system", "content": "You are a helpful course assistant for a Software Engineering class."},
-                   {"role": "user", "content": prompt},
-               ],
-           )
-           assistant_response = response.choices[0].message.content
-       except Exception as e:
-           assistant_response = f"⚠️ API error: {e}"
-
-       for chunk in assistant_response.split():
-           full_response += chunk + " "
-           safe_partial = escape(full_response) + "▌"
+       def draw_partial(safe_partial):
            message_placeholder.markdown(
                f'''
                <div class="chat-row assistant-row">
-                 <div class="bubble assistant-bubble">{safe_partial}</div>
+                 <div class="bubble assistant-bubble">{safe_partial}▌</div>
                  <span class="avatar-emoji">🤖</span>
                </div>
                ''',
                unsafe_allow_html=True
            )
-           time.sleep(0.05)
-
-       asst_dt = now_in_app_tz()
-       safe_final = escape(full_response)
-       message_placeholder.markdown(
-           f'''
-           <div class="chat-row assistant-row">
-             <div class="bubble assistant-bubble">{safe_final}</div>
-             <span class="avatar-emoji">🤖</span>
-           </div>
-           <div class="chat-meta assistant-meta">{format_ts(asst_dt)}</div>
-           ''',
-           unsafe_allow_html=True
+
+       # A newer prompt in this session supersedes the stream still in flight.
+       stream_id = uuid.uuid4().hex
+       st.session_state.stream_id = stream_id
+       plan = service.plan_answer(prompt, history, st.session_state.summary, st.session_state.chapter)
+       reply = service.stream_answer(
+           plan, draw_partial, should_cancel=lambda: st.session_state.get("stream_id") != stream_id
        )
-       st.session_state.messages.append({
-           "role": "assistant",
-           "content": full_response,
-           "ts": asst_dt.isoformat()
-       })
+
+       if reply.cancelled:
+           # Superseded by a newer prompt: a partial reply is not an answer.
+           message_placeholder.empty()
+       else:
+           assistant_message = make_message(
+               "assistant", reply.text, now_in_app_tz().isoformat(), ttft=reply.ttft, prompt_tokens=reply.prompt_tokens
+           )
+           message_placeholder.markdown(assistant_message["html"], unsafe_allow_html=True)
+           st.session_state.messages.append(assistant_message)
+           service.record(st.session_state.conversation_id, assistant_message)
 
 else:
    if st.session_state.screen == "flashcards":
@@ -481,9 +529,9 @@ else:
 
 
    try:
-       flashcards = get_flashcards(conn, st.session_state.chapter) if (conn and st.session_state.chapter) else []
+       flashcards = service.deck(st.session_state.chapter) if (db_available and st.session_state.chapter) else Deck()
    except Exception:
-       flashcards = []
+       flashcards = Deck()
 
 
    if not st.session_state.chapter:
@@ -491,7 +539,10 @@ else:
    elif not flashcards:
        st.warning("No flashcards found for this chapter.")
    else:
-       question, answer = flashcards[st.session_state.card_index]
+       # Follow the card by id so edits to the deck don't move the student.
+       st.session_state.card_index = flashcards.position(st.session_state.card_id, st.session_state.card_index)
+       card_id, question, answer = flashcards[st.session_state.card_index]
+       st.session_state.card_id = card_id
        card_content = answer if st.session_state.show_answer else question
 
 
@@ -531,33 +582,11 @@ else:
             user_answer = st.text_input("Your Answer:")
             if st.button("Submit Answer"):
 
-                # Generate feedback using the chatbot
+                # Grade locally first; only ambiguous answers go to the LLM
                 try:
-                    feedback_prompt = f"""
-                    A student is being quizzed on Software Engineering.
-                    The question was: "{question}"
-                    The correct answer is: "{answer}"
-                    The student's answer was: "{user_answer}"
-
-                    Begin your response with "Correct." if the student's answer sufficiently conveys all the same ideas as the correct answer.
-                    Otherwise, begin your response with "Incorrect."
-
-                    Provide brief, constructive feedback in 2-3 sentences.
-                    - If the answer is correct, offer encouragement.
-                    - If the answer is incorrect, gently explain the misunderstanding and guide them toward the correct concept without simply giving the answer away.
-                    """
-                    response = client.chat.completions.create(
-                        model="gpt-5-nano",
-                        messages=[
-                            {"role": "system", "content": "You are a helpful and encouraging teaching assistant."},
-                            {"role": "user", "content": feedback_prompt}
-                        ]
-                    )
-                    st.session_state.feedback = response.choices[0].message.content
-                    if "incorrect" in st.session_state.feedback.lower():
-                        st.session_state.last_result = "incorrect"
-                    else:
-                        st.session_state.last_result = "correct"
+                    verdict = service.grade(card_id, user_answer, question, answer)
+                    st.session_state.feedback = verdict.feedback
+                    st.session_state.last_result = "correct" if verdict.correct else "incorrect"
                 except Exception as e:
                     st.session_state.feedback = f"⚠️ Could not generate feedback: {e}"
 
@@ -576,6 +605,7 @@ else:
        with col1:
            if st.button("⬅️ Back"):
                st.session_state.card_index = (st.session_state.card_index - 1) % len(flashcards)
+               st.session_state.card_id = flashcards[st.session_state.card_index].id
                st.session_state.show_answer = False
                st.session_state.last_result = None
                st.session_state.feedback = None
@@ -590,7 +620,14 @@ else:
        with col3:
            if st.button("Next ➡️"):
                st.session_state.card_index = (st.session_state.card_index + 1) % len(flashcards)
+               st.session_state.card_id = flashcards[st.session_state.card_index].id
                st.session_state.show_answer = False
                st.session_state.last_result = None
                st.session_state.feedback = None
-               st.rerun()
\ No newline at end of file
+               st.rerun()
+
+# Reruns cut short by st.rerun() leave their changes to the next rerun's save.
+st.session_state.message_count = len(st.session_state.messages)
+persisted.save(st.session_state)
+rerun.set(screen=st.session_state.get("screen"))
+rerun.end()
@@ -0,0 +1,109 @@
+"""Static asset pipeline for the page background and textbook frame.
+
+Each image is processed once per process: it is recompressed (WebP, resized to
+its display width) into ``static/`` under a content-hashed name and then
+referenced by URL through Streamlit's static file serving, so reruns only send
+a few hundred bytes of CSS instead of the base64-encoded image.
+"""
+
+import base64
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional
+
+from telemetry import span
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; originals are served unchanged
+    Image = None
+
+APP_DIR = Path(__file__).resolve().parent
+STATIC_DIR = APP_DIR / "static"
+STATIC_URL = "app/static"
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def _fingerprint(path: Path) -> tuple:
+    st = path.stat()
+    return (str(path), st.st_mtime_ns, st.st_size)
+
+
+def _content_hash(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    return h.hexdigest()[:12]
+
+
+def _write_atomically(out: Path, write):
+    """Call ``write(tmp_path)`` on a private temp file, then move it to ``out``.
+
+    The temp name is unique per call, so processes sharing ``STATIC_DIR``
+    never write into each other's file, and ``out`` is never seen half written.
+    """
+    with tempfile.NamedTemporaryFile(dir=out.parent, prefix=f".{out.stem}-", suffix=".tmp", delete=False) as f:
+        tmp = Path(f.name)
+    try:
+        write(tmp)
+        os.replace(tmp, out)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def build_variant(path: Path, max_width: Optional[int], quality: int = 80) -> Path:
+    """Write an optimized copy of ``path`` into STATIC_DIR and return its path."""
+    digest = _content_hash(path)
+    STATIC_DIR.mkdir(exist_ok=True)
+
+    if Image is None:
+        out = STATIC_DIR / f"{path.stem}-{digest}{path.suffix}"
+        if not out.exists():
+            _write_atomically(out, lambda tmp: shutil.copyfile(path, tmp))
+        return out
+
+    suffix = f"-{max_width}" if max_width else ""
+    out = STATIC_DIR / f"{path.stem}{suffix}-{digest}.webp"
+    if out.exists():
+        return out
+
+    with span("asset.encode", file=path.name, max_width=max_width), Image.open(path) as img:
+        if max_width and img.width > max_width:
+            height = round(img.height * max_width / img.width)
+            img = img.resize((max_width, height), Image.LANCZOS)
+        _write_atomically(out, lambda tmp: img.save(tmp, format="WEBP", quality=quality, method=6))
+    return out
+
+
+def asset_url(image_file, max_width: Optional[int] = None) -> str:
+    """Return a URL for ``image_file``, building its variant on first use.
+
+    Results are cached per process keyed by path, mtime and size, so an asset
+    is only re-encoded when the file on disk changes. If the variant cannot be
+    written, a data URI of the original file is returned instead.
+    """
+    path = Path(image_file)
+    if not path.is_absolute():
+        path = APP_DIR / path
+    key = (_fingerprint(path), max_width)
+
+    with _lock:
+        url = _cache.get(key)
+        if url is None:
+            try:
+                out = build_variant(path, max_width)
+                url = f"{STATIC_URL}/{out.name}"
+            except OSError:
+                with open(path, "rb") as f:
+                    encoded = base64.b64encode(f.read()).decode()
+                url = f"data:image/png;base64,{encoded}"
+            _cache[key] = url
+    return url
@@ -0,0 +1,371 @@
+"""Offline load test for the Streamlit app.
+
+Drives ``app.py`` headlessly with Streamlit's ``AppTest``, one session per
+simulated student, against ``fake_openai.FakeOpenAIServer`` and a throwaway
+Postgres database that is created (from db/init.sql plus the migrations) for
+the run and dropped afterwards. Each student runs a random mix of the chat,
+flashcard and quiz flows; the run reports
+
+* rerun latency (p50/p95/p99) per interaction type,
+* time to first token of chat answers,
+* database queries per interaction (all queries issued during the run,
+  including background writers, divided by the number of interactions),
+* bytes of rendered elements per rerun,
+
+and writes them as JSON so runs can be compared between commits:
+
+    docker compose up -d db        # or any Postgres with pgvector
+    DB_HOST=localhost python benchmark.py --students 20 --turns 10
+    python benchmark.py --students 20 --compare bench_results/<baseline>.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional
+
+from fake_openai import FakeOpenAIServer
+from streaming import percentile
+
+HERE = Path(__file__).resolve().parent
+RESULTS_DIR = HERE / "bench_results"
+
+QUESTIONS = [
+    "What is the waterfall model?",
+    "Explain the difference between verification and validation.",
+    "What are the prerequisites for CSC 4350?",
+    "What is a use case diagram?",
+    "When is the midterm?",
+    "What does refactoring mean?",
+    "Explain that again more simply.",
+    "Give me an example of a non-functional requirement.",
+]
+QUIZ_ANSWERS = ["I don't know", "It describes how the system is tested", "software design"]
+FLOWS = {"chat": 0.5, "flashcards": 0.3, "quiz": 0.2}
+
+
+def summarize(samples: List[float]) -> dict:
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "mean": sum(samples) / len(samples),
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+        "max": max(samples),
+    }
+
+
+def compare(current: dict, baseline: dict, keys=("p50", "p95", "p99")) -> List[str]:
+    """Lines describing how each latency percentile moved against ``baseline``."""
+    lines = []
+    for section in ("rerun_seconds", "ttft_seconds", "bytes_per_rerun"):
+        for name, stats in current.get(section, {}).items():
+            before = baseline.get(section, {}).get(name, {})
+            for key in keys:
+                new, old = stats.get(key), before.get(key)
+                if new is None or not old:
+                    continue
+                lines.append(f"{section}.{name}.{key}: {old:.4g} -> {new:.4g} ({(new - old) / old:+.1%})")
+    return lines
+
+
+class QueryCounter:
+    """Counts statements executed through cursors made by ``cursor_factory``."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def add(self, n: int = 1):
+        with self._lock:
+            self.count += n
+
+    def cursor_factory(self, base=None):
+        """Cursor class (``base``, by default psycopg2's) counting what it executes."""
+        if base is None:
+            import psycopg2.extensions
+
+            base = psycopg2.extensions.cursor
+        counter = self
+
+        class CountingCursor(base):
+            def execute(self, query, vars=None):
+                counter.add()
+                return super().execute(query, vars)
+
+            def executemany(self, query, vars_list):
+                counter.add()
+                return super().executemany(query, vars_list)
+
+        return CountingCursor
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rerun = defaultdict(list)
+        self.bytes = defaultdict(list)
+        self.ttft = []
+        self.errors = defaultdict(int)
+
+    def step(self, kind: str, seconds: float, size: int, failed: bool):
+        with self._lock:
+            self.rerun[kind].append(seconds)
+            self.bytes[kind].append(size)
+            if failed:
+                self.errors[kind] += 1
+
+    def add_ttft(self, seconds: float):
+        with self._lock:
+            self.ttft.append(seconds)
+
+    @property
+    def interactions(self) -> int:
+        return sum(len(v) for v in self.rerun.values())
+
+
+def rendered_bytes(at) -> int:
+    """Serialized size of every element in the last run's element tree."""
+    total = 0
+    stack = [at._tree]
+    while stack:
+        node = stack.pop()
+        proto = getattr(node, "proto", None)
+        if proto is not None and hasattr(proto, "ByteSize"):
+            total += proto.ByteSize()
+        stack.extend(getattr(node, "children", {}).values())
+    return total
+
+
+class Student:
+    """One simulated student: an ``AppTest`` session running random flows."""
+
+    def __init__(self, recorder: Recorder, rng: random.Random, timeout: float = 60):
+        from streamlit.testing.v1 import AppTest
+
+        self.recorder = recorder
+        self.rng = rng
+        self.at = AppTest.from_file(str(HERE / "app.py"), default_timeout=timeout)
+
+    def step(self, kind: str, action):
+        start = time.monotonic()
+        failed = False
+        try:
+            action()
+            failed = bool(self.at.exception)
+        except Exception:
+            failed = True
+        self.recorder.step(kind, time.monotonic() - start, rendered_bytes(self.at), failed)
+
+    def _button(self, label: str, sidebar: bool = False):
+        buttons = self.at.sidebar.button if sidebar else self.at.button
+        for button in buttons:
+            if button.label == label:
+                return button
+        return None
+
+    def _click(self, kind: str, label: str, sidebar: bool = False) -> bool:
+        button = self._button(label, sidebar)
+        if button is None:
+            return False
+        self.step(kind, lambda: button.click().run())
+        return True
+
+    def _screen(self) -> str:
+        return self.at.session_state["screen"] if "screen" in self.at.session_state else "chatbot"
+
+    def chat(self):
+        if self._screen() != "chatbot":
+            self._click("navigate", "Chatbot Mode 🤓", sidebar=True)
+        question = self.rng.choice(QUESTIONS)
+        self.step("chat", lambda: self.at.chat_input[0].set_value(question).run())
+        messages = self.at.session_state["messages"] if "messages" in self.at.session_state else []
+        if messages and messages[-1].get("ttft") is not None:
+            self.recorder.add_ttft(messages[-1]["ttft"])
+
+    def _open_deck(self, screen: str):
+        if self._screen() == "chatbot":
+            self._click("navigate", "Flashcards Mode 📖", sidebar=True)
+        if not self.at.session_state["chapter"]:
+            chapters = [b.label for b in self.at.sidebar.button if b.label.startswith("Chapter ")]
+            if chapters:
+                self._click("navigate", self.rng.choice(chapters), sidebar=True)
+        if self._screen() != screen:
+            label = "Switch to Quiz Mode 📝" if screen == "quiz" else "Switch to Flashcards Mode 📖"
+            self._click("navigate", label)
+
+    def flashcards(self):
+        self._open_deck("flashcards")
+        self._click("flashcards", "Flip Card 🔄")
+        for _ in range(self.rng.randint(1, 3)):
+            self._click("flashcards", "Next ➡️")
+
+    def quiz(self):
+        self._open_deck("quiz")
+        if self.at.text_input:
+            self.at.text_input[0].set_value(self.rng.choice(QUIZ_ANSWERS))
+            self._click("quiz", "Submit Answer")
+        self._click("quiz", "Next ➡️")
+
+    def run(self, turns: int):
+        self.step("load", self.at.run)
+        flows, weights = zip(*FLOWS.items())
+        for _ in range(turns):
+            getattr(self, self.rng.choices(flows, weights)[0])()
+
+
+@contextmanager
+def throwaway_database(settings: dict):
+    """Create a scratch database loaded with db/init.sql; dropped on exit."""
+    import psycopg2
+
+    name = f"coursehelper_bench_{uuid.uuid4().hex[:8]}"
+    admin = psycopg2.connect(**dict(settings, dbname="postgres"))
+    admin.autocommit = True
+    try:
+        with admin.cursor() as cur:
+            cur.execute(f"CREATE DATABASE {name};")
+        conn = psycopg2.connect(**dict(settings, dbname=name))
+        try:
+            with conn.cursor() as cur:
+                cur.execute((HERE / "db" / "init.sql").read_text())
+            conn.commit()
+        finally:
+            conn.close()
+        yield name
+    finally:
+        with admin.cursor() as cur:
+            cur.execute(
+                "SELECT pg_terminate_backend(pid) FROM pg_stat_activity WHERE datname = %s AND pid <> pg_backend_pid();",
+                (name,),
+            )
+            cur.execute(f"DROP DATABASE IF EXISTS {name};")
+        admin.close()
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmark(students: int, turns: int, latency: float, tokens_per_second: float, seed: int = 0) -> dict:
+    """Run the load test and return the results dict (see module docstring)."""
+    server = FakeOpenAIServer(latency=latency, tokens_per_second=tokens_per_second).start()
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+    import config
+
+    counter = QueryCounter()
+    try:
+        with throwaway_database(config.DB_SETTINGS) as dbname:
+            # app.py reads the same dict, so this points every connection at
+            # the scratch database and counts its queries.
+            config.DB_SETTINGS.update(dbname=dbname, cursor_factory=counter.cursor_factory())
+            config.DB_NAME = dbname
+
+            recorder = Recorder()
+            warmup = Student(Recorder(), random.Random(seed))
+            start = time.monotonic()
+            warmup.at.run()  # pays for migrations and cached resources once
+            cold_start = time.monotonic() - start
+
+            queries_before = counter.count
+            llm_before = sum(server.requests.values())
+            start = time.monotonic()
+            sessions = [Student(recorder, random.Random(seed + i + 1)) for i in range(students)]
+            threads = [threading.Thread(target=s.run, args=(turns,)) for s in sessions]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            wall = time.monotonic() - start
+    finally:
+        server.stop()
+
+    interactions = recorder.interactions
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            "students": students,
+            "turns": turns,
+            "latency": latency,
+            "tokens_per_second": tokens_per_second,
+            "seed": seed,
+        },
+        "wall_seconds": wall,
+        "cold_start_seconds": cold_start,
+        "interactions": interactions,
+        "errors": dict(recorder.errors),
+        "rerun_seconds": {
+            "all": summarize([s for v in recorder.rerun.values() for s in v]),
+            **{kind: summarize(v) for kind, v in recorder.rerun.items()},
+        },
+        "ttft_seconds": {"chat": summarize(recorder.ttft)},
+        "bytes_per_rerun": {
+            "all": summarize([b for v in recorder.bytes.values() for b in v]),
+            **{kind: summarize(v) for kind, v in recorder.bytes.items()},
+        },
+        "db_queries_per_interaction": (counter.count - queries_before) / interactions if interactions else None,
+        "llm_requests": dict(server.requests),
+        "llm_requests_per_interaction": (sum(server.requests.values()) - llm_before) / interactions if interactions else None,
+    }
+
+
+def print_report(results: dict):
+    print(f"{results['interactions']} interactions in {results['wall_seconds']:.1f}s "
+          f"(cold start {results['cold_start_seconds']:.2f}s, errors {results['errors'] or 0})")
+    for kind, stats in results["rerun_seconds"].items():
+        if stats["count"]:
+            print(f"  rerun {kind:<11} n={stats['count']:<5} p50={stats['p50'] * 1000:7.1f}ms "
+                  f"p95={stats['p95'] * 1000:7.1f}ms p99={stats['p99'] * 1000:7.1f}ms")
+    ttft = results["ttft_seconds"]["chat"]
+    if ttft["count"]:
+        print(f"  ttft              n={ttft['count']:<5} p50={ttft['p50'] * 1000:7.1f}ms "
+              f"p95={ttft['p95'] * 1000:7.1f}ms p99={ttft['p99'] * 1000:7.1f}ms")
+    print(f"  db queries/interaction: {results['db_queries_per_interaction']:.2f}")
+    print(f"  bytes/rerun p50: {results['bytes_per_rerun']['all'].get('p50')}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test for the Streamlit app.")
+    parser.add_argument("--students", type=int, default=10, help="concurrent sessions")
+    parser.add_argument("--turns", type=int, default=10, help="flows per student")
+    parser.add_argument("--latency", type=float, default=0.3, help="fake LLM seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, help="results file (default bench_results/<commit>-<time>.json)")
+    parser.add_argument("--compare", type=Path, help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.students, args.turns, args.latency, args.tokens_per_second, args.seed)
+    out = args.out or RESULTS_DIR / f"{results['commit'] or 'local'}-{int(time.time())}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(results, indent=2))
+    print_report(results)
+    print(f"Results written to {out}")
+    if args.compare:
+        for line in compare(results, json.loads(args.compare.read_text())):
+            print("  " + line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""Bulk upload of course files to the OpenAI vector store.
+
+Used by ``/add`` in VectorFetchPrototype.py. Paths may be files, directories
+(searched recursively for UPLOAD_SUFFIXES) or glob patterns. Each file is
+hashed and uploaded on a bounded thread pool, and uploaded files are attached
+to the store through the file-batch API, ``batch_size`` at a time, with their
+sha256 (and chapter, when the file name has one) as file attributes. Files
+whose hash is already in the store (see vector_manifest.py) are skipped.
+Transient API errors are retried with backoff, except where a retry could
+attach a batch twice; uploads that end up unattached are deleted again. Files
+of a batch whose outcome is unknown are left to the next ``/list`` sync.
+"""
+
+import glob
+import shlex
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import openai
+
+from ingest import guess_chapter
+from util import file_hash, with_retries
+
+# File types file_search can index; directories are filtered to these.
+UPLOAD_SUFFIXES = {".pdf", ".pptx", ".docx", ".doc", ".txt", ".md", ".html", ".tex", ".json"}
+UPLOAD_CONCURRENCY = 8
+ATTACH_BATCH_SIZE = 100
+
+
+@dataclass
+class UploadStats:
+    files: int = 0
+    skipped: int = 0
+    uploaded: int = 0
+    attached: int = 0
+    failed: int = 0
+    unconfirmed: int = 0  # attached, but the batch's outcome could not be read
+    bytes: int = 0
+    elapsed: float = 0.0
+
+    def summary(self) -> str:
+        rate = self.uploaded / self.elapsed if self.elapsed else 0.0
+        mb = self.bytes / 1e6
+        mbps = mb / self.elapsed if self.elapsed else 0.0
+        unconfirmed = f", {self.unconfirmed} unconfirmed" if self.unconfirmed else ""
+        return (
+            f"{self.attached} attached{unconfirmed}, {self.skipped} already in store, {self.failed} failed "
+            f"of {self.files} files in {self.elapsed:.1f}s ({rate:.1f} files/s, {mb:.1f} MB at {mbps:.1f} MB/s)"
+        )
+
+
+def expand_paths(spec: str, suffixes=UPLOAD_SUFFIXES) -> List[Path]:
+    """Files named by ``spec``: space-separated files, directories or globs."""
+    out = []
+    for item in shlex.split(spec):
+        if glob.has_magic(item):
+            candidates = [Path(p) for p in sorted(glob.glob(item, recursive=True))]
+        else:
+            candidates = [Path(item)]
+        for path in candidates:
+            if path.is_dir():
+                out.extend(
+                    p for p in sorted(path.rglob("*"))
+                    if p.is_file() and p.suffix.lower() in suffixes and not p.name.startswith(".")
+                )
+            elif path.is_file():
+                out.append(path)
+    unique = {}
+    for path in out:
+        unique.setdefault(path.resolve(), path)
+    return list(unique.values())
+
+
+class BulkUploader:
+    def __init__(
+        self,
+        client,
+        manifest,
+        store_id: str,
+        concurrency: int = UPLOAD_CONCURRENCY,
+        batch_size: int = ATTACH_BATCH_SIZE,
+        attempts: int = 4,
+        base_delay: float = 1.0,
+        sleep=time.sleep,
+        progress=None,
+    ):
+        self.client = client
+        self.manifest = manifest
+        self.store_id = store_id
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.sleep = sleep
+        self.progress = progress
+        self._lock = threading.Lock()
+
+    def _retry(self, fn, **kwargs):
+        return with_retries(fn, self.attempts, self.base_delay, self.sleep, **kwargs)
+
+    def _upload(self, path: Path, known: set, claims: dict) -> Optional[dict]:
+        """Hash and upload one file; None when the store already has it."""
+        digest = file_hash(path)
+        # The same content twice in one run is uploaded once: a copy waits
+        # for the upload in flight and only takes over if that one failed.
+        while True:
+            with self._lock:
+                if digest in known:
+                    return None
+                claim = claims.get(digest)
+                if claim is None:
+                    claims[digest] = claim = threading.Event()
+                    break
+            claim.wait()
+
+        def call():
+            with open(path, "rb") as fh:
+                return self.client.files.create(file=fh, purpose="assistants")
+
+        try:
+            uploaded = self._retry(call)
+            with self._lock:
+                known.add(digest)
+        finally:
+            with self._lock:
+                del claims[digest]
+            claim.set()
+        attributes = {"sha256": digest, "filename": path.name}
+        chapter = guess_chapter(path)
+        if chapter is not None:
+            attributes["chapter"] = chapter  # used by retrieval.chapter_filter
+        return {"file_id": uploaded.id, "attributes": attributes}
+
+    def _attach(self, files: List[dict], stats: UploadStats):
+        batches = self.client.vector_stores.file_batches
+        try:
+            # Only a rate-limited create surely made no batch; anything else is
+            # not retried, as it could attach the files a second time.
+            batch = self._retry(
+                lambda: batches.create(vector_store_id=self.store_id, files=files), retry_on=(openai.RateLimitError,)
+            )
+        except Exception as e:
+            stats.failed += len(files)
+            if self.progress:
+                self.progress(f"\nattaching {len(files)} files failed: {e}\n")
+            self._delete_uploads(files)
+            return
+        try:
+            batch = self._retry(lambda: batches.poll(batch.id, vector_store_id=self.store_id))
+            if getattr(batch.file_counts, "completed", None) == len(files):
+                completed, failed = {f["file_id"] for f in files}, set()
+            else:
+                completed = self._batch_file_ids(batch.id, "completed")
+                failed = self._batch_file_ids(batch.id, "failed")
+        except Exception as e:
+            # The batch exists, so its files are most likely attached: they
+            # are kept, and the next /list sync records them.
+            stats.unconfirmed += len(files)
+            if self.progress:
+                self.progress(f"\ncould not confirm attaching {len(files)} files: {e}\n")
+            return
+        stats.attached += len(completed)
+        stats.failed += len(failed)
+        stats.unconfirmed += len(files) - len(completed) - len(failed)  # e.g. a cancelled batch
+        self.manifest.add_files(
+            self.store_id, [_AttachedFile(f["file_id"], f["attributes"]) for f in files if f["file_id"] in completed]
+        )
+        self._delete_uploads([f for f in files if f["file_id"] in failed])
+
+    def _batch_file_ids(self, batch_id: str, status: str) -> set:
+        batches = self.client.vector_stores.file_batches
+        listed = self._retry(lambda: list(batches.list_files(batch_id, vector_store_id=self.store_id, filter=status)))
+        return {f.id for f in listed}
+
+    def run(self, paths: Iterable[Path]) -> UploadStats:
+        paths = list(paths)
+        stats = UploadStats(files=len(paths))
+        known = set(self.manifest.known_hashes(self.store_id))
+        claims = {}
+        pending = []
+        start = time.monotonic()
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            futures = {pool.submit(self._upload, p, known, claims): p for p in paths}
+            for done, future in enumerate(as_completed(futures), 1):
+                path = futures[future]
+                try:
+                    item = future.result()
+                except Exception as e:
+                    stats.failed += 1
+                    self._report(done, stats, start, f"failed {path.name}: {e}")
+                    continue
+                if item is None:
+                    stats.skipped += 1
+                else:
+                    stats.uploaded += 1
+                    stats.bytes += path.stat().st_size
+                    pending.append(item)
+                # Attach on this thread while the pool keeps uploading.
+                if len(pending) >= self.batch_size:
+                    self._attach(pending, stats)
+                    pending = []
+                self._report(done, stats, start)
+        if pending:
+            self._attach(pending, stats)
+        stats.elapsed = time.monotonic() - start
+        return stats
+
+    def _delete_uploads(self, files):
+        """Delete uploaded files that were not attached, so they are not left orphaned."""
+        for f in files:
+            try:
+                self._retry(lambda: self.client.files.delete(f["file_id"]))
+            except Exception as e:
+                if self.progress:
+                    self.progress(f"could not delete unattached upload {f['file_id']}: {e}\n")
+
+    def _report(self, done: int, stats: UploadStats, start: float, note: str = ""):
+        if not self.progress:
+            return
+        elapsed = time.monotonic() - start
+        rate = stats.uploaded / elapsed if elapsed else 0.0
+        line = f"\r[{done}/{stats.files}] {stats.uploaded} uploaded, {stats.skipped} skipped, {rate:.1f} files/s"
+        self.progress(line + (f"  {note}\n" if note else ""))
+
+
+@dataclass
+class _AttachedFile:
+    """Shape of an API file object, for recording attachments in the manifest."""
+
+    id: str
+    attributes: dict
+    status: str = "completed"
+
+
+def print_progress(text: str):
+    sys.stdout.write(text)
+    sys.stdout.flush()
@@ -0,0 +1,191 @@
+"""Persistent chat history with write-behind batching.
+
+``ChatStore.append`` only puts the message on an in-memory queue; a
+background thread drains the queue and writes whatever has accumulated in a
+single transaction (one ``execute_values`` for the conversations, one for the
+messages), so the Streamlit script never waits on the database while a
+student is chatting. Resuming a conversation reads the newest page of
+messages and ``load_page`` walks backwards by message id (keyset pagination),
+so every page is one indexed query however long the conversation is.
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from psycopg2.extras import execute_values
+
+from database import rollback_on_error
+
+log = logging.getLogger(__name__)
+
+PAGE_SIZE = 40
+
+
+@dataclass
+class StoredMessage:
+    id: int
+    role: str
+    content: str
+    ts: str  # ISO timestamp, as kept in the session's messages
+    ttft: Optional[float] = None
+    prompt_tokens: Optional[int] = None
+
+
+@dataclass
+class Page:
+    messages: List[StoredMessage]  # oldest first
+    has_more: bool
+
+    @property
+    def cursor(self) -> Optional[int]:
+        """Id to pass as ``before_id`` for the next (older) page."""
+        return self.messages[0].id if self.messages else None
+
+
+class ChatStore:
+    """Chat history in the ``conversations`` and ``messages`` tables.
+
+    ``connect`` returns a context manager yielding a psycopg2 connection (e.g.
+    ``ConnectionPool.connection``). A batch is written as soon as
+    ``batch_size`` messages are queued or ``flush_interval`` seconds after the
+    first one arrived; failed batches are retried up to ``retries`` times.
+    """
+
+    def __init__(self, connect, batch_size=200, flush_interval=0.5, retries=3, backoff=1.0):
+        self.connect = connect
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.backoff = backoff
+        self.stats = Counter()
+        self._queue = queue.Queue()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="chat-store-writer", daemon=True)
+        self._thread.start()
+
+    # -- writes --------------------------------------------------------------
+
+    def append(self, conversation_id: str, message: dict):
+        """Queue ``message`` (a session message dict) for ``conversation_id``."""
+        ts = message.get("ts")
+        created_at = datetime.fromisoformat(ts) if ts else datetime.now(timezone.utc)
+        self._queue.put((
+            conversation_id,
+            message["role"],
+            message.get("content") or "",
+            created_at,
+            message.get("ttft"),
+            message.get("prompt_tokens"),
+        ))
+        self.stats["queued"] += 1
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued message has been written (or dropped)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, timeout: float = 5.0):
+        self.flush(timeout)
+        self._closed.set()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while not self._closed.is_set():
+            try:
+                first = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write_with_retries(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write_with_retries(self, batch):
+        for attempt in range(self.retries + 1):
+            try:
+                self.write_batch(batch)
+                self.stats["written"] += len(batch)
+                self.stats["batches"] += 1
+                return
+            except Exception:
+                log.warning("chat history write failed (attempt %d)", attempt + 1, exc_info=True)
+                if attempt < self.retries:
+                    time.sleep(self.backoff * 2 ** attempt)
+        self.stats["dropped"] += len(batch)
+
+    def write_batch(self, batch):
+        """Insert queued rows, creating their conversations first."""
+        touched = {}
+        for row in batch:
+            touched[row[0]] = max(row[3], touched.get(row[0], row[3]))
+        with self.connect() as conn, rollback_on_error(conn):
+            with conn.cursor() as cur:
+                execute_values(
+                    cur,
+                    """
+                    INSERT INTO conversations (id, created_at, updated_at) VALUES %s
+                    ON CONFLICT (id) DO UPDATE SET updated_at = GREATEST(conversations.updated_at, EXCLUDED.updated_at);
+                    """,
+                    [(cid, ts, ts) for cid, ts in touched.items()],
+                )
+                execute_values(
+                    cur,
+                    """
+                    INSERT INTO messages (conversation_id, role, content, created_at, ttft, prompt_tokens)
+                    VALUES %s;
+                    """,
+                    batch,
+                    page_size=self.batch_size,
+                )
+            conn.commit()
+
+    # -- reads ---------------------------------------------------------------
+
+    def load_page(self, conversation_id: str, before_id: Optional[int] = None, limit: int = PAGE_SIZE) -> Page:
+        """The ``limit`` messages before ``before_id`` (newest page when None)."""
+        where = "conversation_id = %s" + (" AND id < %s" if before_id is not None else "")
+        params = [conversation_id] + ([before_id] if before_id is not None else []) + [limit + 1]
+        with self.connect() as conn, rollback_on_error(conn):
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"""
+                    SELECT id, role, content, created_at, ttft, prompt_tokens
+                    FROM messages
+                    WHERE {where}
+                    ORDER BY id DESC
+                    LIMIT %s;
+                    """,
+                    params,
+                )
+                rows = cur.fetchall()
+            conn.commit()
+        has_more = len(rows) > limit
+        messages = [
+            StoredMessage(id, role, content, created_at.isoformat(), ttft, prompt_tokens)
+            for id, role, content, created_at, ttft, prompt_tokens in reversed(rows[:limit])
+        ]
+        return Page(messages, has_more)
+
+    def metrics(self) -> dict:
+        out = dict(self.stats)
+        out["pending"] = self._queue.unfinished_tasks
+        return out
@@ -0,0 +1,88 @@
+"""Settings shared by the Streamlit app and the command-line tools."""
+
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DB_NAME = os.getenv("DB_NAME", "coursehelper")
+DB_USER = os.getenv("DB_USER", "postgres")
+DB_PASS = os.getenv("DB_PASS", "postgres")
+DB_HOST = os.getenv("DB_HOST", "db")
+DB_PORT = os.getenv("DB_PORT", "5432")
+
+DB_SETTINGS = dict(dbname=DB_NAME, user=DB_USER, password=DB_PASS, host=DB_HOST, port=DB_PORT)
+
+CHAT_MODEL = "gpt-5-nano"
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# "openai" for text-embedding-3-small, "hash" for the offline stub.
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai")
+# "local" uses the pgvector index, "remote" the OpenAI-hosted vector store and
+# "numpy" the offline index at NUMPY_INDEX_PATH (see numpy_index.py).
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "local")
+# Name of the hosted vector store searched by the "remote" backend.
+VECTOR_STORE_NAME = os.getenv("VECTOR_STORE_NAME", "vector1")
+NUMPY_INDEX_PATH = os.getenv(
+    "NUMPY_INDEX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".numpy_index")
+)
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "4"))
+# How the pgvector backend ranks chunks: "vector", "lexical" (Postgres full-text
+# search) or "hybrid" (both, fused; see retrieval.py).
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+
+# Embedding requests from all sessions are batched for up to EMBED_BATCH_WAIT_MS
+# or EMBED_BATCH_MAX texts (see embedding_service.py). Vectors are cached in
+# memory (EMBED_CACHE_SIZE of them) and, with EMBED_STORE_PATH set, in a
+# memory-mapped file holding up to EMBED_STORE_SIZE.
+EMBED_BATCH_MAX = int(os.getenv("EMBED_BATCH_MAX", "64"))
+EMBED_BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", "5"))
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))
+EMBED_STORE_PATH = os.getenv("EMBED_STORE_PATH", "")
+EMBED_STORE_SIZE = int(os.getenv("EMBED_STORE_SIZE", "100000"))
+
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+
+# Fallback expiry for cached flashcard decks; edits normally invalidate them
+# immediately through LISTEN/NOTIFY.
+DECK_CACHE_TTL = float(os.getenv("DECK_CACHE_TTL", "300"))
+
+# Upper bound on concurrent upstream chat requests across all sessions.
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+
+# Token budget for earlier chat turns sent verbatim with each question; older
+# turns are folded into a rolling summary of at most SUMMARY_MAX_TOKENS.
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "250"))
+
+# Local cache of the OpenAI vector store id and file list used by
+# VectorFetchPrototype.py (see vector_manifest.py).
+VECTOR_MANIFEST_PATH = os.getenv(
+    "VECTOR_MANIFEST_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".vector_manifest.sqlite3")
+)
+
+# Timing spans and histograms (see telemetry.py). Off by default; with
+# METRICS_PORT set the app serves /metrics, and TRACE_LOG logs one JSON line
+# per span. PROFILE_INTERVAL > 0 starts the sampling profiler, which writes
+# collapsed stacks to PROFILE_OUTPUT at exit.
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "").lower() in ("1", "true", "yes")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+TRACE_LOG = os.getenv("TRACE_LOG", "").lower() in ("1", "true", "yes")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0"))
+PROFILE_OUTPUT = os.getenv("PROFILE_OUTPUT", "profile.collapsed")
+
+# Out-of-scope detection (see scope.py): prompts scored at or above
+# SCOPE_THRESHOLD get the fallback message without an LLM call; scores from
+# SCOPE_BORDERLINE up are escalated to the LLM and counted as borderline.
+SCOPE_THRESHOLD = float(os.getenv("SCOPE_THRESHOLD", "0.8"))
+SCOPE_BORDERLINE = float(os.getenv("SCOPE_BORDERLINE", "0.5"))
+
+# Where session state is kept between reruns (see session_state.py): "memory"
+# for a single app process, "postgres" when replicas share a load balancer.
+# Postgres sessions untouched for SESSION_TTL_DAYS are purged at startup.
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_TTL_DAYS = float(os.getenv("SESSION_TTL_DAYS", "14"))
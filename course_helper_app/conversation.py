@@ -0,0 +1,191 @@
+"""Multi-turn chat context within a token budget.
+
+The most recent turns are sent verbatim as long as they fit in
+``history_budget`` tokens (counted locally, see tokens.py). Older turns are
+folded into a rolling summary that is sent as a system message. The summary
+is only regenerated when the verbatim tail outgrows the budget; it is then
+extended with just the turns being folded and the tail is cut back to
+``keep_ratio`` of the budget, so a long chat costs one short summarization
+call every few turns rather than one per turn.
+
+That call is not made while building the prompt: the question is answered
+with the previous summary and the cut-back tail, and the turns to fold are
+returned as a ``SummaryFold`` for the caller to apply once the reply is out
+(``fold``, or ``fold_later`` on a background thread).
+"""
+
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from tokens import count_tokens
+
+# Tokens OpenAI adds around each chat message (role, separators).
+MESSAGE_OVERHEAD = 4
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You keep running notes of a tutoring conversation about Software Engineering."
+)
+
+
+@dataclass
+class RollingSummary:
+    """Summary of ``history[:covered]``; kept in the session between reruns."""
+
+    text: str = ""
+    covered: int = 0
+
+
+@dataclass
+class SummaryFold:
+    """Turns ``start:start + len(turns)`` of the history, still to be added to ``summary``."""
+
+    summary: RollingSummary
+    start: int
+    turns: List[dict]
+
+
+@dataclass
+class ContextResult:
+    messages: List[dict]
+    prompt_tokens: int
+    history_turns: int  # turns sent verbatim
+    summarized_turns: int  # turns represented by the summary
+    fold: Optional[SummaryFold] = None  # apply with ConversationContext.fold after the reply
+
+
+def message_tokens(messages: List[dict]) -> int:
+    return sum(count_tokens(m.get("content") or "") + MESSAGE_OVERHEAD for m in messages)
+
+
+def build_summary_prompt(previous: str, turns: List[dict], max_tokens: int) -> str:
+    transcript = "\n".join(f"{m['role'].capitalize()}: {m['content']}" for m in turns)
+    earlier = f"Notes so far:\n{previous}\n\n" if previous else ""
+    return (
+        f"{earlier}New turns:\n{transcript}\n\n"
+        f"Update the notes to cover the new turns. Keep the topics, definitions and "
+        f"examples the student asked about and anything they said about themselves. "
+        f"At most {max_tokens} tokens, plain text."
+    )
+
+
+def make_llm_summarizer(complete: Callable[..., str], max_tokens: int = 250) -> Callable[[str, List[dict]], str]:
+    """Wrap ``complete(messages) -> text`` (e.g. ``LLMGateway.complete``) as a summarizer."""
+
+    def summarize(previous: str, turns: List[dict]) -> str:
+        return complete([
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": build_summary_prompt(previous, turns, max_tokens)},
+        ]).strip()
+
+    return summarize
+
+
+class ConversationContext:
+    """Builds the chat messages for a new question from the session history.
+
+    ``summarize(previous_summary, turns) -> str`` folds old turns into the
+    summary; without one, old turns are simply dropped. At most one fold per
+    summary is in flight at a time.
+    """
+
+    def __init__(
+        self,
+        summarize: Optional[Callable[[str, List[dict]], str]] = None,
+        history_budget: int = 1500,
+        keep_ratio: float = 0.5,
+    ):
+        self.summarize = summarize
+        self.history_budget = history_budget
+        self.keep_ratio = keep_ratio
+        self._lock = threading.Lock()
+        self._folding = weakref.WeakValueDictionary()  # id(summary) -> its fold in flight
+        self._executor = None
+
+    def build(self, history: List[dict], question_messages: List[dict], summary: RollingSummary) -> ContextResult:
+        """Messages for the model: question's system prompt, summary, recent turns, question.
+
+        ``history`` holds the earlier chat messages (dicts with ``role`` and
+        ``content``), ``question_messages`` the system and user messages for
+        the new question (see ``retrieval.build_messages``). ``summary`` is
+        only reset here, when the history was cleared; turns that no longer
+        fit are left out and returned as ``ContextResult.fold``.
+        """
+        turns = [{"role": m["role"], "content": m.get("content") or ""} for m in history]
+        if summary.covered > len(turns):  # history was cleared
+            summary.text, summary.covered = "", 0
+
+        fold = None
+        recent = turns[summary.covered:]
+        if message_tokens(recent) > self.history_budget:
+            keep = self._tail_start(recent, int(self.history_budget * self.keep_ratio))
+            fold, pending = self._claim(summary, recent[:keep])
+            if pending is not None:
+                # Nothing after the pending fold is in a summary yet, so all
+                # of it is sent, with as many of the fold's turns as fit.
+                pending_end = pending.start + len(pending.turns) - summary.covered
+                keep = min(max(pending_end, 0), self._tail_start(recent, self.history_budget))
+            recent = recent[keep:]
+
+        system, *rest = question_messages
+        messages = [system]
+        if summary.text:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary.text}"})
+        messages += recent + rest
+        return ContextResult(messages, message_tokens(messages), len(recent), summary.covered, fold)
+
+    def fold(self, fold: SummaryFold) -> bool:
+        """Add ``fold.turns`` to its summary; True if the summary text was regenerated.
+
+        A failed summarization keeps the old text and the folded turns are
+        dropped. Blocks for the summarization call.
+        """
+        summary = fold.summary
+        try:
+            text, regenerated = summary.text, False
+            if self.summarize is not None:
+                try:
+                    text, regenerated = self.summarize(summary.text, fold.turns), True
+                except Exception:
+                    pass
+            if summary.covered == fold.start:  # not reset in the meantime
+                summary.text, summary.covered = text, fold.start + len(fold.turns)
+            return regenerated
+        finally:
+            with self._lock:
+                if self._folding.get(id(summary)) is fold:
+                    del self._folding[id(summary)]
+
+    def fold_later(self, fold: Optional[SummaryFold]):
+        """``fold`` on a background thread; the summary changes in place when it is done."""
+        if fold is None:
+            return None
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summary")
+        return self._executor.submit(self.fold, fold)
+
+    def _claim(self, summary: RollingSummary, turns: List[dict]):
+        """``(new fold, None)``, or ``(None, fold in flight)`` if ``summary`` has one."""
+        with self._lock:
+            pending = self._folding.get(id(summary))
+            if pending is not None and pending.summary is summary:
+                return None, pending  # the fold in flight catches up first
+            fold = SummaryFold(summary, summary.covered, turns)
+            self._folding[id(summary)] = fold
+        return fold, None
+
+    @staticmethod
+    def _tail_start(turns: List[dict], budget: int) -> int:
+        """Index where the longest suffix of ``turns`` within ``budget`` starts."""
+        used = 0
+        start = len(turns)
+        while start > 0:
+            cost = message_tokens(turns[start - 1:start])
+            if used + cost > budget:
+                break
+            used += cost
+            start -= 1
+        return start
@@ -0,0 +1,143 @@
+"""Database access shared by the app modules.
+
+``ConnectionPool`` wraps psycopg2's ``ThreadedConnectionPool`` so that each
+query checks out its own connection: callers wait (up to ``timeout`` seconds)
+when every connection is busy, connections that have been idle for a while are
+validated before use, and broken connections are discarded and replaced.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from telemetry import span
+
+
+class PoolTimeout(Exception):
+    """No connection became free within the checkout timeout."""
+
+
+@contextmanager
+def rollback_on_error(conn):
+    """Roll back the open transaction if the block raises."""
+    try:
+        yield
+    except Exception:
+        conn.rollback()
+        raise
+
+
+class ConnectionPool:
+    def __init__(self, minconn=1, maxconn=10, timeout=5.0, validate_after=5.0, **dsn):
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.validate_after = validate_after
+        self._pool = pg_pool.ThreadedConnectionPool(minconn, maxconn, **dsn)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._last_used = {}
+        self._in_use = 0
+        self._waiting = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._reconnects = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _is_alive(self, conn) -> bool:
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if last_used is not None and time.monotonic() - last_used < self.validate_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _checkout(self):
+        conn = self._pool.getconn()
+        if not self._is_alive(conn):
+            self._discard(conn)
+            with self._lock:
+                self._reconnects += 1
+            conn = self._pool.getconn()
+        return conn
+
+    def _discard(self, conn):
+        self._last_used.pop(id(conn), None)
+        self._pool.putconn(conn, close=True)
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for the duration of the ``with`` block."""
+        start = time.monotonic()
+        with self._lock:
+            self._waiting += 1
+        acquired = self._slots.acquire(timeout=self.timeout)
+        waited = time.monotonic() - start
+        with self._lock:
+            self._waiting -= 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            if not acquired:
+                self._timeouts += 1
+        if not acquired:
+            raise PoolTimeout(f"no database connection free after {self.timeout:.1f}s")
+
+        try:
+            conn = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+
+        broken = False
+        timing = span("db.connection", wait_ms=round(waited * 1000, 3)).start()
+        try:
+            yield conn
+        except psycopg2.OperationalError:
+            broken = True
+            raise
+        finally:
+            timing.end()
+            try:
+                if conn.closed:
+                    broken = True
+                elif conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                broken = True
+            if broken:
+                self._discard(conn)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+                self._pool.putconn(conn)
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "in_use": self._in_use,
+                "waiting": self._waiting,
+                "max": self.maxconn,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "reconnects": self._reconnects,
+                "wait_seconds_total": round(self._wait_total, 4),
+                "wait_seconds_max": round(self._wait_max, 4),
+            }
+
+    def close(self):
+        self._pool.closeall()
@@ -0,0 +1,19 @@
+-- Semantic answer cache for the chatbot (tier two of response_cache.py).
+CREATE EXTENSION IF NOT EXISTS vector;
+
+CREATE TABLE IF NOT EXISTS response_cache (
+    id SERIAL PRIMARY KEY,
+    scope TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    embedding vector(1536) NOT NULL,
+    latency_ms INTEGER NOT NULL DEFAULT 0,
+    hits INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS response_cache_scope_created_idx
+    ON response_cache (scope, created_at);
+
+CREATE INDEX IF NOT EXISTS response_cache_embedding_idx
+    ON response_cache USING hnsw (embedding vector_cosine_ops);
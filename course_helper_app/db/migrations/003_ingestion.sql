@@ -0,0 +1,16 @@
+-- Incremental ingestion (see ingest.py): per-file fingerprints, chunk content
+-- hashes and tombstones for chunks whose source changed.
+CREATE TABLE IF NOT EXISTS documents (
+    source TEXT PRIMARY KEY,
+    file_hash TEXT NOT NULL,
+    size BIGINT NOT NULL,
+    mtime_ns BIGINT NOT NULL,
+    chapter INTEGER,
+    ingested_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS content_hash TEXT;
+ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ;
+
+CREATE INDEX IF NOT EXISTS document_chunks_live_source_idx
+    ON document_chunks (source, content_hash) WHERE deleted_at IS NULL;
@@ -0,0 +1,29 @@
+-- Flashcard decks are cached per chapter in the app (see deck_cache.py).
+CREATE INDEX IF NOT EXISTS flashcards_chapter_idx ON flashcards (chapter, id);
+
+-- Tell the app which chapter's deck changed so it can drop its cached copy.
+-- An empty payload means "every chapter".
+CREATE OR REPLACE FUNCTION notify_flashcards_changed() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        PERFORM pg_notify('flashcards_changed', '');
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM pg_notify('flashcards_changed', COALESCE(OLD.chapter::text, ''));
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM pg_notify('flashcards_changed', COALESCE(NEW.chapter::text, ''));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS flashcards_changed ON flashcards;
+CREATE TRIGGER flashcards_changed
+    AFTER INSERT OR UPDATE OR DELETE ON flashcards
+    FOR EACH ROW EXECUTE FUNCTION notify_flashcards_changed();
+
+DROP TRIGGER IF EXISTS flashcards_truncated ON flashcards;
+CREATE TRIGGER flashcards_truncated
+    AFTER TRUNCATE ON flashcards
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_flashcards_changed();
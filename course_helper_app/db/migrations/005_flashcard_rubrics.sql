@@ -0,0 +1,12 @@
+-- Pre-generated grading rubrics, one per flashcard (see rubrics.py).
+-- content_hash is the hash of the card's question and answer the rubric was
+-- generated from, so edited cards are regenerated.
+CREATE TABLE IF NOT EXISTS flashcard_rubrics (
+    card_id INTEGER PRIMARY KEY REFERENCES flashcards (id) ON DELETE CASCADE,
+    content_hash TEXT NOT NULL,
+    key_concepts JSONB NOT NULL,
+    misconceptions JSONB NOT NULL,
+    hint TEXT NOT NULL,
+    model TEXT NOT NULL,
+    generated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
@@ -0,0 +1,21 @@
+-- Persistent chat sessions (see chat_store.py). Conversation ids are
+-- generated by the app so messages can be queued before the row exists;
+-- the writer upserts the conversation in the same batch as its messages.
+CREATE TABLE IF NOT EXISTS conversations (
+    id UUID PRIMARY KEY,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS messages (
+    id BIGSERIAL PRIMARY KEY,
+    conversation_id UUID NOT NULL REFERENCES conversations (id) ON DELETE CASCADE,
+    role TEXT NOT NULL CHECK (role IN ('user', 'assistant')),
+    content TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    ttft REAL,
+    prompt_tokens INTEGER
+);
+
+-- Resume reads the newest page and then pages backwards by id.
+CREATE INDEX IF NOT EXISTS messages_conversation_idx ON messages (conversation_id, id DESC);
@@ -0,0 +1,39 @@
+-- Structured syllabus facts answered directly by syllabus.py instead of the
+-- LLM. Course codes are stored as "CSC 4350" (see syllabus.normalize_course).
+CREATE TABLE IF NOT EXISTS courses (
+    code TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    credits INTEGER,
+    description TEXT
+);
+
+-- A prerequisite need not be a row in courses; its title is then omitted.
+CREATE TABLE IF NOT EXISTS prerequisites (
+    course_code TEXT NOT NULL REFERENCES courses (code) ON DELETE CASCADE,
+    prerequisite_code TEXT NOT NULL,
+    PRIMARY KEY (course_code, prerequisite_code)
+);
+
+CREATE TABLE IF NOT EXISTS deadlines (
+    id SERIAL PRIMARY KEY,
+    course_code TEXT NOT NULL REFERENCES courses (code) ON DELETE CASCADE,
+    title TEXT NOT NULL,
+    due_at TIMESTAMPTZ NOT NULL,
+    details TEXT
+);
+
+CREATE INDEX IF NOT EXISTS deadlines_course_due_idx ON deadlines (course_code, due_at);
+
+INSERT INTO courses (code, title, credits, description) VALUES
+('CSC 4350', 'Software Engineering', 4,
+ 'Software life cycle models, requirements, design, testing and project management, taught through a team project.'),
+('CSC 2720', 'Data Structures', 3, NULL),
+('CSC 3210', 'Computer Organization and Programming', 3, NULL),
+('CSC 3320', 'System-Level Programming', 3, NULL)
+ON CONFLICT DO NOTHING;
+
+INSERT INTO prerequisites (course_code, prerequisite_code) VALUES
+('CSC 4350', 'CSC 2720'),
+('CSC 4350', 'CSC 3210'),
+('CSC 4350', 'CSC 3320')
+ON CONFLICT DO NOTHING;
@@ -0,0 +1,9 @@
+-- Streamlit session state shared by every app replica (see session_state.py).
+-- One row per session and key, so a rerun rewrites only the keys it changed.
+CREATE TABLE IF NOT EXISTS session_state (
+    session_id UUID NOT NULL,
+    key TEXT NOT NULL,
+    value BYTEA NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (session_id, key)
+);
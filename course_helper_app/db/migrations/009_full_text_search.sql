@@ -0,0 +1,18 @@
+-- Full-text search for hybrid retrieval (see retrieval.py). Generated columns
+-- keep the tsvectors in step with the text on every insert and update.
+ALTER TABLE document_chunks
+    ADD COLUMN IF NOT EXISTS content_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('english', content)) STORED;
+
+CREATE INDEX IF NOT EXISTS document_chunks_content_tsv_idx
+    ON document_chunks USING gin (content_tsv);
+
+ALTER TABLE flashcards
+    ADD COLUMN IF NOT EXISTS search_tsv tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(question, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(answer, '')), 'B')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS flashcards_search_tsv_idx
+    ON flashcards USING gin (search_tsv);
@@ -0,0 +1,176 @@
+"""Process-wide cache of flashcard decks, one per chapter.
+
+Decks are loaded once and kept as immutable tuples of ``Card``s, so flipping
+and navigating cards costs no database round trips. A listener thread
+subscribes to the ``flashcards_changed`` notification (see
+db/migrations/004_flashcards_deck_cache.sql) and drops the affected chapter;
+entries also expire after ``ttl`` seconds in case a notification is missed.
+The list of chapters that have cards is cached the same way and dropped on
+every change, since any insert or delete can add or empty a chapter.
+"""
+
+import select
+import threading
+import time
+from typing import Callable, List, NamedTuple, Optional
+
+import psycopg2
+
+CHANNEL = "flashcards_changed"
+
+# Cache key of the chapter list.
+_CHAPTERS = object()
+
+
+class Card(NamedTuple):
+    id: int
+    question: str
+    answer: str
+
+
+class Deck(tuple):
+    """Immutable sequence of cards with lookup by card id."""
+
+    def __new__(cls, cards=()):
+        deck = super().__new__(cls, cards)
+        deck._positions = {card.id: i for i, card in enumerate(deck)}
+        return deck
+
+    def position(self, card_id: Optional[int], fallback: int = 0) -> int:
+        """Index of ``card_id``; if it was removed, ``fallback`` clamped to the deck."""
+        if card_id in self._positions:
+            return self._positions[card_id]
+        return min(max(fallback, 0), len(self) - 1) if self else 0
+
+
+def load_deck(conn, chapter) -> Deck:
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT id, question, answer FROM flashcards WHERE chapter = %s ORDER BY id;",
+            (chapter,),
+        )
+        rows = cur.fetchall()
+    return Deck(Card(*row) for row in rows)
+
+
+def load_chapters(conn) -> tuple:
+    """Chapters that have at least one flashcard, in order."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT DISTINCT chapter FROM flashcards WHERE chapter IS NOT NULL ORDER BY chapter;")
+        return tuple(row[0] for row in cur.fetchall())
+
+
+def search_flashcards(conn, query: str, chapter: Optional[int] = None, limit: int = 10) -> List[Card]:
+    """Cards matching every term of ``query`` (question matches rank first)."""
+    chapter_filter = "AND chapter = %(chapter)s" if chapter is not None else ""
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT id, question, answer
+            FROM flashcards, websearch_to_tsquery('english', %(query)s) AS q
+            WHERE search_tsv @@ q {chapter_filter}
+            ORDER BY ts_rank(search_tsv, q) DESC, id
+            LIMIT %(limit)s;
+            """,
+            {"query": query, "chapter": chapter, "limit": limit},
+        )
+        return [Card(*row) for row in cur.fetchall()]
+
+
+class DeckCache:
+    """Cache of ``Deck``s keyed by chapter.
+
+    ``loader(chapter)`` fetches a deck from the database on a miss and
+    ``chapters_loader()`` the chapter list.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[int], Deck],
+        ttl: float = 300,
+        clock=time.monotonic,
+        chapters_loader: Optional[Callable[[], tuple]] = None,
+    ):
+        self.loader = loader
+        self.chapters_loader = chapters_loader
+        self.ttl = ttl
+        self._clock = clock
+        self._decks = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._listener = None
+
+    def get(self, chapter) -> Deck:
+        return self._cached(chapter, lambda: self.loader(chapter))
+
+    def chapters(self) -> tuple:
+        """Chapters that have flashcards."""
+        return self._cached(_CHAPTERS, self.chapters_loader)
+
+    def _cached(self, key, load):
+        with self._lock:
+            entry = self._decks.get(key)
+            if entry and entry[0] > self._clock():
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+        value = load()
+        with self._lock:
+            # Don't cache a value loaded while an invalidation came in.
+            if generation == self._generation:
+                self._decks[key] = (self._clock() + self.ttl, value)
+        return value
+
+    def invalidate(self, chapter=None):
+        """Drop one chapter's deck, or every deck when ``chapter`` is None."""
+        with self._lock:
+            self._generation += 1
+            if chapter is None:
+                self._decks.clear()
+            else:
+                self._decks.pop(chapter, None)
+                self._decks.pop(_CHAPTERS, None)
+
+    def handle_notification(self, payload: str):
+        self.invalidate(int(payload) if payload.strip().isdigit() else None)
+
+    def start_listener(self, dsn: dict, poll_interval: float = 5.0):
+        """Start a daemon thread that LISTENs for flashcard changes."""
+        if self._listener is None:
+            self._listener = threading.Thread(
+                target=self._listen, args=(dsn, poll_interval), name="deck-cache-listener", daemon=True
+            )
+            self._listener.start()
+
+    def _listen(self, dsn: dict, poll_interval: float):
+        backoff = 1.0
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(**dsn)
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {CHANNEL};")
+                # Changes made while we were disconnected were never delivered.
+                self.invalidate()
+                backoff = 1.0
+                while True:
+                    if select.select([conn], [], [], poll_interval) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self.handle_notification(conn.notifies.pop(0).payload)
+            except psycopg2.Error:
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+            finally:
+                if conn is not None and not conn.closed:
+                    conn.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            decks = sum(1 for key in self._decks if key is not _CHAPTERS)
+            return {"decks": decks, "hits": self.hits, "misses": self.misses}
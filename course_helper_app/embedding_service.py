@@ -0,0 +1,296 @@
+"""Shared embedding front end: micro-batching plus a vector cache.
+
+Retrieval, the response cache and grading each embed one string at a time.
+``EmbeddingService`` wraps any embedder (see embeddings.py) and merges those
+calls across sessions: the first request to miss the cache opens a batch, and
+the batch is sent as one ``embed`` call once ``max_batch`` distinct texts have
+queued or ``max_wait`` seconds have passed, whichever comes first. The results
+are handed back to every waiting caller.
+
+Vectors are cached as float32 rows keyed by a hash of the model and text:
+``VectorCache`` is an in-memory LRU, and ``VectorStore`` is an optional
+memory-mapped file that keeps vectors across restarts.
+
+    embedder = EmbeddingService(make_embedder("hash"), store=VectorStore("vectors.f32", 1536))
+    vec = embedder.embed_one("What is UML?")
+    embedder.stats()  # batch sizes and cache hit rates
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from telemetry import count
+
+log = logging.getLogger(__name__)
+
+KEY_BYTES = 16
+
+
+def text_key(model: str, text: str) -> bytes:
+    return hashlib.blake2b(f"{model}\0{text}".encode(), digest_size=KEY_BYTES).digest()
+
+
+class VectorCache:
+    """LRU of float32 vectors in one preallocated ``(capacity, dim)`` array."""
+
+    def __init__(self, dim: int, capacity: int = 4096):
+        self.dim = dim
+        self.capacity = capacity
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._slots = OrderedDict()  # key -> row, least recently used first
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._slots)
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self._slots.get(key)
+            if row is None:
+                return None
+            self._slots.move_to_end(key)
+            return self._vectors[row].copy()
+
+    def put(self, key: bytes, vector):
+        with self._lock:
+            row = self._slots.get(key)
+            if row is None:
+                if len(self._slots) < self.capacity:
+                    row = len(self._slots)
+                else:
+                    _, row = self._slots.popitem(last=False)
+            self._slots[key] = row
+            self._slots.move_to_end(key)
+            self._vectors[row] = vector
+
+
+class VectorStore:
+    """Fixed-size on-disk hash table of float32 vectors, memory-mapped.
+
+    Two files: ``path`` holds the ``(capacity, dim)`` vectors and
+    ``path + ".keys"`` the key of each slot (all zero when empty). A key lives
+    in its home slot or one of the next ``probes`` slots; when all of those
+    are taken, the home slot is overwritten.
+
+    One process writes; others may read the same files. ``put`` clears a
+    slot's key while it rewrites the vector, and ``get`` checks the key again
+    after copying the vector, so a reader racing a write gets a miss rather
+    than a torn vector or another text's vector.
+    """
+
+    def __init__(self, path: str, dim: int, capacity: int = 100_000, probes: int = 8):
+        self.dim = dim
+        self.capacity = capacity
+        self.probes = probes
+        mode = "r+" if os.path.exists(path) else "w+"
+        self._vectors = np.memmap(path, dtype=np.float32, mode=mode, shape=(capacity, dim))
+        self._keys = np.memmap(path + ".keys", dtype=np.uint8, mode=mode, shape=(capacity, KEY_BYTES))
+        self._lock = threading.Lock()
+
+    def _slots(self, key: bytes):
+        home = int.from_bytes(key[:8], "little") % self.capacity
+        return [(home + i) % self.capacity for i in range(self.probes)]
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        wanted = np.frombuffer(key, dtype=np.uint8)
+        # Under the lock, so a put in this process cannot change the row
+        # between the key check and the read; a writer in another process
+        # can, which the second key check catches.
+        with self._lock:
+            for slot in self._slots(key):
+                stored = self._keys[slot]
+                if np.array_equal(stored, wanted):
+                    vector = np.array(self._vectors[slot])
+                    return vector if np.array_equal(self._keys[slot], wanted) else None
+                if not stored.any():
+                    return None
+        return None
+
+    def put(self, key: bytes, vector):
+        wanted = np.frombuffer(key, dtype=np.uint8)
+        slots = self._slots(key)
+        with self._lock:
+            target = slots[0]
+            for slot in slots:
+                stored = self._keys[slot]
+                if not stored.any() or np.array_equal(stored, wanted):
+                    target = slot
+                    break
+            # Clear the key first, so a reader in another process that copies
+            # the vector meanwhile sees the key change (see get).
+            self._keys[target] = 0
+            self._vectors[target] = vector
+            self._keys[target] = wanted
+
+    def flush(self):
+        self._vectors.flush()
+        self._keys.flush()
+
+
+class _Request:
+    __slots__ = ("key", "text", "future")
+
+    def __init__(self, key: bytes, text: str):
+        self.key = key
+        self.text = text
+        self.future = Future()
+
+
+class EmbeddingService:
+    """Batched, cached ``embed``/``embed_one`` over ``embedder``.
+
+    A drop-in embedder: vectors come back as lists of floats. Thread-safe;
+    callers block only until their batch returns, and at most ``timeout``
+    seconds (then TimeoutError). An error from the wrapped embedder, or a
+    result that is not one ``dim``-sized row per text, is raised to every
+    caller in the failed batch.
+    """
+
+    def __init__(self, embedder, max_batch: int = 64, max_wait: float = 0.005,
+                 cache: Optional[VectorCache] = None, store: Optional[VectorStore] = None,
+                 timeout: float = 30.0):
+        self.embedder = embedder
+        self.dim = embedder.dim
+        self.model = getattr(embedder, "model", type(embedder).__name__)
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self.cache = cache if cache is not None else VectorCache(self.dim)
+        self.store = store
+        self._counts = Counter()
+        self._batch_sizes = Counter()
+        self._stats_lock = threading.Lock()
+        self._pending: Dict[bytes, _Request] = {}  # queued or in flight, by key
+        self._queue: List[_Request] = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        vectors: List = [None] * len(texts)
+        waiting = []
+        for i, text in enumerate(texts):
+            key = text_key(self.model, text)
+            vector = self._cached(key)
+            if vector is not None:
+                vectors[i] = vector
+            else:
+                waiting.append((i, self._submit(key, text)))
+        deadline = time.monotonic() + self.timeout
+        for i, future in waiting:
+            vectors[i] = future.result(max(0.0, deadline - time.monotonic()))
+        return [v.tolist() for v in vectors]
+
+    def embed_one(self, text: str) -> List[float]:
+        return self.embed([text])[0]
+
+    def _cached(self, key: bytes) -> Optional[np.ndarray]:
+        vector = self.cache.get(key)
+        if vector is not None:
+            self._count("hit")
+            return vector
+        if self.store is not None:
+            vector = self.store.get(key)
+            if vector is not None:
+                self.cache.put(key, vector)
+                self._count("disk")
+                return vector
+        return None
+
+    def _submit(self, key: bytes, text: str) -> Future:
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("embedding service is closed")
+            request = self._pending.get(key)
+            if request is not None:
+                self._count("shared")  # the same text is already on its way
+                return request.future
+            self._count("miss")
+            request = self._pending[key] = _Request(key, text)
+            self._queue.append(request)
+            self._cond.notify()
+            return request.future
+
+    def _count(self, result: str):
+        with self._stats_lock:
+            self._counts[result] += 1
+        count("embedding_requests_total", result=result)
+
+    def _next_batch(self) -> List[_Request]:
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            deadline = time.monotonic() + self.max_wait
+            while len(self._queue) < self.max_batch and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return  # closed and drained
+            with self._stats_lock:
+                self._batch_sizes[len(batch)] += 1
+            count("embedding_batches_total")
+            count("embedding_batch_texts_total", len(batch))
+            try:
+                vectors = np.asarray(self.embedder.embed([r.text for r in batch]), dtype=np.float32)
+                if vectors.shape != (len(batch), self.dim):
+                    raise ValueError(
+                        f"embedder returned shape {vectors.shape} for {len(batch)} texts of dimension {self.dim}"
+                    )
+                for request, vector in zip(batch, vectors):
+                    self.cache.put(request.key, vector)
+                    if self.store is not None:
+                        self.store.put(request.key, vector)
+            except Exception as e:
+                log.warning("embedding batch of %d failed", len(batch), exc_info=True)
+                results = [e] * len(batch)
+            else:
+                results = list(vectors)
+            with self._cond:
+                for request in batch:
+                    del self._pending[request.key]
+            for request, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    request.future.set_exception(result)
+                else:
+                    request.future.set_result(result)
+
+    def stats(self) -> dict:
+        """Request counts by outcome, cache hit rate and the batch size distribution."""
+        with self._stats_lock:
+            counts, sizes = dict(self._counts), dict(self._batch_sizes)
+        requests = sum(counts.values())
+        batches = sum(sizes.values())
+        texts = sum(size * n for size, n in sizes.items())
+        return {
+            "requests": counts,
+            "hit_rate": (counts.get("hit", 0) + counts.get("disk", 0)) / requests if requests else 0.0,
+            "batches": batches,
+            "mean_batch_size": texts / batches if batches else 0.0,
+            "batch_sizes": dict(sorted(sizes.items())),
+        }
+
+    def close(self):
+        """Finish the queued batches and stop the batching thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        if self.store is not None:
+            self.store.flush()
@@ -0,0 +1,125 @@
+"""Embedding providers.
+
+Anything with ``embed(texts) -> list of vectors`` can be used where an
+embedder is expected. ``OpenAIEmbedder`` is the production provider;
+``HashEmbedder`` is a deterministic local stand-in for offline tests, and
+``TfidfHashEmbedder`` an offline provider good enough for real retrieval once
+fitted to the corpus (see numpy_index.py).
+"""
+
+import hashlib
+import math
+import re
+from typing import Iterable, List, Sequence
+
+import numpy as np
+
+EMBEDDING_DIM = 1536  # text-embedding-3-small
+
+
+class OpenAIEmbedder:
+    def __init__(self, client, model: str = "text-embedding-3-small"):
+        self.client = client
+        self.model = model
+        self.dim = EMBEDDING_DIM
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        resp = self.client.embeddings.create(model=self.model, input=list(texts))
+        return [item.embedding for item in sorted(resp.data, key=lambda d: d.index)]
+
+    def embed_one(self, text: str) -> List[float]:
+        return self.embed([text])[0]
+
+
+class HashEmbedder:
+    """Bag-of-words embedding using the hashing trick.
+
+    Texts sharing words get similar vectors, which is enough to exercise
+    retrieval and caching without network access.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    def _vector(self, text: str) -> List[float]:
+        vec = [0.0] * self.dim
+        for token in re.findall(r"\w+", text.lower()):
+            digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            sign = 1.0 if digest[4] & 1 else -1.0
+            vec[bucket] += sign
+        norm = math.sqrt(sum(x * x for x in vec))
+        return [x / norm for x in vec] if norm else vec
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        return [self._vector(t) for t in texts]
+
+    def embed_one(self, text: str) -> List[float]:
+        return self._vector(text)
+
+
+class TfidfHashEmbedder:
+    """Hashed TF-IDF over word unigrams and bigrams.
+
+    Each term is hashed to a signed bucket and weighted by sublinear term
+    frequency times the inverse document frequency of its bucket, which
+    ``fit`` learns from the corpus (all ones until then).
+    """
+
+    model = "tfidf-hash"
+
+    def __init__(self, dim: int = 4096, idf=None):
+        self.dim = dim
+        self.idf = np.ones(dim, dtype=np.float32) if idf is None else np.asarray(idf, dtype=np.float32)
+
+    def _terms(self, text: str) -> dict:
+        words = re.findall(r"\w+", text.lower())
+        counts = {}
+        for term in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            counts[term] = counts.get(term, 0) + 1
+        buckets = {}
+        for term, tf in counts.items():
+            digest = hashlib.blake2b(term.encode(), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            sign = 1.0 if digest[4] & 1 else -1.0
+            buckets[bucket] = buckets.get(bucket, 0.0) + sign * (1.0 + math.log(tf))
+        return buckets
+
+    def fit(self, texts: Iterable[str]) -> "TfidfHashEmbedder":
+        df = np.zeros(self.dim, dtype=np.float64)
+        n = 0
+        for text in texts:
+            df[list(self._terms(text))] += 1
+            n += 1
+        self.idf = (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+        return self
+
+    def vectors(self, texts: Sequence[str]) -> np.ndarray:
+        """L2-normalized float32 embeddings, one row per text."""
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            buckets = self._terms(text)
+            if buckets:
+                idx = np.fromiter(buckets, dtype=np.int64, count=len(buckets))
+                out[i, idx] = np.fromiter(buckets.values(), dtype=np.float32, count=len(buckets))
+        out *= self.idf
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        np.divide(out, norms, out=out, where=norms > 0)
+        return out
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        return self.vectors(texts).tolist()
+
+    def embed_one(self, text: str) -> List[float]:
+        return self.vectors([text])[0].tolist()
+
+
+def make_embedder(provider: str, client=None, model: str = "text-embedding-3-small"):
+    """Build the embedder named by ``provider`` ("openai" or "hash")."""
+    if provider == "hash":
+        return HashEmbedder()
+    if provider == "openai":
+        return OpenAIEmbedder(client, model)
+    raise ValueError(f"Unknown embedding provider: {provider}")
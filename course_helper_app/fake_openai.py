@@ -0,0 +1,187 @@
+"""A local stand-in for the OpenAI HTTP API, for tests and benchmarks.
+
+    server = FakeOpenAIServer(latency=0.2, tokens_per_second=50).start()
+    client = OpenAI(base_url=server.base_url, api_key="test")
+
+Implements ``/v1/chat/completions`` (plain and ``stream=True``) and
+``/v1/embeddings``. ``latency`` is the delay before the first token and
+``tokens_per_second`` the streaming rate; replies echo a canned answer.
+Every request is counted in ``server.requests``.
+
+Run ``python fake_openai.py --port 8099`` to point the app at it via
+``OPENAI_BASE_URL=http://127.0.0.1:8099/v1``.
+"""
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = (
+    "Software engineering applies engineering principles to the design, "
+    "development, testing and maintenance of software."
+)
+
+
+class FakeOpenAIServer:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, tokens_per_second=0.0, reply=DEFAULT_REPLY, dim=1536):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.reply = reply
+        self.dim = dim
+        self.requests = Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reply_for(self, body: dict) -> str:
+        if body.get("response_format", {}).get("type") == "json_object":
+            return json.dumps({"correct": True, "feedback": "Correct. Nice work."})
+        return self.reply
+
+    def embedding_for(self, text: str):
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [((digest[i % len(digest)] / 255.0) - 0.5) for i in range(self.dim)]
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, payload, status=200):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                path = self.path.rstrip("/")
+                with server._lock:
+                    server.requests[path] += 1
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                try:
+                    if path.endswith("/chat/completions"):
+                        self._chat(body)
+                    elif path.endswith("/embeddings"):
+                        self._embeddings(body)
+                    else:
+                        self._json({"error": {"message": f"unknown path {path}"}}, 404)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up (timeout or cancelled stream).
+                    with server._lock:
+                        server.requests["cancelled"] += 1
+                    self.close_connection = True
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+            def _embeddings(self, body):
+                inputs = body.get("input")
+                inputs = [inputs] if isinstance(inputs, str) else list(inputs)
+                time.sleep(server.latency)
+                self._json({
+                    "object": "list",
+                    "model": body.get("model"),
+                    "data": [
+                        {"object": "embedding", "index": i, "embedding": server.embedding_for(text)}
+                        for i, text in enumerate(inputs)
+                    ],
+                    "usage": {"prompt_tokens": 0, "total_tokens": 0},
+                })
+
+            def _chat(self, body):
+                text = server.reply_for(body)
+                created = int(time.time())
+                base = {"id": "chatcmpl-fake", "created": created, "model": body.get("model", "fake")}
+                time.sleep(server.latency)
+                if not body.get("stream"):
+                    if server.tokens_per_second:
+                        time.sleep(len(text.split()) / server.tokens_per_second)
+                    self._json({
+                        **base,
+                        "object": "chat.completion",
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": text},
+                            "finish_reason": "stop",
+                        }],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": len(text.split()), "total_tokens": 0},
+                    })
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                words = text.split(" ")
+                for i, word in enumerate(words):
+                    delta = word if i == 0 else " " + word
+                    self._event({
+                        **base,
+                        "object": "chat.completion.chunk",
+                        "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}],
+                    })
+                    if server.tokens_per_second:
+                        time.sleep(1 / server.tokens_per_second)
+                self._event({
+                    **base,
+                    "object": "chat.completion.chunk",
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                })
+                self._chunk(b"data: [DONE]\n\n")
+                self._chunk(b"")
+
+            def _event(self, payload):
+                self._chunk(f"data: {json.dumps(payload)}\n\n".encode())
+
+            def _chunk(self, data: bytes):
+                self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI API server.")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=40)
+    args = parser.parse_args()
+    server = FakeOpenAIServer(port=args.port, latency=args.latency, tokens_per_second=args.tokens_per_second)
+    print(f"Fake OpenAI API on {server.base_url}")
+    server._httpd.serve_forever()
@@ -0,0 +1,236 @@
+"""Tiered grading of quiz answers.
+
+Answers are checked locally first, cheapest tier first:
+
+1. normalized exact match against the stored answer,
+2. keyword overlap with the stored answer, or with the key concepts of the
+   card's pre-generated rubric when there is one (see rubrics.py),
+3. embedding similarity (when an embedder is configured).
+
+Each tier either returns a confident verdict or passes the answer on; only
+answers no tier is sure about are sent to the LLM, which replies with JSON
+instead of prose that has to be searched for "incorrect".
+
+Word overlap cannot tell "X" from "not X", so an answer that negates where the
+stored answer does not is never accepted locally. Neither is one padded with
+many words the stored answer does not use (low keyword precision).
+"""
+
+import json
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Optional
+
+from vectors import cosine
+
+STOPWORDS = frozenset(
+    """a an and are as at be by for from has have in into is it its of on or
+    that the their them this to was were which with""".split()
+)
+
+# Negations, as left by normalize_answer ("isn't" -> "isn t").
+NEGATIONS = frozenset(
+    """not no never none nor neither cannot without isn aren wasn weren doesn don didn can couldn won
+    wouldn shouldn hasn haven""".split()
+)
+
+GRADER_SYSTEM_PROMPT = "You are a helpful and encouraging teaching assistant."
+
+
+@dataclass
+class Verdict:
+    correct: bool
+    method: str  # "exact" | "keyword" | "rubric" | "embedding" | "llm"
+    confidence: float
+    feedback: str
+
+
+def normalize_answer(text: str) -> str:
+    text = re.sub(r"[^\w\s]", " ", (text or "").lower())
+    return " ".join(w for w in text.split() if w not in ("a", "an", "the"))
+
+
+def _stem(word: str) -> str:
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            return word[: -len(suffix)]
+    return word
+
+
+def keywords(text: str) -> set:
+    return {_stem(w) for w in normalize_answer(text).split() if w not in STOPWORDS}
+
+
+def keyword_recall(expected: str, given: str) -> float:
+    """Share of the expected answer's keywords that appear in ``given``."""
+    want = keywords(expected)
+    if not want:
+        return 0.0
+    return len(want & keywords(given)) / len(want)
+
+
+def keyword_precision(expected: str, given: str) -> float:
+    """Share of ``given``'s keywords that appear in the expected answer."""
+    have = keywords(given)
+    if not have:
+        return 0.0
+    return len(have & keywords(expected)) / len(have)
+
+
+def negates(expected: str, given: str) -> bool:
+    """True if ``given`` uses a negation that ``expected`` does not."""
+    return bool(set(normalize_answer(given).split()) & NEGATIONS - set(normalize_answer(expected).split()))
+
+
+def concept_coverage(concepts, given: str) -> float:
+    """Share of rubric key concepts that ``given`` mostly mentions."""
+    if not concepts:
+        return 0.0
+    return sum(keyword_recall(c, given) >= 0.5 for c in concepts) / len(concepts)
+
+
+CORRECT_FEEDBACK = "Correct. Nice work — your answer captures the key idea."
+INCORRECT_FEEDBACK = (
+    "Incorrect. Your answer is missing the main idea of this card. "
+    "Re-read the question and think about what the concept is for, then try the next one."
+)
+
+
+class Grader:
+    def __init__(
+        self,
+        llm_grade: Optional[Callable[..., Verdict]] = None,
+        embed: Optional[Callable[[str], list]] = None,
+        keyword_accept: float = 0.8,
+        keyword_reject: float = 0.15,
+        min_precision: float = 0.6,
+        embed_accept: float = 0.88,
+        embed_reject: float = 0.45,
+    ):
+        self.llm_grade = llm_grade
+        self.embed = lru_cache(maxsize=4096)(embed) if embed else None
+        self.keyword_accept = keyword_accept
+        self.keyword_reject = keyword_reject
+        self.min_precision = min_precision
+        self.embed_accept = embed_accept
+        self.embed_reject = embed_reject
+
+    def grade_locally(self, question: str, answer: str, user_answer: str, rubric=None) -> Optional[Verdict]:
+        """Return a confident local verdict, or None if the answer is ambiguous."""
+        incorrect = _incorrect_feedback(rubric)
+        given = normalize_answer(user_answer)
+        if not given:
+            return Verdict(False, "exact", 1.0, "Incorrect. Give it a try — type an answer before submitting.")
+        if given == normalize_answer(answer):
+            return Verdict(True, "exact", 1.0, CORRECT_FEEDBACK)
+
+        # Overlap alone does not accept: the answer must add no negation and
+        # be mostly words the stored answer (or its rubric) uses.
+        reference = " ".join([answer, *rubric.key_concepts]) if rubric is not None else answer
+        negated = negates(reference, user_answer)
+        may_accept = not negated and keyword_precision(reference, user_answer) >= self.min_precision
+        recall = keyword_recall(answer, user_answer)
+        if recall >= self.keyword_accept and may_accept:
+            return Verdict(True, "keyword", recall, CORRECT_FEEDBACK)
+        if rubric is not None and rubric.key_concepts:
+            coverage = concept_coverage(rubric.key_concepts, user_answer)
+            if coverage >= self.keyword_accept and may_accept:
+                return Verdict(True, "rubric", coverage, CORRECT_FEEDBACK)
+            recall = max(recall, coverage)
+
+        if self.embed is not None:
+            try:
+                similarity = cosine(self.embed(answer), self.embed(user_answer))
+            except Exception:
+                similarity = None
+            if similarity is not None:
+                if similarity >= self.embed_accept and not negated:
+                    return Verdict(True, "embedding", similarity, CORRECT_FEEDBACK)
+                if similarity <= self.embed_reject and recall <= self.keyword_reject:
+                    return Verdict(False, "embedding", 1 - similarity, incorrect)
+        elif recall <= self.keyword_reject:
+            return Verdict(False, "keyword", 1 - recall, incorrect)
+        return None
+
+    def grade(self, question: str, answer: str, user_answer: str, rubric=None) -> Verdict:
+        verdict = self.grade_locally(question, answer, user_answer, rubric)
+        if verdict is not None:
+            return verdict
+        if self.llm_grade is None:
+            recall = keyword_recall(answer, user_answer)
+            correct = recall >= 0.5 and not negates(answer, user_answer)
+            return Verdict(correct, "keyword", recall, CORRECT_FEEDBACK if correct else _incorrect_feedback(rubric))
+        return self.llm_grade(question, answer, user_answer, rubric)
+
+
+def _incorrect_feedback(rubric) -> str:
+    if rubric is not None and rubric.hint:
+        return f"Incorrect. Hint: {rubric.hint}"
+    return INCORRECT_FEEDBACK
+
+
+def build_feedback_prompt(question: str, answer: str, user_answer: str) -> str:
+    return f"""
+    A student is being quizzed on Software Engineering.
+    The question was: "{question}"
+    The correct answer is: "{answer}"
+    The student's answer was: "{user_answer}"
+
+    Decide whether the student's answer sufficiently conveys all the same ideas as the correct answer.
+    Reply with a JSON object: {{"correct": true or false, "feedback": "..."}}
+
+    The feedback is brief and constructive, 2-3 sentences.
+    - If the answer is correct, offer encouragement.
+    - If the answer is incorrect, gently explain the misunderstanding and guide them toward the correct concept without simply giving the answer away.
+    """
+
+
+def build_rubric_feedback_prompt(question: str, rubric, user_answer: str) -> str:
+    """Short grading prompt used when the card has a rubric."""
+    concepts = "; ".join(rubric.key_concepts)
+    misconceptions = "; ".join(rubric.misconceptions) or "none listed"
+    return (
+        f'Question: "{question}"\n'
+        f"Key concepts: {concepts}\n"
+        f"Common misconceptions: {misconceptions}\n"
+        f'Student answer: "{user_answer}"\n'
+        'Correct only if it conveys every key concept. Reply as JSON {"correct": bool, "feedback": "2 sentences, '
+        'encouraging; if wrong, nudge without giving the answer"}.'
+    )
+
+
+def parse_llm_verdict(content: str) -> Verdict:
+    """Parse the grader's JSON reply, tolerating a plain "Correct."/"Incorrect." reply."""
+    try:
+        data = json.loads(content)
+        correct = data["correct"]
+        if isinstance(correct, str) and correct.lower() in ("true", "false"):
+            correct = correct.lower() == "true"
+        if not isinstance(correct, bool):
+            raise ValueError(f"not a verdict: {correct!r}")  # e.g. "no"; bool() would call it correct
+        return Verdict(correct, "llm", 1.0, str(data.get("feedback", "")).strip())
+    except (ValueError, KeyError, TypeError):
+        text = (content or "").strip()
+        correct = text.lower().startswith("correct")
+        return Verdict(correct, "llm", 0.5, text)
+
+
+def make_llm_grader(complete: Callable[..., str]) -> Callable[..., Verdict]:
+    """LLM grading tier; ``complete(messages, **kwargs)`` returns the reply text."""
+
+    def llm_grade(question: str, answer: str, user_answer: str, rubric=None) -> Verdict:
+        if rubric is not None and rubric.key_concepts:
+            prompt = build_rubric_feedback_prompt(question, rubric, user_answer)
+        else:
+            prompt = build_feedback_prompt(question, answer, user_answer)
+        content = complete(
+            [
+                {"role": "system", "content": GRADER_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt},
+            ],
+            response_format={"type": "json_object"},
+        )
+        return parse_llm_verdict(content)
+
+    return llm_grade
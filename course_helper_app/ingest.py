@@ -0,0 +1,317 @@
+"""Incremental ingestion of course documents into ``document_chunks``.
+
+    python ingest.py ../project-documents
+
+Files are streamed page by page through text extraction and a token-aware
+chunker. Each chunk is identified by the sha256 of its text, so re-running
+ingestion only embeds chunks that are new or changed (in batches), and chunks
+that disappeared from a changed file are tombstoned. Files whose size and
+mtime match the last run are skipped without being read.
+
+Documents are keyed by their path relative to the corpus root (``--root``,
+by default the ingested directory), so the same file is one document however
+the path to it was spelled.
+"""
+
+import argparse
+import hashlib
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+
+from psycopg2.extras import execute_values
+
+from database import rollback_on_error
+from tokens import count_tokens
+from util import file_hash
+from vectors import vector_literal
+
+SUPPORTED_SUFFIXES = {".pdf", ".txt", ".md"}
+CHUNK_TOKENS = 400
+CHUNK_OVERLAP = 50
+EMBED_BATCH_SIZE = 64
+
+
+@dataclass
+class IngestStats:
+    files_seen: int = 0
+    files_skipped: int = 0
+    chunks_embedded: int = 0
+    chunks_kept: int = 0
+    chunks_tombstoned: int = 0
+    embed_calls: int = 0
+
+
+def iter_source_files(root: Path) -> Iterator[Path]:
+    if root.is_file():
+        yield root
+        return
+    for path in sorted(root.rglob("*")):
+        if path.is_file() and path.suffix.lower() in SUPPORTED_SUFFIXES:
+            yield path
+
+
+def extract_text(path: Path) -> Iterator[str]:
+    """Yield the text of ``path`` one page (PDF) or paragraph block at a time."""
+    if path.suffix.lower() == ".pdf":
+        from pypdf import PdfReader
+
+        reader = PdfReader(str(path))
+        for page in reader.pages:
+            yield page.extract_text() or ""
+    else:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            block = []
+            for line in f:
+                block.append(line)
+                if not line.strip():
+                    yield "".join(block)
+                    block = []
+            if block:
+                yield "".join(block)
+
+
+def chunk_text(segments: Iterable[str], max_tokens: int = CHUNK_TOKENS, overlap: int = CHUNK_OVERLAP) -> Iterator[str]:
+    """Group words from ``segments`` into chunks of about ``max_tokens`` tokens.
+
+    Consecutive chunks share roughly ``overlap`` tokens. Only the current chunk
+    is held in memory.
+    """
+    words = []
+    counts = []
+    total = 0
+    fresh = False  # words added since the last chunk was emitted
+    for segment in segments:
+        for word in segment.split():
+            n = count_tokens(word)
+            words.append(word)
+            counts.append(n)
+            total += n
+            fresh = True
+            if total >= max_tokens:
+                yield " ".join(words)
+                kept = 0
+                i = len(words)
+                while i > 0 and kept + counts[i - 1] <= overlap:
+                    i -= 1
+                    kept += counts[i]
+                words, counts, total = words[i:], counts[i:], kept
+                fresh = False
+    if fresh:
+        yield " ".join(words)
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def guess_chapter(path: Path) -> Optional[int]:
+    """Chapter number from names like ``chapter_3.pdf`` or ``ch03-notes.txt``."""
+    match = re.search(r"(?:chapter|ch)[\s_-]*0*(\d+)", path.stem.lower())
+    return int(match.group(1)) if match else None
+
+
+class Ingestor:
+    """Ingests files under ``root``, the corpus root their keys are relative to."""
+
+    def __init__(self, conn, embedder, root: Path, batch_size: int = EMBED_BATCH_SIZE):
+        self.conn = conn
+        self.embedder = embedder
+        self.root = Path(root).resolve()
+        self.batch_size = batch_size
+        self.stats = IngestStats()
+        # New chunks waiting to be embedded; a batch can span several small files.
+        self.pending = []
+
+    def source_key(self, path: Path) -> str:
+        """``path`` relative to the corpus root, with forward slashes."""
+        try:
+            return Path(path).resolve().relative_to(self.root).as_posix()
+        except ValueError:
+            raise ValueError(f"{path} is outside the corpus root {self.root}") from None
+
+    def ingest_path(self, path: Path, chapter: Optional[int] = None, prune: bool = True) -> IngestStats:
+        """Ingest the file or directory ``path`` (inside the corpus root)."""
+        path = Path(path)
+        seen = []
+        for file in iter_source_files(path):
+            self.stats.files_seen += 1
+            seen.append(self.source_key(file))
+            self.ingest_file(file, chapter if chapter is not None else guess_chapter(file))
+        self.flush()
+        if prune and path.is_dir():
+            self.tombstone_missing(path, seen)
+        return self.stats
+
+    def ingest_file(self, path: Path, chapter: Optional[int]):
+        """Queue new chunks of ``path`` and tombstone its removed ones.
+
+        The changes are committed once the queued chunks have been embedded,
+        so call ``flush()`` after the last file.
+        """
+        source = self.source_key(path)
+        st = path.stat()
+        with rollback_on_error(self.conn), self.conn.cursor() as cur:
+            cur.execute("SELECT file_hash, size, mtime_ns, chapter FROM documents WHERE source = %s;", (source,))
+            row = cur.fetchone()
+            unchanged = row and row[1] == st.st_size and row[2] == st.st_mtime_ns
+            digest = None if unchanged else file_hash(path)
+            if unchanged or (row and row[0] == digest):
+                if not unchanged or row[3] != chapter:
+                    cur.execute(
+                        "UPDATE documents SET size = %s, mtime_ns = %s, chapter = %s WHERE source = %s;",
+                        (st.st_size, st.st_mtime_ns, chapter, source),
+                    )
+                if row[3] != chapter:
+                    # Same content, new chapter: relabel the chunks without re-embedding them.
+                    self._relabel(cur, source, chapter)
+                self.stats.files_skipped += 1
+                return
+
+            cur.execute(
+                "SELECT content_hash FROM document_chunks WHERE source = %s AND deleted_at IS NULL;",
+                (source,),
+            )
+            existing = {r[0] for r in cur.fetchall()}
+            current = set()
+            for index, text in enumerate(chunk_text(extract_text(path))):
+                h = chunk_hash(text)
+                if h in current:
+                    continue
+                current.add(h)
+                if h in existing:
+                    self.stats.chunks_kept += 1
+                    continue
+                self.pending.append((source, chapter, index, text, h))
+                if len(self.pending) >= self.batch_size:
+                    self._insert_pending(cur)
+
+            stale = list(existing - current)
+            if stale:
+                cur.execute(
+                    """
+                    UPDATE document_chunks SET deleted_at = now()
+                    WHERE source = %s AND deleted_at IS NULL AND content_hash = ANY(%s);
+                    """,
+                    (source, stale),
+                )
+                self.stats.chunks_tombstoned += cur.rowcount
+            if row and row[3] != chapter:
+                self._relabel(cur, source, chapter)  # the kept chunks
+            cur.execute(
+                """
+                INSERT INTO documents (source, file_hash, size, mtime_ns, chapter, ingested_at)
+                VALUES (%s, %s, %s, %s, %s, now())
+                ON CONFLICT (source) DO UPDATE SET
+                    file_hash = EXCLUDED.file_hash, size = EXCLUDED.size,
+                    mtime_ns = EXCLUDED.mtime_ns, chapter = EXCLUDED.chapter,
+                    ingested_at = EXCLUDED.ingested_at;
+                """,
+                (source, digest, st.st_size, st.st_mtime_ns, chapter),
+            )
+        if not self.pending:
+            self.conn.commit()
+
+    def _relabel(self, cur, source: str, chapter: Optional[int]):
+        cur.execute(
+            "UPDATE document_chunks SET chapter = %s WHERE source = %s AND deleted_at IS NULL;",
+            (chapter, source),
+        )
+
+    def flush(self):
+        """Embed and insert the queued chunks, then commit."""
+        with rollback_on_error(self.conn), self.conn.cursor() as cur:
+            self._insert_pending(cur)
+        self.conn.commit()
+
+    def _insert_pending(self, cur):
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        vectors = self.embedder.embed([item[3] for item in batch])
+        self.stats.embed_calls += 1
+        self.stats.chunks_embedded += len(batch)
+        execute_values(
+            cur,
+            """
+            INSERT INTO document_chunks (source, chapter, chunk_index, content, content_hash, embedding)
+            VALUES %s;
+            """,
+            [item + (vector_literal(vec),) for item, vec in zip(batch, vectors)],
+            template="(%s, %s, %s, %s, %s, %s::vector)",
+        )
+
+    def tombstone_missing(self, directory: Path, present: List[str]):
+        """Tombstone chunks of files under ``directory`` that are not in ``present``."""
+        prefix = self.source_key(directory)
+        prefix = "" if prefix == "." else prefix + "/"
+        with rollback_on_error(self.conn), self.conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE document_chunks SET deleted_at = now()
+                WHERE deleted_at IS NULL AND starts_with(source, %s) AND NOT (source = ANY(%s));
+                """,
+                (prefix, present),
+            )
+            self.stats.chunks_tombstoned += cur.rowcount
+            cur.execute(
+                "DELETE FROM documents WHERE starts_with(source, %s) AND NOT (source = ANY(%s));",
+                (prefix, present),
+            )
+        self.conn.commit()
+
+
+def purge_tombstones(conn, older_than_days: int = 7) -> int:
+    """Delete tombstoned chunks older than ``older_than_days``."""
+    with rollback_on_error(conn), conn.cursor() as cur:
+        cur.execute(
+            "DELETE FROM document_chunks WHERE deleted_at < now() - make_interval(days => %s);",
+            (older_than_days,),
+        )
+        deleted = cur.rowcount
+    conn.commit()
+    return deleted
+
+
+def main(argv=None):
+    import psycopg2
+    from openai import OpenAI
+
+    from config import DB_SETTINGS, EMBEDDING_MODEL, EMBEDDING_PROVIDER
+    from embeddings import make_embedder
+    from migrations import apply_migrations
+
+    parser = argparse.ArgumentParser(description="Ingest course documents into the local retrieval index.")
+    parser.add_argument("path", nargs="?", default="../project-documents")
+    parser.add_argument("--root", help="corpus root that document names are relative to (default: path, "
+                                       "or its directory for a single file)")
+    parser.add_argument("--chapter", type=int, help="chapter for every file (default: guessed from the file name)")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--no-prune", action="store_true", help="keep chunks of files that were removed")
+    parser.add_argument("--purge-days", type=int, help="also delete tombstones older than this many days")
+    args = parser.parse_args(argv)
+
+    client = OpenAI() if EMBEDDING_PROVIDER == "openai" else None
+    embedder = make_embedder(EMBEDDING_PROVIDER, client, EMBEDDING_MODEL)
+    conn = psycopg2.connect(**DB_SETTINGS)
+    try:
+        apply_migrations(conn)
+        path = Path(args.path)
+        root = Path(args.root) if args.root else (path if path.is_dir() else path.parent)
+        stats = Ingestor(conn, embedder, root, args.batch_size).ingest_path(
+            path, args.chapter, prune=not args.no_prune
+        )
+        print(
+            f"✅ {stats.files_seen} files ({stats.files_skipped} unchanged), "
+            f"{stats.chunks_embedded} chunks embedded in {stats.embed_calls} calls, "
+            f"{stats.chunks_kept} kept, {stats.chunks_tombstoned} tombstoned."
+        )
+        if args.purge_days is not None:
+            print(f"🗑️ Purged {purge_tombstones(conn, args.purge_days)} old tombstones.")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""In-process async gateway for chat completions, shared by all sessions.
+
+Streamlit runs each session's script in its own thread; instead of every
+thread calling the OpenAI API on its own, requests are handed to one
+``AsyncOpenAI`` client running on a dedicated event loop thread, which
+
+* merges identical requests that are already in flight (singleflight), so N
+  students sending the same question at once cost one upstream call,
+* limits how many upstream calls run at once, serving waiting requests by
+  priority (chat before quiz grading before background jobs),
+* applies a timeout to each response and, when streaming, to the wait for
+  each chunk (not to the whole reply), and retries transient failures with
+  jittered exponential backoff.
+
+``complete()`` returns the reply text; ``stream()`` returns an iterator of
+text deltas that can be handed to ``streaming.stream_to_placeholder``.
+"""
+
+import asyncio
+import hashlib
+import heapq
+import itertools
+import json
+import queue
+import random
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from typing import Iterator, Optional
+
+import openai
+from openai import AsyncOpenAI
+
+from telemetry import count, span
+
+PRIORITY_CHAT = 0
+PRIORITY_GRADING = 1
+PRIORITY_BACKGROUND = 2
+
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,  # includes APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+    asyncio.TimeoutError,
+)
+
+_DONE = object()
+
+
+class PrioritySemaphore:
+    """Semaphore whose waiters are woken lowest priority value first."""
+
+    def __init__(self, limit: int):
+        self._available = limit
+        self._waiters = []
+        self._seq = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, fut in self._waiters if not fut.done())
+
+    async def acquire(self, priority: int):
+        if self._available > 0 and not self.waiting:
+            self._available -= 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            # Woken and cancelled at the same time: hand the slot on.
+            if fut.done() and not fut.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self._available += 1
+
+
+class _Broadcast:
+    """One upstream stream fanned out to every subscriber queue."""
+
+    def __init__(self):
+        self.deltas = []
+        self.subscribers = set()
+        self.task = None
+
+
+class GatewayStream:
+    """Blocking iterator over the text deltas of a gateway stream."""
+
+    def __init__(self, gateway: "LLMGateway", key: str, q: queue.Queue):
+        self._gateway = gateway
+        self._key = key
+        self._queue = q
+        self._closed = False
+
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            try:
+                item = self._queue.get(timeout=self._gateway.timeout)
+            except queue.Empty:
+                self.close()
+                raise TimeoutError(f"no reply from the LLM gateway in {self._gateway.timeout}s") from None
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._gateway._loop.call_soon_threadsafe(self._gateway._unsubscribe, self._key, self._queue)
+
+
+class _LoopQueue:
+    """Subscriber queue feeding an ``asyncio.Queue`` that belongs to another event loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self.queue = asyncio.Queue()
+
+    def put(self, item):
+        self._loop.call_soon_threadsafe(self.queue.put_nowait, item)
+
+
+class AsyncGatewayStream(GatewayStream):
+    """Async iterator over the text deltas of a gateway stream, for callers on their own event loop."""
+
+    def __iter__(self):
+        raise TypeError("use 'async for' with an AsyncGatewayStream")
+
+    async def __aiter__(self):
+        while True:
+            try:
+                item = await asyncio.wait_for(self._queue.queue.get(), self._gateway.timeout)
+            except asyncio.TimeoutError:
+                self.close()
+                raise TimeoutError(f"no reply from the LLM gateway in {self._gateway.timeout}s") from None
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+
+class LLMGateway:
+    def __init__(
+        self,
+        client: Optional[AsyncOpenAI] = None,
+        concurrency: int = 8,
+        timeout: float = 60.0,
+        retries: int = 3,
+        backoff: float = 0.5,
+        **client_kwargs,
+    ):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.stats = Counter()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-gateway", daemon=True)
+        self._thread.start()
+        # The SDK's own retries are disabled; the gateway retries with backoff itself.
+        self.client = client or AsyncOpenAI(max_retries=0, **client_kwargs)
+        self._limit = PrioritySemaphore(concurrency)
+        self._inflight = {}
+        self._streams = {}
+
+    @staticmethod
+    def _key(kind: str, request: dict) -> str:
+        raw = json.dumps([kind, request], sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _run(self, coro) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    # -- plain completions ---------------------------------------------------
+
+    def submit(self, priority: int = PRIORITY_CHAT, **request) -> Future:
+        """Schedule ``chat.completions.create(**request)``; returns a Future."""
+        return self._run(self._complete(priority, request))
+
+    def complete(self, messages, model: str, priority: int = PRIORITY_CHAT, **kwargs) -> str:
+        """Blocking helper returning the reply text."""
+        with span("llm.complete", model=model, priority=priority) as s:
+            response = self.submit(priority, model=model, messages=messages, **kwargs).result()
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                s.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+                count("llm_tokens_total", usage.prompt_tokens, kind="prompt")
+                count("llm_tokens_total", usage.completion_tokens, kind="completion")
+        return response.choices[0].message.content
+
+    async def _complete(self, priority: int, request: dict):
+        self.stats["requests"] += 1
+        key = self._key("complete", request)
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._loop.create_task(self._call(priority, request))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.stats["deduplicated"] += 1
+        # One waiter giving up must not cancel the call for the others.
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    async def _call(self, priority: int, request: dict):
+        for attempt in range(self.retries + 1):
+            await self._limit.acquire(priority)
+            try:
+                self.stats["upstream_calls"] += 1
+                return await asyncio.wait_for(self.client.chat.completions.create(**request), self.timeout)
+            except RETRYABLE_ERRORS:
+                if attempt == self.retries:
+                    self.stats["errors"] += 1
+                    raise
+                self.stats["retries"] += 1
+            except Exception:
+                self.stats["errors"] += 1
+                raise
+            finally:
+                self._limit.release()
+            await asyncio.sleep(self._backoff_delay(attempt))
+
+    # -- streaming -----------------------------------------------------------
+
+    def stream(self, messages, model: str, priority: int = PRIORITY_CHAT, **kwargs) -> GatewayStream:
+        """Start (or join) a streaming completion and return its deltas."""
+        request = dict(model=model, messages=messages, stream=True, **kwargs)
+        key, q = self._run(self._subscribe(priority, request, queue.Queue())).result()
+        return GatewayStream(self, key, q)
+
+    async def astream(self, messages, model: str, priority: int = PRIORITY_CHAT, **kwargs) -> AsyncGatewayStream:
+        """Like ``stream`` but awaitable, with deltas delivered to the calling event loop."""
+        request = dict(model=model, messages=messages, stream=True, **kwargs)
+        q = _LoopQueue(asyncio.get_running_loop())
+        key, q = await asyncio.wrap_future(self._run(self._subscribe(priority, request, q)))
+        return AsyncGatewayStream(self, key, q)
+
+    async def _subscribe(self, priority: int, request: dict, q):
+        self.stats["requests"] += 1
+        key = self._key("stream", request)
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            broadcast.task = self._loop.create_task(self._run_stream(key, broadcast, priority, request))
+        else:
+            self.stats["deduplicated"] += 1
+            for delta in broadcast.deltas:
+                q.put(delta)
+        broadcast.subscribers.add(q)
+        return key, q
+
+    def _unsubscribe(self, key: str, q: queue.Queue):
+        broadcast = self._streams.get(key)
+        if broadcast is None or q not in broadcast.subscribers:
+            return
+        broadcast.subscribers.discard(q)
+        if not broadcast.subscribers:
+            self.stats["cancelled"] += 1
+            broadcast.task.cancel()
+
+    def _publish(self, broadcast: _Broadcast, item):
+        for q in broadcast.subscribers:
+            q.put(item)
+
+    async def _run_stream(self, key: str, broadcast: _Broadcast, priority: int, request: dict):
+        try:
+            for attempt in range(self.retries + 1):
+                await self._limit.acquire(priority)
+                try:
+                    self.stats["upstream_calls"] += 1
+                    # A long answer may take minutes; only a silent upstream times out.
+                    async with asyncio.timeout(self.timeout) as idle:
+                        stream = await self.client.chat.completions.create(**request)
+                        try:
+                            async for chunk in stream:
+                                idle.reschedule(self._loop.time() + self.timeout)
+                                if not chunk.choices:
+                                    continue
+                                delta = chunk.choices[0].delta.content
+                                if delta:
+                                    broadcast.deltas.append(delta)
+                                    self._publish(broadcast, delta)
+                        finally:
+                            await stream.close()
+                    break
+                except RETRYABLE_ERRORS:
+                    # Once text has been sent a retry would repeat it.
+                    if broadcast.deltas or attempt == self.retries:
+                        raise
+                    self.stats["retries"] += 1
+                finally:
+                    self._limit.release()
+                await asyncio.sleep(self._backoff_delay(attempt))
+            self._publish(broadcast, _DONE)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.stats["errors"] += 1
+            self._publish(broadcast, e)
+        finally:
+            if self._streams.get(key) is broadcast:
+                del self._streams[key]
+
+    # -- helpers -------------------------------------------------------------
+
+    def _backoff_delay(self, attempt: int) -> float:
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    def metrics(self) -> dict:
+        out = dict(self.stats)
+        out["waiting"] = self._limit.waiting
+        out["in_flight_streams"] = len(self._streams)
+        return out
+
+    def close(self):
+        self._run(self._shutdown()).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    async def _shutdown(self):
+        pending = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        await self.client.close()
+        await self._loop.shutdown_asyncgens()
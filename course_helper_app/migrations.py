@@ -0,0 +1,48 @@
+"""Apply the SQL files in db/migrations on top of db/init.sql.
+
+``db/init.sql`` only runs when the Postgres volume is first created, so schema
+changes made after that live in numbered migration files that are applied
+once, in order, and recorded in ``schema_migrations``.
+"""
+
+from pathlib import Path
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "db" / "migrations"
+
+
+def pending_migrations(applied):
+    return [p for p in sorted(MIGRATIONS_DIR.glob("*.sql")) if p.stem not in applied]
+
+
+def apply_migrations(conn):
+    """Apply every migration not yet recorded. Returns the applied names."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version TEXT PRIMARY KEY,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+            """
+        )
+        # Serialize concurrent app processes applying the same migrations.
+        cur.execute("SELECT pg_advisory_xact_lock(4350);")
+        cur.execute("SELECT version FROM schema_migrations;")
+        applied = {row[0] for row in cur.fetchall()}
+        done = []
+        for path in pending_migrations(applied):
+            cur.execute(path.read_text())
+            cur.execute("INSERT INTO schema_migrations (version) VALUES (%s);", (path.stem,))
+            done.append(path.stem)
+    conn.commit()
+    return done
+
+
+if __name__ == "__main__":
+    import psycopg2
+
+    from config import DB_SETTINGS
+
+    with psycopg2.connect(**DB_SETTINGS) as conn:
+        for name in apply_migrations(conn):
+            print(f"✅ Applied {name}")
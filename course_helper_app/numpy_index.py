@@ -0,0 +1,395 @@
+"""In-process retrieval over a memory-mapped embedding matrix.
+
+An offline alternative to the pgvector index (retrieval.py) for dev machines
+and tests: no database and, with the default TF-IDF embedder, no network.
+
+    python numpy_index.py build ../project-documents --out .numpy_index [--quantize]
+    RETRIEVAL_BACKEND=numpy streamlit run app.py
+    python numpy_index.py search .numpy_index "What is a use case?" --chapter 3
+
+An index is a directory of:
+
+    index.json     embedder model, dimension, row count, quantization
+    matrix.npy     (n, dim) L2-normalized float32 rows, or int8 with
+    scales.npy     one float32 scale per row when quantized
+    meta.npy       per chunk: chapter (-1 for none), source number and the
+                   byte offset and length of its text in content.txt
+    sources.json   source names, by source number
+    content.txt    chunk texts, UTF-8, back to back
+    idf.npy        IDF weights, for the TF-IDF embedder
+
+``NumpyRetriever`` maps these files read-only, so opening an index reads only
+the small JSON files; pages of the matrix are loaded by the OS as searches
+touch them. It has the same ``search``/``chapters``/``add_chunks`` interface
+as ``PgVectorRetriever``.
+
+Index files are never rewritten in place, since other processes may have them
+mapped: the index path is a symlink to a directory next to it, and a build or
+an ``add_chunks`` writes a complete new directory and atomically points the
+symlink at it (``swap_in``). Writers take a lock file (``writer_lock``) so
+concurrent ``add_chunks`` calls append to each other's results.
+"""
+
+import argparse
+import fcntl
+import json
+import mmap
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from embeddings import TfidfHashEmbedder
+from retrieval import Chunk
+
+META_DTYPE = np.dtype([("chapter", np.int32), ("source", np.int32), ("offset", np.int64), ("length", np.int32)])
+NO_CHAPTER = -1
+BLOCK_ROWS = 65536  # rows scored per matrix product, bounding temporary memory
+OPEN_ATTEMPTS = 5  # an index replaced while it is being opened is opened again
+
+
+def model_name(embedder) -> str:
+    return getattr(embedder, "model", type(embedder).__name__)
+
+
+def as_matrix(embedder, texts: List[str]) -> np.ndarray:
+    if hasattr(embedder, "vectors"):
+        matrix = embedder.vectors(texts)
+    else:
+        matrix = np.asarray(embedder.embed(texts), dtype=np.float32).reshape(len(texts), embedder.dim)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+def quantize(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row int8 quantization: ``matrix ~= q * scales[:, None]``."""
+    scales = np.abs(matrix).max(axis=1) / 127
+    scales[scales == 0] = 1
+    q = np.rint(matrix / scales[:, None]).astype(np.int8)
+    return q, scales.astype(np.float32)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the ``k`` highest scores, best first."""
+    if k <= 0 or not len(scores):
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(len(scores))
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+def new_index_dir(path: Path) -> Path:
+    """Empty directory next to ``path`` to write a replacement index into."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return Path(tempfile.mkdtemp(dir=path.parent, prefix=f".{path.name}-"))
+
+
+@contextmanager
+def writer_lock(path: Path):
+    """Hold the lock that serializes writers of the index at ``path``."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.parent / f".{path.name}.lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def swap_in(new: Path, path: Path):
+    """Point ``path`` at the index written to ``new``, replacing the index there.
+
+    ``path`` is a symlink, replaced in one rename, so readers always find an
+    index there. The old files are unlinked rather than overwritten, so a
+    process that still has them mapped keeps searching the old index until it
+    reopens. Call with ``writer_lock`` held.
+    """
+    link = new.with_name(new.name + ".link")
+    os.symlink(new.name, link)
+    old = path.resolve() if path.is_symlink() else None
+    if path.exists() and old is None:  # an index from before the symlink; moved aside once
+        old = Path(tempfile.mkdtemp(dir=path.parent, prefix=f".{path.name}-old-"))
+        os.rename(path, old / "index")
+    os.replace(link, path)
+    if old is not None:
+        shutil.rmtree(old)
+
+
+def write_index(path, chunks: Iterable[Tuple[str, Optional[int], str]], embedder=None,
+                quantized: bool = False, batch_size: int = 256) -> int:
+    """Build an index at ``path`` from ``(source, chapter, text)`` chunks.
+
+    Without ``embedder`` a TfidfHashEmbedder is fitted to the chunks and saved
+    with the index. Returns the number of chunks written.
+    """
+    path = Path(path)
+    chunks = list(chunks)
+    with writer_lock(path):
+        new = new_index_dir(path)
+        try:
+            n = _write_files(new, chunks, embedder, quantized, batch_size)
+            swap_in(new, path)
+        except BaseException:
+            shutil.rmtree(new, ignore_errors=True)
+            raise
+    return n
+
+
+def _write_files(path: Path, chunks: List[Tuple[str, Optional[int], str]], embedder,
+                 quantized: bool, batch_size: int) -> int:
+    texts = [text for _, _, text in chunks]
+    if embedder is None:
+        embedder = TfidfHashEmbedder().fit(texts)
+    if isinstance(embedder, TfidfHashEmbedder):
+        np.save(path / "idf.npy", embedder.idf)
+
+    sources, meta = [], np.zeros(len(chunks), dtype=META_DTYPE)
+    source_numbers = {}
+    offset = 0
+    with open(path / "content.txt", "wb") as content:
+        for i, (source, chapter, text) in enumerate(chunks):
+            if source not in source_numbers:
+                source_numbers[source] = len(sources)
+                sources.append(source)
+            data = text.encode("utf-8")
+            content.write(data)
+            meta[i] = (NO_CHAPTER if chapter is None else chapter, source_numbers[source], offset, len(data))
+            offset += len(data)
+    np.save(path / "meta.npy", meta)
+    (path / "sources.json").write_text(json.dumps(sources))
+
+    n, dim = len(chunks), embedder.dim
+    matrix = np.lib.format.open_memmap(
+        path / "matrix.npy", mode="w+", dtype=np.int8 if quantized else np.float32, shape=(n, dim)
+    )
+    scales = np.ones(n, dtype=np.float32)
+    for start in range(0, n, batch_size):
+        block = as_matrix(embedder, texts[start:start + batch_size])
+        if quantized:
+            block, scales[start:start + len(block)] = quantize(block)
+        matrix[start:start + len(block)] = block
+    matrix.flush()
+    del matrix
+    if quantized:
+        np.save(path / "scales.npy", scales)
+    (path / "index.json").write_text(json.dumps({
+        "model": model_name(embedder), "dim": dim, "count": n, "quantized": quantized,
+    }))
+    return n
+
+
+class NumpyRetriever:
+    """Top-k cosine search over an index written by ``write_index``.
+
+    ``embedder`` embeds the queries. It may be left out for an index built
+    with the TF-IDF embedder, which is then loaded from the index; otherwise
+    it must be the model the index was built with.
+    """
+
+    def __init__(self, path, embedder=None):
+        self.path = Path(path)
+        self.embedder = embedder
+        self._open()
+
+    def _open(self):
+        # The symlink is resolved once, so every file comes from the same
+        # index; one replaced in the meantime is unlinked, and opened again.
+        for attempt in range(OPEN_ATTEMPTS):
+            try:
+                self._load(self.path.resolve())
+                return
+            except FileNotFoundError:
+                if attempt == OPEN_ATTEMPTS - 1:
+                    raise
+                time.sleep(0.05 * 2 ** attempt)
+
+    def _load(self, directory: Path):
+        info = json.loads((directory / "index.json").read_text())
+        if (directory / "idf.npy").exists():
+            self.embedder = TfidfHashEmbedder(info["dim"], np.load(directory / "idf.npy"))
+        elif self.embedder is None:
+            raise ValueError(f"{self.path} was built with {info['model']}; pass that embedder")
+        if model_name(self.embedder) != info["model"] or self.embedder.dim != info["dim"]:
+            raise ValueError(f"{self.path} was built with {info['model']} ({info['dim']} dimensions)")
+        self.directory = directory
+        self.quantized = info["quantized"]
+        self.matrix = np.load(directory / "matrix.npy", mmap_mode="r")
+        self.scales = np.load(directory / "scales.npy", mmap_mode="r") if self.quantized else None
+        self.meta = np.load(directory / "meta.npy", mmap_mode="r")
+        self.sources = json.loads((directory / "sources.json").read_text())
+        # Mapped now, with the rest: a later rebuild must not pair these
+        # offsets with another index's texts.
+        with open(directory / "content.txt", "rb") as f:
+            empty = os.fstat(f.fileno()).st_size == 0  # an empty file cannot be mapped
+            self._content = b"" if empty else mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.meta)
+
+    def _scores(self, query: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        n = len(self.matrix) if rows is None else len(rows)
+        scores = np.empty(n, dtype=np.float32)
+        for start in range(0, n, BLOCK_ROWS):
+            stop = min(start + BLOCK_ROWS, n)
+            block = self.matrix[start:stop] if rows is None else self.matrix[rows[start:stop]]
+            if self.quantized:
+                scale = self.scales[start:stop] if rows is None else self.scales[rows[start:stop]]
+                scores[start:stop] = (block.astype(np.float32) @ query) * scale
+            else:
+                scores[start:stop] = block @ query
+        return scores
+
+    def _text(self, row: int) -> str:
+        offset, length = int(self.meta["offset"][row]), int(self.meta["length"][row])
+        return self._content[offset:offset + length].decode("utf-8")
+
+    def search(self, query: str, k: int = 4, chapter: Optional[int] = None) -> List[Chunk]:
+        if not len(self):
+            return []
+        vector = as_matrix(self.embedder, [query])[0]
+        rows = np.flatnonzero(self.meta["chapter"] == chapter) if chapter is not None else None
+        scores = self._scores(vector, rows)
+        found = top_k(scores, k)
+        chunks = []
+        for i in found:
+            row = int(i) if rows is None else int(rows[i])
+            chapter_no = int(self.meta["chapter"][row])
+            chunks.append(Chunk(
+                row,
+                self.sources[self.meta["source"][row]],
+                None if chapter_no == NO_CHAPTER else chapter_no,
+                self._text(row),
+                float(scores[i]),
+            ))
+        return chunks
+
+    def chapters(self) -> List[int]:
+        """Chapters that have indexed material."""
+        chapters = np.unique(self.meta["chapter"])
+        return [int(c) for c in chapters if c != NO_CHAPTER]
+
+    def add_chunks(self, source: str, chapter: Optional[int], texts: List[str]):
+        """Embed ``texts`` as consecutive chunks of ``source`` and append them.
+
+        Only the new texts are embedded; the index is copied with them added
+        and swapped in (see ``swap_in``), on top of the latest index if another
+        writer replaced it since this one was opened. The TF-IDF weights are
+        not refitted; rebuild the index after adding a lot of new material.
+        """
+        if not texts:
+            return
+        with writer_lock(self.path):
+            self._close()
+            self._open()
+            new = new_index_dir(self.path)
+            try:
+                self._write_appended(new, source, chapter, texts)
+                self._close()
+                swap_in(new, self.path)
+            except BaseException:
+                shutil.rmtree(new, ignore_errors=True)
+                raise
+            finally:
+                self._open()
+
+    def _write_appended(self, path: Path, source: str, chapter: Optional[int], texts: List[str]):
+        n, added = len(self), len(texts)
+        block = as_matrix(self.embedder, texts)
+        scales = None
+        if self.quantized:
+            block, scales = quantize(block)
+            np.save(path / "scales.npy", np.concatenate([self.scales, scales]))
+
+        sources = list(self.sources)
+        if source not in sources:
+            sources.append(source)
+        meta = np.zeros(n + added, dtype=META_DTYPE)
+        meta[:n] = self.meta
+        shutil.copyfile(self.directory / "content.txt", path / "content.txt")
+        offset = os.path.getsize(path / "content.txt")
+        with open(path / "content.txt", "ab") as content:
+            for i, text in enumerate(texts):
+                data = text.encode("utf-8")
+                content.write(data)
+                meta[n + i] = (NO_CHAPTER if chapter is None else chapter, sources.index(source), offset, len(data))
+                offset += len(data)
+        np.save(path / "meta.npy", meta)
+        (path / "sources.json").write_text(json.dumps(sources))
+
+        matrix = np.lib.format.open_memmap(
+            path / "matrix.npy", mode="w+", dtype=self.matrix.dtype, shape=(n + added, self.embedder.dim)
+        )
+        for start in range(0, n, BLOCK_ROWS):
+            stop = min(start + BLOCK_ROWS, n)
+            matrix[start:stop] = self.matrix[start:stop]
+        matrix[n:] = block
+        matrix.flush()
+        del matrix
+        if (self.directory / "idf.npy").exists():
+            shutil.copyfile(self.directory / "idf.npy", path / "idf.npy")
+        info = json.loads((self.directory / "index.json").read_text())
+        (path / "index.json").write_text(json.dumps({**info, "count": n + added}))
+
+    def _close(self):
+        self.matrix = self.scales = self.meta = None
+        if isinstance(self._content, mmap.mmap):
+            self._content.close()
+        self._content = None
+
+
+def iter_chunks(root: Path, chapter: Optional[int] = None):
+    """``(source, chapter, text)`` for every chunk of the documents under ``root``."""
+    from ingest import chunk_text, extract_text, guess_chapter, iter_source_files
+
+    for path in iter_source_files(root):
+        file_chapter = chapter if chapter is not None else guess_chapter(path)
+        for text in chunk_text(extract_text(path)):
+            yield path.name, file_chapter, text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query an offline NumPy retrieval index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="index the documents under a path")
+    build.add_argument("path", nargs="?", default="../project-documents")
+    build.add_argument("--out", default=".numpy_index")
+    build.add_argument("--chapter", type=int, help="chapter for every file (default: guessed from the file name)")
+    build.add_argument("--quantize", action="store_true", help="store int8 rows (4x smaller)")
+    build.add_argument("--provider", choices=("tfidf", "hash", "openai"), default="tfidf",
+                       help="embedder (default: TF-IDF fitted to the documents, no network)")
+    search = sub.add_parser("search", help="print the top chunks for a question")
+    search.add_argument("index")
+    search.add_argument("question")
+    search.add_argument("-k", type=int, default=4)
+    search.add_argument("--chapter", type=int)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        embedder = None
+        if args.provider != "tfidf":
+            from config import EMBEDDING_MODEL
+            from embeddings import make_embedder
+
+            client = None
+            if args.provider == "openai":
+                from openai import OpenAI
+
+                client = OpenAI()
+            embedder = make_embedder(args.provider, client, EMBEDDING_MODEL)
+        n = write_index(args.out, iter_chunks(Path(args.path), args.chapter), embedder, args.quantize)
+        print(f"✅ Indexed {n} chunks into {args.out}.")
+    else:
+        for chunk in NumpyRetriever(args.index).search(args.question, args.k, args.chapter):
+            where = f", chapter {chunk.chapter}" if chunk.chapter is not None else ""
+            print(f"{chunk.score:.3f}  {chunk.source}{where}\n    {chunk.content[:200]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""Two-tier answer cache in front of the chat completion call.
+
+Tier one is an in-process LRU keyed by scope and normalized prompt text. Tier
+two is a pgvector table (``response_cache``) searched by embedding similarity,
+so near-identical questions ("when is the midterm?" / "When's the midterm")
+reuse an earlier answer. Both tiers expire entries after ``ttl`` seconds and
+are bounded in size. Entries are scoped (``scope_for``): an answer given for
+one chapter is not reused for another.
+"""
+
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+from database import rollback_on_error
+from vectors import is_zero, vector_literal
+
+DEFAULT_SCOPE = "general"
+
+
+def scope_for(chapter: Optional[int] = None) -> str:
+    """Cache scope of a question asked about ``chapter`` (None: the whole course)."""
+    return DEFAULT_SCOPE if chapter is None else f"chapter:{chapter}"
+
+
+def normalize_prompt(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+class LRUCache:
+    """Thread-safe LRU with a per-entry time to live."""
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires <= self._clock():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (self._clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+@dataclass
+class CachedAnswer:
+    answer: str
+    latency: float  # seconds the original LLM call took
+
+
+@dataclass
+class CacheLookup:
+    answer: Optional[str] = None
+    tier: Optional[str] = None  # "exact" | "semantic" | None on a miss
+    similarity: Optional[float] = None
+    latency: float = 0.0  # seconds the original LLM call took
+    embedding: Optional[List[float]] = field(default=None, repr=False)
+
+    @property
+    def hit(self) -> bool:
+        return self.answer is not None
+
+
+@dataclass
+class CacheStats:
+    lookups: int = 0
+    exact_hits: int = 0
+    semantic_hits: int = 0
+    saved_seconds: float = 0.0
+
+    @property
+    def hits(self) -> int:
+        return self.exact_hits + self.semantic_hits
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def summary(self) -> dict:
+        return {
+            "lookups": self.lookups,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "hit_rate": round(self.hit_rate, 3),
+            "saved_seconds": round(self.saved_seconds, 2),
+        }
+
+
+class ResponseCache:
+    """Answer cache keyed by scope (e.g. a chapter) and prompt.
+
+    ``embed`` maps a string to its embedding and ``connect`` returns a context
+    manager yielding a psycopg2 connection. Without either, only the exact
+    match tier is used. Expired and surplus rows of a scope are deleted after
+    every ``prune_every`` stores into it rather than on each one.
+    """
+
+    def __init__(
+        self,
+        embed: Optional[Callable[[str], List[float]]] = None,
+        connect: Optional[Callable] = None,
+        max_entries: int = 512,
+        ttl: float = 24 * 3600,
+        threshold: float = 0.92,
+        max_rows: int = 5000,
+        prune_every: int = 50,
+    ):
+        self.embed = embed
+        self.connect = connect
+        self.ttl = ttl
+        self.threshold = threshold
+        self.max_rows = max_rows
+        self.prune_every = prune_every
+        self._stores = Counter()  # per scope, since its last prune
+        self.lru = LRUCache(max_entries, ttl)
+        self.stats = CacheStats()
+        self._stats_lock = threading.Lock()
+
+    def _semantic_enabled(self) -> bool:
+        return self.embed is not None and self.connect is not None
+
+    def lookup(self, prompt: str, scope: str = DEFAULT_SCOPE) -> CacheLookup:
+        start = time.monotonic()
+        key = (scope, normalize_prompt(prompt))
+        result = CacheLookup()
+
+        cached = self.lru.get(key)
+        if cached is not None:
+            result = CacheLookup(cached.answer, "exact", 1.0, cached.latency)
+        elif self._semantic_enabled():
+            try:
+                result = self._semantic_lookup(prompt, scope)
+            except Exception:
+                result = CacheLookup()
+            if result.hit:
+                self.lru.put(key, CachedAnswer(result.answer, result.latency))
+
+        with self._stats_lock:
+            self.stats.lookups += 1
+            if result.tier == "exact":
+                self.stats.exact_hits += 1
+            elif result.tier == "semantic":
+                self.stats.semantic_hits += 1
+            if result.hit:
+                self.stats.saved_seconds += max(0.0, result.latency - (time.monotonic() - start))
+        return result
+
+    def _semantic_lookup(self, prompt: str, scope: str) -> CacheLookup:
+        embedding = self.embed(prompt)
+        if is_zero(embedding):
+            return CacheLookup()  # nothing is similar to a prompt without words
+        vec = vector_literal(embedding)
+        with self.connect() as conn, rollback_on_error(conn):
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT id, answer, latency_ms, 1 - (embedding <=> %s::vector) AS similarity
+                    FROM response_cache
+                    WHERE scope = %s AND created_at > now() - make_interval(secs => %s)
+                    ORDER BY embedding <=> %s::vector
+                    LIMIT 1;
+                    """,
+                    (vec, scope, self.ttl, vec),
+                )
+                row = cur.fetchone()
+                hit = row is not None and row[3] >= self.threshold
+                if hit:
+                    cur.execute("UPDATE response_cache SET hits = hits + 1 WHERE id = %s;", (row[0],))
+            conn.commit()
+        if not hit:
+            return CacheLookup(embedding=embedding)
+        return CacheLookup(row[1], "semantic", row[3], row[2] / 1000, embedding)
+
+    def store(
+        self,
+        prompt: str,
+        answer: str,
+        latency: float,
+        scope: str = DEFAULT_SCOPE,
+        embedding: Optional[List[float]] = None,
+    ):
+        """Remember ``answer`` for ``prompt``; ``latency`` is what the LLM call cost."""
+        self.lru.put((scope, normalize_prompt(prompt)), CachedAnswer(answer, latency))
+        if not self._semantic_enabled():
+            return
+        try:
+            if embedding is None:
+                embedding = self.embed(prompt)
+            if is_zero(embedding):
+                return
+            vec = vector_literal(embedding)
+            with self.connect() as conn, rollback_on_error(conn):
+                with conn.cursor() as cur:
+                    cur.execute(
+                        """
+                        INSERT INTO response_cache (scope, prompt, answer, embedding, latency_ms)
+                        VALUES (%s, %s, %s, %s::vector, %s);
+                        """,
+                        (scope, prompt, answer, vec, int(latency * 1000)),
+                    )
+                    with self._stats_lock:
+                        self._stores[scope] += 1
+                        prune = self._stores[scope] >= self.prune_every
+                        if prune:
+                            self._stores[scope] = 0
+                    if prune:
+                        self._prune(cur, scope)
+                conn.commit()
+        except Exception:
+            pass
+
+    def _prune(self, cur, scope: str):
+        """Drop expired rows and all but the newest ``max_rows`` of ``scope``.
+
+        The cutoff is found with one descent of the (scope, created_at)
+        index instead of comparing every row against a NOT IN list.
+        """
+        cur.execute(
+            """
+            DELETE FROM response_cache
+            WHERE scope = %s AND created_at <= GREATEST(
+                now() - make_interval(secs => %s),
+                (SELECT created_at FROM response_cache WHERE scope = %s
+                 ORDER BY created_at DESC OFFSET %s LIMIT 1)
+            );
+            """,
+            (scope, self.ttl, scope, self.max_rows),
+        )
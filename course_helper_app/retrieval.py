@@ -0,0 +1,278 @@
+"""Local retrieval over course material stored in pgvector.
+
+Chunks live in ``document_chunks`` (see db/migrations/002_document_chunks.sql).
+``PgVectorRetriever.search`` returns the top-k chunks for a question,
+optionally limited to one chapter, and ``build_messages`` turns them into the
+chat prompt so only the retrieved text is sent to the model.
+
+``FileSearchRetriever`` searches the OpenAI-hosted vector store instead
+(``RETRIEVAL_BACKEND=remote``).
+
+Chunks are ranked by embedding similarity ("vector"), by Postgres full-text
+rank ("lexical": ``ts_rank_cd`` cover density, which weighs how often and how
+close together the question's terms occur in a chunk but, unlike BM25, not how
+rare they are in the corpus; it catches exact course codes and terms like
+"CSC 3320" or "sequence diagram"), or by both fused with reciprocal rank
+fusion ("hybrid"): each chunk scores ``sum(1 / (RRF_K + rank))`` over the
+two rankings, computed in the same query as the rankings themselves.
+"""
+
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+from database import rollback_on_error
+from vectors import is_zero, vector_literal
+
+SYSTEM_PROMPT = "You are a helpful course assistant for a Software Engineering class."
+
+# Rough cap on retrieved context sent with each question (~4 chars per token).
+MAX_CONTEXT_CHARS = 6000
+
+
+# Where chunks are searched: pgvector, the hosted vector store, or numpy_index.py.
+BACKENDS = ("local", "remote", "numpy")
+
+VECTOR, LEXICAL, HYBRID = "vector", "lexical", "hybrid"
+MODES = (VECTOR, LEXICAL, HYBRID)
+RRF_K = 60
+# Candidates taken from each ranking before fusion.
+FUSION_CANDIDATES = 50
+
+# Matches chunks containing any lexeme of the question (plainto_tsquery would
+# require all of them, which a full sentence rarely satisfies). NULL when the
+# question has no lexemes, e.g. only stopwords, so the text ranking is skipped.
+ANY_TERM_TSQUERY = (
+    "NULLIF(array_to_string(ARRAY(SELECT quote_literal(lexeme) FROM "
+    "unnest(tsvector_to_array(to_tsvector('english', %(query)s))) AS lexeme), ' | '), '')::tsquery"
+)
+
+def check_backend(backend: str) -> str:
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown retrieval backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    return backend
+
+
+_CHAPTER_RE = re.compile(r"^(?:chapter|ch)?[\s._-]*0*(\d+)$")
+
+
+def parse_chapter(text: Optional[str]) -> Optional[int]:
+    """Chapter number from user input like ``3``, ``ch3`` or ``Chapter 03``."""
+    match = _CHAPTER_RE.match((text or "").strip().lower())
+    return int(match.group(1)) if match else None
+
+
+def chapter_filter(chapter: Optional[int]) -> Optional[dict]:
+    """``file_search`` attribute filter for files attached with a ``chapter`` attribute."""
+    if chapter is None:
+        return None
+    return {"type": "eq", "key": "chapter", "value": chapter}
+
+
+@dataclass
+class Chunk:
+    id: int
+    source: str
+    chapter: Optional[int]
+    content: str
+    score: float = 0.0
+
+
+def rrf_fuse(rankings: Iterable[Sequence[Hashable]], k: int = RRF_K) -> List[Tuple[Hashable, float]]:
+    """Reciprocal rank fusion of ranked id lists, best first (ties by first appearance)."""
+    scores: Dict[Hashable, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            scores[item] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda pair: -pair[1])
+
+
+_LEXICAL_SQL = f"""
+    WITH q AS (SELECT {ANY_TERM_TSQUERY} AS query)
+    SELECT c.id, c.source, c.chapter, c.content, ts_rank_cd(c.content_tsv, q.query, 1) AS score
+    FROM document_chunks c, q
+    WHERE q.query IS NOT NULL AND c.deleted_at IS NULL AND c.content_tsv @@ q.query {{chapter}}
+    ORDER BY score DESC, c.id
+    LIMIT %(k)s;
+"""
+
+_HYBRID_SQL = f"""
+    WITH q AS (SELECT {ANY_TERM_TSQUERY} AS query),
+    by_vector AS (
+        SELECT id, row_number() OVER (ORDER BY distance, id) AS rank
+        FROM (
+            SELECT id, embedding <=> %(vec)s::vector AS distance
+            FROM document_chunks c
+            WHERE deleted_at IS NULL {{chapter}}
+            ORDER BY distance
+            LIMIT %(candidates)s
+        ) nearest
+    ),
+    by_text AS (
+        SELECT id, row_number() OVER (ORDER BY score DESC, id) AS rank
+        FROM (
+            SELECT c.id, ts_rank_cd(c.content_tsv, q.query, 1) AS score
+            FROM document_chunks c, q
+            WHERE q.query IS NOT NULL AND c.deleted_at IS NULL AND c.content_tsv @@ q.query {{chapter}}
+            ORDER BY score DESC, c.id
+            LIMIT %(candidates)s
+        ) matched
+    ),
+    fused AS (
+        SELECT id, sum(1.0 / (%(rrf_k)s + rank)) AS score
+        FROM (SELECT * FROM by_vector UNION ALL SELECT * FROM by_text) ranks
+        GROUP BY id
+    )
+    SELECT c.id, c.source, c.chapter, c.content, f.score::float
+    FROM fused f JOIN document_chunks c USING (id)
+    ORDER BY f.score DESC, c.id
+    LIMIT %(k)s;
+"""
+
+
+class PgVectorRetriever:
+    """Top-k search over ``document_chunks``.
+
+    ``embedder`` is any object with ``embed_one(text)`` (see embeddings.py) and
+    ``connect`` returns a context manager yielding a psycopg2 connection.
+    ``mode`` is one of ``MODES``; scores are cosine similarity for "vector",
+    ``ts_rank_cd`` cover density (normalized by document length) for "lexical"
+    and the RRF score for "hybrid". A query without words has no embedding
+    direction, so "vector" finds nothing for it and "hybrid" ranks by text
+    alone; one of only stopwords matches no text, so "hybrid" ranks it by
+    embedding alone.
+    """
+
+    def __init__(self, embedder, connect, mode: str = VECTOR, candidates: int = FUSION_CANDIDATES,
+                 rrf_k: int = RRF_K):
+        if mode not in MODES:
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+        self.embedder = embedder
+        self.connect = connect
+        self.mode = mode
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+
+    def search(self, query: str, k: int = 4, chapter: Optional[int] = None) -> List[Chunk]:
+        embedding = self.embedder.embed_one(query) if self.mode != LEXICAL else None
+        if self.mode == VECTOR:
+            if is_zero(embedding):
+                return []
+            vec = vector_literal(embedding)
+            where = "WHERE deleted_at IS NULL" + (" AND chapter = %s" if chapter is not None else "")
+            sql = f"""
+                SELECT id, source, chapter, content, 1 - (embedding <=> %s::vector)
+                FROM document_chunks
+                {where}
+                ORDER BY embedding <=> %s::vector
+                LIMIT %s;
+            """
+            params = [vec] + ([chapter] if chapter is not None else []) + [vec, k]
+        else:
+            params = {"query": query, "chapter": chapter, "k": k}
+            template = _LEXICAL_SQL
+            if self.mode == HYBRID and not is_zero(embedding):
+                params.update(vec=vector_literal(embedding), candidates=self.candidates, rrf_k=self.rrf_k)
+                template = _HYBRID_SQL
+            sql = template.format(chapter="AND c.chapter = %(chapter)s" if chapter is not None else "")
+        with self.connect() as conn, rollback_on_error(conn):
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
+                rows = cur.fetchall()
+            conn.commit()
+        return [Chunk(*row) for row in rows]
+
+    def chapters(self) -> List[int]:
+        """Chapters that have indexed material."""
+        with self.connect() as conn, rollback_on_error(conn):
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT DISTINCT chapter FROM document_chunks "
+                    "WHERE deleted_at IS NULL AND chapter IS NOT NULL ORDER BY chapter;"
+                )
+                rows = cur.fetchall()
+            conn.commit()
+        return [row[0] for row in rows]
+
+    def add_chunks(self, source: str, chapter: Optional[int], texts: List[str]):
+        """Embed and insert ``texts`` as consecutive chunks of ``source``."""
+        vectors = self.embedder.embed(texts)
+        with self.connect() as conn, rollback_on_error(conn):
+            with conn.cursor() as cur:
+                for i, (text, vec) in enumerate(zip(texts, vectors)):
+                    cur.execute(
+                        """
+                        INSERT INTO document_chunks (source, chapter, chunk_index, content, embedding)
+                        VALUES (%s, %s, %s, %s, %s::vector);
+                        """,
+                        (source, chapter, i, text, vector_literal(vec)),
+                    )
+            conn.commit()
+
+
+class FileSearchRetriever:
+    """Top-k search over the OpenAI-hosted vector store.
+
+    ``store_id`` returns the store's id (looked up on first use, see
+    vector_manifest.resolve_store_id). Chapters are matched on the
+    ``chapter`` attribute bulk_upload.py sets on each file.
+    """
+
+    def __init__(self, client, store_id: Callable[[], Optional[str]]):
+        self.client = client
+        self._resolve = store_id
+        self._store_id = None
+
+    @property
+    def store_id(self) -> str:
+        if self._store_id is None:
+            self._store_id = self._resolve()
+            if not self._store_id:
+                raise LookupError("the hosted vector store was not found")
+        return self._store_id
+
+    def search(self, query: str, k: int = 4, chapter: Optional[int] = None) -> List[Chunk]:
+        kwargs = {"query": query, "max_num_results": k}
+        if chapter is not None:
+            kwargs["filters"] = chapter_filter(chapter)
+        page = self.client.vector_stores.search(self.store_id, **kwargs)
+        chunks = []
+        for i, result in enumerate(page.data):
+            chapter_no = (result.attributes or {}).get("chapter")
+            content = "\n".join(part.text for part in result.content if part.type == "text")
+            chunks.append(Chunk(
+                i, result.filename, int(chapter_no) if chapter_no is not None else None, content, result.score,
+            ))
+        return chunks
+
+
+def format_context(chunks: Iterable[Chunk], max_chars: int = MAX_CONTEXT_CHARS) -> str:
+    parts = []
+    used = 0
+    for i, chunk in enumerate(chunks, 1):
+        label = f"[{i}] {chunk.source}" + (f", chapter {chunk.chapter}" if chunk.chapter is not None else "")
+        part = f"{label}\n{chunk.content.strip()}"
+        if parts and used + len(part) > max_chars:
+            break
+        parts.append(part)
+        used += len(part)
+    return "\n\n".join(parts)
+
+
+def build_messages(question: str, chunks: List[Chunk], system: str = SYSTEM_PROMPT) -> List[dict]:
+    """Chat messages for ``question`` with the retrieved chunks as context."""
+    if not chunks:
+        return [
+            {"role": "system", "content": system},
+            {"role": "user", "content": question},
+        ]
+    context = format_context(chunks)
+    return [
+        {
+            "role": "system",
+            "content": system + " Answer using the course material provided. "
+            "If it does not cover the question, say so.",
+        },
+        {"role": "user", "content": f"Course material:\n{context}\n\nQuestion: {question}"},
+    ]
@@ -0,0 +1,218 @@
+"""Relevance benchmark for the retrieval modes (lexical, vector, hybrid).
+
+    python retrieval_benchmark.py                # in-process: no database, no network
+    python retrieval_benchmark.py --db           # the SQL in retrieval.py, against Postgres
+    python retrieval_benchmark.py -k 3 --out retrieval.json
+
+Every query in eval/retrieval_queries.jsonl lists the chunks of
+eval/retrieval_corpus.jsonl that answer it; each mode is scored on recall@k
+(share of those chunks in the top k), MRR and search latency.
+
+In-process, "lexical" is Okapi BM25, a stand-in for the SQL's ``ts_rank_cd``
+(which ignores how rare a term is, so --db can rank differently), and
+"vector" is cosine similarity under the embedder (the offline hash stub
+unless --provider says otherwise); both are fused with ``retrieval.rrf_fuse``
+exactly as the hybrid SQL does. With --db the corpus is loaded into a
+temporary ``document_chunks`` table, which shadows the real one for the
+benchmark's own connection only, and searched with ``PgVectorRetriever``
+in each mode.
+"""
+
+import argparse
+import json
+import math
+import re
+import time
+from collections import Counter
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from benchmark import summarize
+from numpy_index import as_matrix, top_k
+from retrieval import FUSION_CANDIDATES, LEXICAL, MODES, RRF_K, VECTOR, PgVectorRetriever, rrf_fuse
+from scope import STOPWORDS
+
+EVAL_DIR = Path(__file__).resolve().parent / "eval"
+DEFAULT_CORPUS = EVAL_DIR / "retrieval_corpus.jsonl"
+DEFAULT_QUERIES = EVAL_DIR / "retrieval_queries.jsonl"
+
+
+def load_jsonl(path: Path) -> List[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def terms(text: str) -> List[str]:
+    """Lower-cased words without stopwords, crudely de-pluralized."""
+    words = (w for w in re.findall(r"\w+", text.lower()) if w not in STOPWORDS)
+    return [w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w for w in words]
+
+
+class Bm25:
+    def __init__(self, docs: List[str], k1: float = 1.2, b: float = 0.75):
+        self.k1, self.b = k1, b
+        self.docs = [Counter(terms(d)) for d in docs]
+        self.lengths = [sum(d.values()) for d in self.docs]
+        self.avg_length = sum(self.lengths) / len(self.docs) if self.docs else 0.0
+        df = Counter(t for d in self.docs for t in d)
+        n = len(self.docs)
+        self.idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+
+    def rank(self, query: str, n: int) -> List[int]:
+        """Indices of the (at most ``n``) matching documents, best first."""
+        scores = []
+        query_terms = set(terms(query))
+        for i, (doc, length) in enumerate(zip(self.docs, self.lengths)):
+            score = 0.0
+            for t in query_terms & doc.keys():
+                tf = doc[t]
+                score += self.idf[t] * tf * (self.k1 + 1) / (
+                    tf + self.k1 * (1 - self.b + self.b * length / self.avg_length)
+                )
+            if score > 0:
+                scores.append((-score, i))
+        return [i for _, i in sorted(scores)[:n]]
+
+
+class InProcessSearch:
+    """The three modes over ``corpus`` in memory; ``search`` returns chunk ids."""
+
+    def __init__(self, corpus: List[dict], embedder, candidates: int = FUSION_CANDIDATES, rrf_k: int = RRF_K):
+        self.ids = [c["id"] for c in corpus]
+        texts = [c["content"] for c in corpus]
+        self.bm25 = Bm25(texts)
+        self.embedder = embedder
+        self.matrix = as_matrix(embedder, texts)
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+
+    def _lexical(self, query: str, n: int) -> List[int]:
+        return self.bm25.rank(query, n)
+
+    def _vector(self, query: str, n: int) -> List[int]:
+        scores = self.matrix @ as_matrix(self.embedder, [query])[0]
+        return top_k(scores, n).tolist()
+
+    def search(self, query: str, k: int, mode: str) -> List[str]:
+        if mode == LEXICAL:
+            rows = self._lexical(query, k)
+        elif mode == VECTOR:
+            rows = self._vector(query, k)
+        else:
+            fused = rrf_fuse([self._vector(query, self.candidates), self._lexical(query, self.candidates)], self.rrf_k)
+            rows = [row for row, _ in fused[:k]]
+        return [self.ids[row] for row in rows]
+
+
+def load_into_temp_table(conn, corpus: List[dict], embedder) -> Dict[int, str]:
+    """Copy ``corpus`` into a session-local ``document_chunks``; returns row id -> chunk id."""
+    from ingest import chunk_hash
+    from vectors import vector_literal
+
+    vectors = embedder.embed([c["content"] for c in corpus])
+    ids = {}
+    with conn.cursor() as cur:
+        # pg_temp comes first in the search path, so the unqualified table
+        # name in retrieval.py resolves to this copy for this connection.
+        cur.execute("CREATE TEMP TABLE document_chunks (LIKE public.document_chunks INCLUDING ALL);")
+        for i, (chunk, vec) in enumerate(zip(corpus, vectors)):
+            cur.execute(
+                """
+                INSERT INTO document_chunks (source, chapter, chunk_index, content, content_hash, embedding)
+                VALUES (%s, %s, %s, %s, %s, %s::vector) RETURNING id;
+                """,
+                (chunk["source"], chunk["chapter"], i, chunk["content"], chunk_hash(chunk["content"]),
+                 vector_literal(vec)),
+            )
+            ids[cur.fetchone()[0]] = chunk["id"]
+    conn.commit()
+    return ids
+
+
+def evaluate(search: Callable[[str, int], List[str]], queries: List[dict], k: int) -> dict:
+    recalls, reciprocal_ranks, latencies = [], [], []
+    for q in queries:
+        start = time.perf_counter()
+        found = search(q["query"], k)
+        latencies.append(time.perf_counter() - start)
+        relevant = set(q["relevant"])
+        recalls.append(len(relevant & set(found[:k])) / len(relevant))
+        rank = next((i for i, chunk in enumerate(found, 1) if chunk in relevant), None)
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+    return {
+        "recall_at_k": sum(recalls) / len(recalls),
+        "mrr": sum(reciprocal_ranks) / len(reciprocal_ranks),
+        "misses": [q["query"] for q, r in zip(queries, recalls) if r == 0],
+        "latency_seconds": summarize(latencies),
+    }
+
+
+def run(corpus: List[dict], queries: List[dict], embedder, k: int = 4, conn=None) -> dict:
+    """Results per mode; against ``conn`` (Postgres) when given, else in-process."""
+    if conn is None:
+        engine = InProcessSearch(corpus, embedder)
+        searches = {mode: (lambda q, n, mode=mode: engine.search(q, n, mode)) for mode in MODES}
+    else:
+        ids = load_into_temp_table(conn, corpus, embedder)
+        searches = {}
+        for mode in MODES:
+            retriever = PgVectorRetriever(embedder, connect=lambda: nullcontext(conn), mode=mode)
+            searches[mode] = lambda q, n, r=retriever: [ids[c.id] for c in r.search(q, k=n)]
+    return {"k": k, "queries": len(queries), "modes": {mode: evaluate(searches[mode], queries, k) for mode in MODES}}
+
+
+def print_report(results: dict):
+    k = results["k"]
+    print(f"{results['queries']} queries")
+    print(f"  {'mode':<8} {'recall@' + str(k):>9} {'MRR':>6} {'p50 ms':>8} {'p95 ms':>8}")
+    for mode, r in results["modes"].items():
+        lat = r["latency_seconds"]
+        print(f"  {mode:<8} {r['recall_at_k']:>9.2f} {r['mrr']:>6.2f} {lat['p50'] * 1000:>8.2f} {lat['p95'] * 1000:>8.2f}")
+    for mode, r in results["modes"].items():
+        for query in r["misses"]:
+            print(f"  {mode} missed: {query}")
+
+
+def main(argv=None):
+    from embeddings import EMBEDDING_DIM, make_embedder
+
+    parser = argparse.ArgumentParser(description="Recall@k and latency of lexical, vector and hybrid retrieval.")
+    parser.add_argument("-k", type=int, default=4)
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS)
+    parser.add_argument("--queries", type=Path, default=DEFAULT_QUERIES)
+    parser.add_argument("--provider", choices=("hash", "openai"), default="hash", help="embedder for the vector side")
+    parser.add_argument("--db", action="store_true", help="run the SQL modes against Postgres (DB_* settings)")
+    parser.add_argument("--out", type=Path, help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    client = None
+    if args.provider == "openai":
+        from openai import OpenAI
+
+        client = OpenAI()
+    embedder = make_embedder(args.provider, client)
+    assert embedder.dim == EMBEDDING_DIM  # the width of document_chunks.embedding
+    corpus, queries = load_jsonl(args.corpus), load_jsonl(args.queries)
+
+    conn = None
+    if args.db:
+        import psycopg2
+
+        from config import DB_SETTINGS
+        from migrations import apply_migrations
+
+        conn = psycopg2.connect(**DB_SETTINGS)
+        apply_migrations(conn)
+    try:
+        results = run(corpus, queries, embedder, args.k, conn)
+    finally:
+        if conn is not None:
+            conn.close()  # drops the temporary table
+    print_report(results)
+    if args.out:
+        args.out.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
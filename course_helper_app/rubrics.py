@@ -0,0 +1,193 @@
+"""Batch generation of per-card grading rubrics.
+
+    python rubrics.py --concurrency 4 --batch-size 10
+
+For every flashcard without an up-to-date rubric, the LLM is asked (several
+cards per request, a bounded number of requests in flight, with retries) for
+the key concepts a correct answer must cover, common misconceptions and a hint.
+Results are stored in ``flashcard_rubrics`` keyed by card id and a hash of the
+card's text, so only new or edited cards are regenerated. Quiz grading then
+checks answers against the key concepts locally and, when it still has to ask
+the LLM, sends the short rubric instead of the full feedback prompt.
+"""
+
+import argparse
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+from psycopg2.extras import Json, execute_values
+
+from database import rollback_on_error
+from util import TRANSIENT_ERRORS, with_retries
+
+RUBRIC_SYSTEM_PROMPT = "You write concise grading rubrics for Software Engineering flashcards."
+
+
+@dataclass(frozen=True)
+class Rubric:
+    key_concepts: tuple
+    misconceptions: tuple
+    hint: str
+
+
+def card_hash(question: str, answer: str) -> str:
+    return hashlib.sha256(f"{question}\x1f{answer}".encode("utf-8")).hexdigest()
+
+
+def cards_needing_rubrics(conn, chapter: Optional[int] = None) -> List[tuple]:
+    """(id, question, answer) of cards with no rubric or a stale one."""
+    where = "WHERE f.chapter = %s" if chapter is not None else ""
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT f.id, f.question, f.answer, r.content_hash
+            FROM flashcards f LEFT JOIN flashcard_rubrics r ON r.card_id = f.id
+            {where}
+            ORDER BY f.id;
+            """,
+            (chapter,) if chapter is not None else None,
+        )
+        rows = cur.fetchall()
+    return [(cid, q, a) for cid, q, a, h in rows if h != card_hash(q, a)]
+
+
+def load_rubric(conn, card_id: int, question: str, answer: str) -> Optional[Rubric]:
+    """The stored rubric for a card, or None if missing or generated from older text."""
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT content_hash, key_concepts, misconceptions, hint FROM flashcard_rubrics WHERE card_id = %s;",
+            (card_id,),
+        )
+        row = cur.fetchone()
+    if row is None or row[0] != card_hash(question, answer):
+        return None
+    return Rubric(tuple(row[1]), tuple(row[2]), row[3])
+
+
+def build_rubric_prompt(cards: Sequence[tuple]) -> str:
+    listing = "\n".join(
+        json.dumps({"id": cid, "question": q, "answer": a}, ensure_ascii=False) for cid, q, a in cards
+    )
+    return f"""
+    For each flashcard below, write a grading rubric.
+    Return a JSON object {{"rubrics": [...]}} with one entry per card:
+    {{"id": <card id>, "key_concepts": [2-4 short phrases a correct answer must convey],
+      "misconceptions": [1-3 common wrong ideas], "hint": "one sentence that nudges without giving the answer away"}}
+
+    Flashcards:
+    {listing}
+    """
+
+
+def parse_rubrics(content: str) -> dict:
+    data = json.loads(content)
+    out = {}
+    for item in data.get("rubrics", []):
+        out[int(item["id"])] = Rubric(
+            tuple(str(c) for c in item.get("key_concepts", [])),
+            tuple(str(m) for m in item.get("misconceptions", [])),
+            str(item.get("hint", "")),
+        )
+    return out
+
+
+class RubricGenerator:
+    def __init__(self, client, model: str = "gpt-5-nano", concurrency: int = 4, batch_size: int = 10):
+        self.client = client
+        self.model = model
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+
+    def _generate_batch(self, cards: Sequence[tuple]) -> dict:
+        ids = {cid for cid, _, _ in cards}
+
+        def call():
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": RUBRIC_SYSTEM_PROMPT},
+                    {"role": "user", "content": build_rubric_prompt(cards)},
+                ],
+                response_format={"type": "json_object"},
+            )
+            rubrics = parse_rubrics(response.choices[0].message.content)
+            # An id the model made up or took from another batch would
+            # overwrite that card's rubric.
+            return {cid: rubric for cid, rubric in rubrics.items() if cid in ids}
+
+        # A reply that is not the JSON asked for is worth asking for again.
+        return with_retries(call, retry_on=TRANSIENT_ERRORS + (ValueError, KeyError))
+
+    def generate(self, cards: Sequence[tuple]) -> dict:
+        """Map card id -> Rubric for ``cards``; failed batches are left out."""
+        batches = [cards[i:i + self.batch_size] for i in range(0, len(cards), self.batch_size)]
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = [pool.submit(self._generate_batch, batch) for batch in batches]
+            for future in futures:
+                try:
+                    results.update(future.result())
+                except Exception as e:
+                    print(f"⚠️ Rubric batch failed: {e}")
+        return results
+
+
+def store_rubrics(conn, cards: Sequence[tuple], rubrics: dict, model: str) -> int:
+    rows = [
+        (cid, card_hash(q, a), Json(list(r.key_concepts)), Json(list(r.misconceptions)), r.hint, model)
+        for cid, q, a in cards
+        if (r := rubrics.get(cid)) is not None
+    ]
+    if not rows:
+        return 0
+    with rollback_on_error(conn), conn.cursor() as cur:
+        execute_values(
+            cur,
+            """
+            INSERT INTO flashcard_rubrics (card_id, content_hash, key_concepts, misconceptions, hint, model)
+            VALUES %s
+            ON CONFLICT (card_id) DO UPDATE SET
+                content_hash = EXCLUDED.content_hash, key_concepts = EXCLUDED.key_concepts,
+                misconceptions = EXCLUDED.misconceptions, hint = EXCLUDED.hint,
+                model = EXCLUDED.model, generated_at = now();
+            """,
+            rows,
+        )
+    conn.commit()
+    return len(rows)
+
+
+def main(argv=None):
+    import psycopg2
+    from openai import OpenAI
+
+    from config import CHAT_MODEL, DB_SETTINGS
+    from migrations import apply_migrations
+
+    parser = argparse.ArgumentParser(description="Pre-generate grading rubrics for flashcards.")
+    parser.add_argument("--chapter", type=int)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=10, help="cards per LLM request")
+    args = parser.parse_args(argv)
+
+    conn = psycopg2.connect(**DB_SETTINGS)
+    try:
+        apply_migrations(conn)
+        cards = cards_needing_rubrics(conn, args.chapter)
+        if not cards:
+            print("✅ All rubrics are up to date.")
+            return
+        generator = RubricGenerator(OpenAI(), CHAT_MODEL, args.concurrency, args.batch_size)
+        start = time.monotonic()
+        stored = store_rubrics(conn, cards, generator.generate(cards), CHAT_MODEL)
+        print(f"✅ Stored {stored}/{len(cards)} rubrics in {time.monotonic() - start:.1f}s.")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
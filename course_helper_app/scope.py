@@ -0,0 +1,279 @@
+"""Local out-of-scope detection for chat prompts.
+
+``ScopeClassifier`` is a logistic regression over hashed TF-IDF features of
+word unigrams and bigrams plus one "novelty" feature: the share of a prompt's
+words that never occur in the course material (flashcard questions and
+document chunks). It is trained at startup on the seed prompts below. Before a
+prompt goes to the LLM the app asks for a ``ScopeDecision``:
+
+* OUT_OF_SCOPE when the out-of-scope probability is at least ``threshold`` --
+  the stored fallback message is shown and no LLM call is made,
+* BORDERLINE between ``borderline`` and ``threshold`` -- escalated to the LLM
+  like an in-scope prompt, but counted so the thresholds can be tuned,
+* IN_SCOPE otherwise.
+
+``python scope_eval.py`` reports precision/recall and the LLM calls saved on a
+labelled prompt set.
+"""
+
+import hashlib
+import math
+import random
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Sequence
+
+IN_SCOPE = "in_scope"
+BORDERLINE = "borderline"
+OUT_OF_SCOPE = "out_of_scope"
+
+N_FEATURES = 1 << 18
+# Index of the extra feature holding the share of a prompt's words that never
+# occur in the in-scope texts; hashed features use 0..n_features-1.
+NOVELTY = -1
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Question words and fillers shared by every kind of prompt.
+STOPWORDS = frozenset("""
+a about an and are can could do does for from give help how i in is it me my of on or please should so tell
+that the this to us was we what when where which who why will with would you your
+""".split())
+
+SEED_IN_SCOPE = [
+    "What is software engineering?",
+    "Explain the waterfall model",
+    "What are the phases of the software development life cycle?",
+    "How does agile differ from the spiral model?",
+    "What is a use case diagram?",
+    "Draw a class diagram for a library system",
+    "What is the difference between functional and non-functional requirements?",
+    "How do I write a good user story?",
+    "What is unit testing?",
+    "Explain integration testing and regression testing",
+    "What is version control and why use git?",
+    "What is a design pattern?",
+    "Explain coupling and cohesion",
+    "What is a sequence diagram used for?",
+    "What does a scrum master do in a sprint?",
+    "How do you estimate effort for a software project?",
+    "What is refactoring?",
+    "What is the difference between verification and validation?",
+    "Explain the MVC architecture",
+    "What is continuous integration?",
+    "How should we manage risk in our team project?",
+    "What goes into a software requirements specification?",
+    "When is the midterm?",
+    "What are the prerequisites for this course?",
+    "What is the difference between black box and white box testing?",
+    "How do you write acceptance criteria?",
+    "What is a state machine diagram?",
+    "Explain the singleton and factory patterns",
+    "What is technical debt?",
+    "How do code reviews improve quality?",
+    "What is a Gantt chart used for in project planning?",
+    "Explain the V-model",
+    "What is a software architecture?",
+    "What is the purpose of a sprint retrospective?",
+    "How do we prioritize the product backlog?",
+    "What is test driven development?",
+    "Explain object oriented analysis and design",
+    "What are software metrics like cyclomatic complexity?",
+    "What is a pull request and how do we merge branches?",
+    "How do you document an API?",
+    "What is software maintenance?",
+    "What is a component diagram?",
+    "Explain the client server architecture",
+    "What are the SOLID principles?",
+    "How does a kanban board work?",
+    "What is DevOps?",
+    "What is a deployment diagram?",
+    "What is requirements traceability?",
+]
+
+SEED_OUT_OF_SCOPE = [
+    "Write my history essay about the French revolution",
+    "What is the weather today?",
+    "Who won the football game last night?",
+    "Give me a recipe for chocolate cake",
+    "Write a poem about the ocean",
+    "What is the capital of Australia?",
+    "Tell me a joke",
+    "What movies are playing this weekend?",
+    "Recommend a good restaurant near campus",
+    "Solve this calculus integral for me",
+    "Translate this paragraph into Spanish",
+    "What is the best stock to buy right now?",
+    "How do I fix my car's brakes?",
+    "Summarize the plot of Hamlet",
+    "Who is the president of France?",
+    "What should I get my mom for her birthday?",
+    "Explain photosynthesis",
+    "How many calories are in a banana?",
+    "Write a cover letter for a barista job",
+    "What are the symptoms of the flu?",
+    "Plan a trip to Paris for me",
+    "Who painted the Mona Lisa?",
+    "What is the meaning of life?",
+    "Balance this chemical equation",
+    "Write an essay on the causes of World War I",
+    "Do my English literature homework",
+    "What is the score of the basketball game?",
+    "Which team will win the World Cup?",
+    "Give me a workout plan to build muscle",
+    "What is a good diet for losing weight?",
+    "Suggest a name for my dog",
+    "What time does the mall close?",
+    "Tell me about the history of ancient Rome",
+    "How do I bake sourdough bread?",
+    "What are the lyrics to my favorite song?",
+    "Should I break up with my boyfriend?",
+    "What is the price of bitcoin today?",
+    "How do I get a driver's license?",
+    "Explain the theory of evolution",
+    "What is the population of China?",
+    "Recommend some TV shows to watch",
+    "Write a birthday message for my friend",
+    "How do vaccines work in the immune system?",
+    "What happened in the news today?",
+    "Who is the best singer of all time?",
+    "How do I apply for a credit card?",
+    "Explain the rules of chess",
+    "What is the tallest mountain on Earth?",
+]
+
+
+def content_words(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def features(text: str, n_features: int = N_FEATURES) -> Counter:
+    """Hashed counts of the word unigrams and bigrams of ``text``, stopwords removed."""
+    words = content_words(text)
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    counts = Counter()
+    for gram in grams:
+        digest = hashlib.blake2b(gram.encode(), digest_size=4).digest()
+        counts[int.from_bytes(digest, "little") % n_features] += 1
+    return counts
+
+
+@dataclass
+class ScopeDecision:
+    label: str
+    out_of_scope_probability: float
+
+
+class ScopeClassifier:
+    def __init__(self, threshold: float = 0.8, borderline: float = 0.5, n_features: int = N_FEATURES):
+        self.threshold = threshold
+        self.borderline = borderline
+        self.n_features = n_features
+        self.idf: Dict[int, float] = {}
+        self.weights: Dict[int, float] = {}
+        self.bias = 0.0
+        self.course_vocab = Counter()  # word -> number of in-scope texts using it
+        self._default_idf = 0.0
+
+    def novelty(self, text: str, in_training: bool = False) -> float:
+        """Share of the words of ``text`` never seen in in-scope texts.
+
+        For an in-scope training text its own occurrence is not counted, so
+        the feature means the same thing in training as on new prompts.
+        """
+        words = set(content_words(text))
+        if not words:
+            return 0.0
+        own = 1 if in_training else 0
+        return sum(1 for w in words if self.course_vocab[w] <= own) / len(words)
+
+    def vectorize(self, text: str, in_training: bool = False) -> Dict[int, float]:
+        """L2-normalised TF-IDF vector as a sparse dict, plus the NOVELTY feature."""
+        counts = features(text, self.n_features)
+        vec = {i: (1 + math.log(c)) * self.idf.get(i, self._default_idf) for i, c in counts.items()}
+        norm = math.sqrt(sum(v * v for v in vec.values()))
+        if norm:
+            vec = {i: v / norm for i, v in vec.items()}
+        vec[NOVELTY] = self.novelty(text, in_training)
+        return vec
+
+    def train(self, in_scope: Iterable[str], out_of_scope: Iterable[str], course_texts: Iterable[str] = (),
+              epochs: int = 30, lr: float = 0.5, l2: float = 1e-4, seed: int = 0) -> "ScopeClassifier":
+        """Fit by SGD on the log loss, with classes weighted to equal total mass.
+
+        ``course_texts`` only extend the in-scope vocabulary behind the novelty
+        feature, so long documents do not slow training down.
+        """
+        examples = [(t, 0) for t in in_scope] + [(t, 1) for t in out_of_scope]
+        n_pos = sum(y for _, y in examples)
+        n_neg = len(examples) - n_pos
+        if not n_pos or not n_neg:
+            raise ValueError("training needs in-scope and out-of-scope examples")
+
+        df = Counter()
+        self.course_vocab = Counter()
+        for text in course_texts:
+            self.course_vocab.update(set(content_words(text)))
+        for text, y in examples:
+            df.update(features(text, self.n_features).keys())
+            if y == 0:
+                self.course_vocab.update(set(content_words(text)))
+        n = len(examples)
+        self.idf = {i: math.log((1 + n) / (1 + d)) + 1 for i, d in df.items()}
+        self._default_idf = math.log(1 + n) + 1  # unseen features count as rare
+
+        class_weight = {1: n / (2 * n_pos), 0: n / (2 * n_neg)}
+        vectors = [(self.vectorize(text, in_training=(y == 0)), y) for text, y in examples]
+        rng = random.Random(seed)
+        weights, bias = {}, 0.0
+        for _ in range(epochs):
+            rng.shuffle(vectors)
+            for x, y in vectors:
+                z = bias + sum(weights.get(i, 0.0) * v for i, v in x.items())
+                grad = (_sigmoid(z) - y) * class_weight[y]
+                for i, v in x.items():
+                    w = weights.get(i, 0.0)
+                    weights[i] = w - lr * (grad * v + l2 * w)
+                bias -= lr * grad
+        self.weights, self.bias = weights, bias
+        return self
+
+    def probability(self, text: str) -> float:
+        """Probability that ``text`` is out of scope."""
+        x = self.vectorize(text)
+        return _sigmoid(self.bias + sum(self.weights.get(i, 0.0) * v for i, v in x.items()))
+
+    def decide(self, text: str) -> ScopeDecision:
+        p = self.probability(text)
+        if p >= self.threshold:
+            return ScopeDecision(OUT_OF_SCOPE, p)
+        if p >= self.borderline:
+            return ScopeDecision(BORDERLINE, p)
+        return ScopeDecision(IN_SCOPE, p)
+
+
+def _sigmoid(z: float) -> float:
+    if z >= 0:
+        return 1 / (1 + math.exp(-z))
+    e = math.exp(z)
+    return e / (1 + e)
+
+
+def load_course_texts(conn, chunk_limit: int = 2000) -> List[str]:
+    """Flashcard questions and document chunks, as in-scope training text."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT question FROM flashcards WHERE question IS NOT NULL;")
+        texts = [row[0] for row in cur.fetchall()]
+        cur.execute("SELECT content FROM document_chunks ORDER BY id LIMIT %s;", (chunk_limit,))
+        texts.extend(row[0] for row in cur.fetchall())
+    return texts
+
+
+def build_classifier(course_texts: Sequence[str] = (), **kwargs) -> ScopeClassifier:
+    return ScopeClassifier(**kwargs).train(SEED_IN_SCOPE, SEED_OUT_OF_SCOPE, course_texts)
+
+
+def scope_text(prompt: str, history: Sequence[dict]) -> str:
+    """Text to classify: a follow-up ("why?") is judged with the previous question."""
+    previous = next((m["content"] for m in reversed(history) if m.get("role") == "user"), None)
+    return f"{previous}\n{prompt}" if previous else prompt
@@ -0,0 +1,107 @@
+"""Offline evaluation of the out-of-scope classifier in scope.py.
+
+    python scope_eval.py                       # seed prompts only
+    DB_HOST=localhost python scope_eval.py --from-db --thresholds 0.7 0.8 0.9
+
+Trains the classifier (on the seed prompts, plus the flashcards and document
+chunks with ``--from-db``) and scores a labelled prompt file, one JSON object
+per line: ``{"prompt": "...", "in_scope": true}``. For each threshold it
+reports precision and recall of the out-of-scope label, the in-scope prompts
+that would wrongly get the fallback message, the borderline prompts that
+escalate to the LLM, and the share of LLM calls saved.
+"""
+
+import argparse
+import json
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Sequence
+
+from scope import build_classifier, load_course_texts
+
+DEFAULT_DATA = Path(__file__).resolve().parent / "eval" / "scope_prompts.jsonl"
+
+
+@dataclass
+class ScopeReport:
+    threshold: float
+    precision: float
+    recall: float
+    false_fallbacks: int
+    borderline: int
+    calls_saved: int
+    total: int
+
+    def line(self) -> str:
+        saved = self.calls_saved / self.total if self.total else 0.0
+        return (
+            f"threshold {self.threshold:.2f}: precision {self.precision:.2f}  recall {self.recall:.2f}  "
+            f"wrong fallbacks {self.false_fallbacks}  borderline {self.borderline}  "
+            f"LLM calls saved {self.calls_saved}/{self.total} ({saved:.0%})"
+        )
+
+
+def load_labelled(path: Path) -> List[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(probabilities: Sequence[float], in_scope: Sequence[bool], threshold: float,
+             borderline: float = 0.5) -> ScopeReport:
+    """Metrics for one threshold; "positive" means judged out of scope."""
+    tp = fp = fn = border = 0
+    for p, label in zip(probabilities, in_scope):
+        flagged = p >= threshold
+        if flagged and not label:
+            tp += 1
+        elif flagged:
+            fp += 1
+        elif not label:
+            fn += 1
+        if borderline <= p < threshold:
+            border += 1
+    return ScopeReport(
+        threshold=threshold,
+        precision=tp / (tp + fp) if tp + fp else 1.0,
+        recall=tp / (tp + fn) if tp + fn else 1.0,
+        false_fallbacks=fp,
+        borderline=border,
+        calls_saved=tp + fp,
+        total=len(probabilities),
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate the out-of-scope classifier.")
+    parser.add_argument("--data", type=Path, default=DEFAULT_DATA, help="labelled prompts (JSON lines)")
+    parser.add_argument("--from-db", action="store_true", help="also train on flashcards and document chunks")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.6, 0.7, 0.8, 0.9])
+    parser.add_argument("--borderline", type=float, default=0.5)
+    args = parser.parse_args(argv)
+
+    course_texts = []
+    if args.from_db:
+        import psycopg2
+
+        from config import DB_SETTINGS
+
+        with psycopg2.connect(**DB_SETTINGS) as conn:
+            course_texts = load_course_texts(conn)
+
+    start = time.perf_counter()
+    classifier = build_classifier(course_texts)
+    print(f"trained on {len(course_texts)} course texts plus seeds in {time.perf_counter() - start:.2f}s")
+
+    rows = load_labelled(args.data)
+    start = time.perf_counter()
+    probabilities = [classifier.probability(row["prompt"]) for row in rows]
+    per_prompt = (time.perf_counter() - start) / max(len(rows), 1)
+    labels = [row["in_scope"] for row in rows]
+    print(f"{len(rows)} prompts, {labels.count(False)} out of scope, {per_prompt * 1000:.3f} ms per prompt")
+    for threshold in args.thresholds:
+        print(evaluate(probabilities, labels, threshold, args.borderline).line())
+
+
+if __name__ == "__main__":
+    main()
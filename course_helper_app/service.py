@@ -0,0 +1,407 @@
+"""Course helper operations, independent of Streamlit.
+
+``CourseHelperService`` owns the connection pool, deck cache, retriever,
+answer cache, LLM gateway and grader, and exposes chat, flashcards and quiz
+grading as plain method calls that hold no per-user state, so one instance
+serves every session of a process. ``app.py`` (Streamlit) and ``api.py``
+(ASGI) are both thin front ends over it; ``build_service()`` wires one up from
+config.py.
+
+A chat answer is produced in two steps. ``plan_answer`` decides how the
+question is answered -- from the syllabus tables, with the out-of-scope
+fallback message, from the answer cache, or by the LLM -- and for the LLM
+builds the request. The caller then streams the LLM reply in whatever way
+suits it (``stream_answer`` for a Streamlit placeholder, ``open_stream``
+for an async response) and reports it back with ``finish``. Old turns are
+folded into the rolling summary only after the reply (see conversation.py),
+so summarizing never delays the first token.
+"""
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, List, Optional
+
+import psycopg2
+
+from config import (
+    CHAT_MODEL, DB_POOL_MAX, DB_POOL_MIN, DB_POOL_TIMEOUT, DB_SETTINGS, DECK_CACHE_TTL, EMBED_BATCH_MAX,
+    EMBED_BATCH_WAIT_MS, EMBED_CACHE_SIZE, EMBED_STORE_PATH, EMBED_STORE_SIZE, EMBEDDING_MODEL,
+    EMBEDDING_PROVIDER, HISTORY_TOKEN_BUDGET, LLM_CONCURRENCY, LLM_TIMEOUT, NUMPY_INDEX_PATH, RETRIEVAL_BACKEND,
+    RETRIEVAL_MODE, RETRIEVAL_TOP_K, SCOPE_BORDERLINE, SCOPE_THRESHOLD, SUMMARY_MAX_TOKENS, VECTOR_MANIFEST_PATH,
+    VECTOR_STORE_NAME,
+)
+from conversation import ConversationContext, RollingSummary, SummaryFold, make_llm_summarizer
+from deck_cache import Card, Deck, DeckCache, load_chapters, load_deck, search_flashcards
+from grading import Grader, Verdict, make_llm_grader
+from llm_gateway import PRIORITY_CHAT, PRIORITY_GRADING
+from response_cache import DEFAULT_SCOPE, scope_for
+from retrieval import build_messages, check_backend
+from rubrics import load_rubric
+from scope import OUT_OF_SCOPE, build_classifier, load_course_texts, scope_text
+from streaming import StreamResult, stream_via_gateway
+from telemetry import count, span
+
+FALLBACK_MESSAGE = (
+    "I’m sorry, I cannot help you with that. "
+    "That question falls out of scope with the course material and syllabus. "
+    "I’m here to help with questions more relevant to your Software Engineering course."
+)
+FALLBACK_TTL = 300
+
+SOURCE_SYLLABUS = "syllabus"
+SOURCE_FALLBACK = "fallback"
+SOURCE_CACHE = "cache"
+SOURCE_LLM = "llm"
+
+
+class CardNotFound(Exception):
+    pass
+
+
+def init_connection():
+    return psycopg2.connect(**DB_SETTINGS)
+
+
+def get_flashcards(conn, chapter=None):
+    with conn.cursor() as cur:
+        if chapter:
+            cur.execute("SELECT question, answer FROM flashcards WHERE chapter = %s;", (chapter,))
+        else:
+            cur.execute("SELECT question, answer FROM flashcards;")
+        return cur.fetchall()
+
+
+def get_fallback_message(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT fallback_message FROM fallbacks LIMIT 1;")
+        result = cur.fetchone()
+        return result[0] if result else FALLBACK_MESSAGE
+
+
+def load_card(conn, card_id: int) -> Optional[tuple]:
+    """(question, answer) of a flashcard, or None."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT question, answer FROM flashcards WHERE id = %s;", (card_id,))
+        return cur.fetchone()
+
+
+@dataclass
+class ChatPlan:
+    """How a question will be answered; see ``CourseHelperService.plan_answer``."""
+
+    question: str
+    source: str
+    text: Optional[str] = None  # the answer, unless source is SOURCE_LLM
+    messages: Optional[List[dict]] = None  # the LLM request, if source is SOURCE_LLM
+    prompt_tokens: Optional[int] = None
+    cache_lookup: object = None  # answer-cache miss to store the LLM reply under
+    scope: str = DEFAULT_SCOPE  # answer-cache scope
+    summary_fold: Optional[SummaryFold] = None  # old turns to summarize after the reply
+
+
+@dataclass
+class ChatAnswer:
+    text: str
+    source: str
+    ttft: Optional[float] = None
+    prompt_tokens: Optional[int] = None
+    cancelled: bool = False
+
+
+class CourseHelperService:
+    def __init__(
+        self,
+        connect,
+        deck_cache: DeckCache,
+        retriever,
+        response_cache,
+        llm_gateway,
+        conversation: ConversationContext,
+        grader: Grader,
+        syllabus_router=None,
+        scope_classifier=None,
+        chat_store=None,
+        embedder=None,
+        model: str = CHAT_MODEL,
+        top_k: int = RETRIEVAL_TOP_K,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.connect = connect
+        self.deck_cache = deck_cache
+        self.retriever = retriever
+        self.response_cache = response_cache
+        self.llm_gateway = llm_gateway
+        self.conversation = conversation
+        self.grader = grader
+        self.syllabus_router = syllabus_router
+        self.scope_classifier = scope_classifier
+        self.chat_store = chat_store
+        self.embedder = embedder
+        self.model = model
+        self.top_k = top_k
+        self.clock = clock
+        self._fallback = None  # (message, expires_at)
+
+    # -- flashcards and grading ---------------------------------------------
+
+    def chapters(self) -> tuple:
+        return self.deck_cache.chapters()
+
+    def deck(self, chapter) -> Deck:
+        return self.deck_cache.get(chapter)
+
+    def search_flashcards(self, query: str, chapter: Optional[int] = None, limit: int = 10) -> List[Card]:
+        with self.connect() as conn:
+            return search_flashcards(conn, query, chapter, limit)
+
+    def fallback_message(self) -> str:
+        cached = self._fallback
+        if cached is not None and cached[1] > self.clock():
+            return cached[0]
+        with self.connect() as conn:
+            message = get_fallback_message(conn)
+        self._fallback = (message, self.clock() + FALLBACK_TTL)
+        return message
+
+    def grade(self, card_id: int, user_answer: str, question: Optional[str] = None,
+              answer: Optional[str] = None) -> Verdict:
+        """Grade ``user_answer`` to a card, locally first and by the LLM only when unsure.
+
+        ``question`` and ``answer`` are looked up when the caller does not
+        already have them; raises CardNotFound for an unknown card.
+        """
+        if question is None or answer is None:
+            with self.connect() as conn:
+                card = load_card(conn, card_id)
+            if card is None:
+                raise CardNotFound(card_id)
+            question, answer = card
+        try:
+            with self.connect() as conn:
+                rubric = load_rubric(conn, card_id, question, answer)
+        except Exception:
+            rubric = None  # grade without the rubric
+        with span("grading.grade") as grading:
+            verdict = self.grader.grade(question, answer, user_answer, rubric)
+            grading.set(method=verdict.method)
+        return verdict
+
+    # -- chat ------------------------------------------------------------------
+
+    def plan_answer(self, question: str, history: List[dict], summary: RollingSummary,
+                    chapter: Optional[int] = None) -> ChatPlan:
+        """Decide how to answer ``question``; for the LLM, build its messages.
+
+        ``history`` holds the earlier messages of the conversation (dicts with
+        ``role`` and ``content``) and ``summary`` their rolling summary, which
+        is extended after the reply (see ``stream_answer`` and
+        ``update_summary``). ``chapter`` scopes the question to one chapter of
+        the course.
+        """
+        # Prerequisite, deadline and course questions are answered from SQL.
+        if self.syllabus_router is not None:
+            with span("intent.route") as routing:
+                try:
+                    routed = self.syllabus_router.answer(question)
+                except Exception:
+                    routed = None
+                routing.set(intent=routed.intent if routed else None)
+            if routed is not None:
+                return ChatPlan(question, SOURCE_SYLLABUS, text=routed.text)
+
+        # Confidently off-topic prompts get the fallback message without an
+        # LLM call; borderline ones are escalated like any other question.
+        if self.scope_classifier is not None:
+            with span("scope.check") as scoping:
+                decision = self.scope_classifier.decide(scope_text(question, history))
+                scoping.set(label=decision.label, p=round(decision.out_of_scope_probability, 3))
+            count("scope_decisions_total", label=decision.label)
+            if decision.label == OUT_OF_SCOPE:
+                try:
+                    return ChatPlan(question, SOURCE_FALLBACK, text=self.fallback_message())
+                except Exception:
+                    pass  # without the stored message, let the LLM decline
+
+        # Follow-ups depend on the earlier turns, so only opening questions
+        # go through the answer cache.
+        lookup = None
+        scope = scope_for(chapter)
+        if not history:
+            with span("cache.lookup", scope=scope):
+                lookup = self.response_cache.lookup(question, scope)
+            if lookup.hit:
+                return ChatPlan(question, SOURCE_CACHE, text=lookup.answer, scope=scope)
+
+        with span("retrieval.search", k=self.top_k, chapter=chapter) as search:
+            try:
+                chunks = self.retriever.search(question, k=self.top_k, chapter=chapter)
+            except Exception:
+                chunks = []
+            search.set(chunks=len(chunks))
+        with span("context.build", history_turns=len(history)):
+            context = self.conversation.build(history, build_messages(question, chunks), summary)
+        return ChatPlan(
+            question, SOURCE_LLM, messages=context.messages, prompt_tokens=context.prompt_tokens, cache_lookup=lookup,
+            scope=scope, summary_fold=context.fold,
+        )
+
+    def stream_answer(self, plan: ChatPlan, on_update: Callable[[str], None],
+                      should_cancel: Optional[Callable[[], bool]] = None) -> ChatAnswer:
+        """Answer a plan, streaming escaped partial LLM text into ``on_update``.
+
+        The rolling summary is then updated in the background.
+        """
+        if plan.source != SOURCE_LLM:
+            return ChatAnswer(plan.text, plan.source, ttft=0.0)
+        try:
+            result = stream_via_gateway(
+                self.llm_gateway, plan.messages, on_update,
+                model=self.model, priority=PRIORITY_CHAT, should_cancel=should_cancel,
+            )
+        except Exception as e:
+            return ChatAnswer(f"⚠️ API error: {e}", plan.source, prompt_tokens=plan.prompt_tokens)
+        finally:
+            self.conversation.fold_later(plan.summary_fold)
+        self.finish(plan, result)
+        return ChatAnswer(result.text, plan.source, result.ttft, plan.prompt_tokens, result.cancelled)
+
+    async def open_stream(self, plan: ChatPlan):
+        """The LLM reply for a SOURCE_LLM plan as an async iterator of text deltas.
+
+        Call ``close()`` on it when done, also when the client went away.
+        """
+        return await self.llm_gateway.astream(plan.messages, model=self.model, priority=PRIORITY_CHAT)
+
+    def finish(self, plan: ChatPlan, result: StreamResult):
+        """Store a completed LLM reply in the answer cache."""
+        if plan.cache_lookup is not None and not result.cancelled and result.text:
+            self.response_cache.store(
+                plan.question, result.text, result.elapsed, plan.scope, plan.cache_lookup.embedding,
+            )
+
+    def update_summary(self, plan: ChatPlan):
+        """Fold the plan's old turns into its rolling summary now (blocking)."""
+        if plan.summary_fold is not None:
+            self.conversation.fold(plan.summary_fold)
+
+    def answer(self, question: str, history: Optional[List[dict]] = None,
+               summary: Optional[RollingSummary] = None, chapter: Optional[int] = None) -> ChatAnswer:
+        """Blocking answer to ``question``."""
+        plan = self.plan_answer(question, history or [], summary or RollingSummary(), chapter)
+        return self.stream_answer(plan, lambda partial_html: None)
+
+    def record(self, conversation_id: str, message: dict):
+        """Persist a chat message (see chat_store.ChatStore.append)."""
+        if self.chat_store is not None:
+            self.chat_store.append(conversation_id, message)
+
+
+def build_service() -> CourseHelperService:
+    """A service wired to Postgres and OpenAI as configured in config.py."""
+    from openai import OpenAI
+
+    from chat_store import ChatStore
+    from database import ConnectionPool
+    from embedding_service import EmbeddingService, VectorCache, VectorStore
+    from embeddings import make_embedder
+    from llm_gateway import LLMGateway
+    from migrations import apply_migrations
+    from response_cache import ResponseCache
+    from retrieval import PgVectorRetriever
+    from syllabus import SyllabusRouter
+
+    check_backend(RETRIEVAL_BACKEND)
+    pool = None
+    pool_lock = threading.Lock()
+
+    def connect():
+        """Pooled connection; the pool is created (and migrated) on first use, so
+        the service can start while the database is still down."""
+        nonlocal pool
+        with pool_lock:
+            if pool is None:
+                new_pool = ConnectionPool(
+                    minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX, timeout=DB_POOL_TIMEOUT, **DB_SETTINGS
+                )
+                with new_pool.connection() as conn:
+                    apply_migrations(conn)
+                pool = new_pool
+        return pool.connection()
+
+    def load_deck_from_pool(chapter):
+        with connect() as conn:
+            return load_deck(conn, chapter)
+
+    def load_chapters_from_pool():
+        with connect() as conn:
+            return load_chapters(conn)
+
+    deck_cache = DeckCache(load_deck_from_pool, ttl=DECK_CACHE_TTL, chapters_loader=load_chapters_from_pool)
+    deck_cache.start_listener(DB_SETTINGS)
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    client = OpenAI(api_key=api_key)
+    # Retrieval, the response cache and grading share one batcher and cache.
+    provider = make_embedder(EMBEDDING_PROVIDER, client, EMBEDDING_MODEL)
+    embedder = EmbeddingService(
+        provider,
+        max_batch=EMBED_BATCH_MAX,
+        max_wait=EMBED_BATCH_WAIT_MS / 1000,
+        cache=VectorCache(provider.dim, EMBED_CACHE_SIZE),
+        store=VectorStore(EMBED_STORE_PATH, provider.dim, EMBED_STORE_SIZE) if EMBED_STORE_PATH else None,
+    )
+    gateway = LLMGateway(concurrency=LLM_CONCURRENCY, timeout=LLM_TIMEOUT, api_key=api_key)
+    summarize = make_llm_summarizer(
+        partial(gateway.complete, model=CHAT_MODEL, priority=PRIORITY_CHAT), SUMMARY_MAX_TOKENS
+    )
+    grader = Grader(
+        llm_grade=make_llm_grader(partial(gateway.complete, model=CHAT_MODEL, priority=PRIORITY_GRADING)),
+        embed=embedder.embed_one,
+    )
+    if RETRIEVAL_BACKEND == "numpy":
+        from numpy_index import NumpyRetriever
+
+        retriever = NumpyRetriever(NUMPY_INDEX_PATH, embedder)
+    elif RETRIEVAL_BACKEND == "remote":
+        from retrieval import FileSearchRetriever
+        from vector_manifest import VectorManifest, resolve_store_id
+
+        manifest = VectorManifest(VECTOR_MANIFEST_PATH)
+        retriever = FileSearchRetriever(client, lambda: resolve_store_id(client, manifest, VECTOR_STORE_NAME))
+    else:
+        retriever = PgVectorRetriever(embedder, connect=connect, mode=RETRIEVAL_MODE)
+
+    try:
+        with connect() as conn:
+            course_texts = load_course_texts(conn)
+    except Exception:
+        course_texts = []  # the seed prompts alone still catch the obvious cases
+
+    return CourseHelperService(
+        connect=connect,
+        deck_cache=deck_cache,
+        retriever=retriever,
+        response_cache=ResponseCache(embed=embedder.embed_one, connect=connect),
+        llm_gateway=gateway,
+        conversation=ConversationContext(summarize, history_budget=HISTORY_TOKEN_BUDGET),
+        grader=grader,
+        syllabus_router=SyllabusRouter(connect=connect),
+        scope_classifier=build_classifier(course_texts, threshold=SCOPE_THRESHOLD, borderline=SCOPE_BORDERLINE),
+        chat_store=ChatStore(connect=connect),
+        embedder=embedder,
+    )
+
+
+_default_service = None
+
+
+def get_chatbot_response(question: str) -> tuple:
+    """(answer text, source) for a single question, using a process-wide service."""
+    global _default_service
+    if _default_service is None:
+        _default_service = build_service()
+    reply = _default_service.answer(question)
+    return reply.text, reply.source
@@ -0,0 +1,241 @@
+"""Session state kept outside the Streamlit process.
+
+``st.session_state`` only lives in the process that served the browser's
+websocket, so behind a load balancer a reconnect to another replica would lose
+the student's screen, card and conversation. ``SessionState`` mirrors a fixed
+set of keys into a shared backend: a key is read from the backend only the
+first time the app asks for it in a process (normally once, after a replica
+switch), and at the end of each rerun only the keys whose serialized value
+changed are written, in one round trip. Chat messages are not mirrored:
+they are already in chat_store.py and are reloaded from there.
+
+A session is named by an unguessable token (``new_token``) that the browser
+keeps; the backend only sees an id derived from it (``session_id_for``), and
+``open_session`` accepts a token only for a session the backend already has,
+so a client cannot choose its own session.
+
+Values are compact JSON (zlib-compressed above ``COMPRESS_OVER`` bytes);
+RollingSummary round-trips as itself, and derived fields listed in
+``DERIVED_FIELDS`` are dropped because they are rebuilt on demand.
+"""
+
+import hashlib
+import json
+import logging
+import re
+import secrets
+import threading
+import uuid
+import zlib
+from dataclasses import asdict, fields, is_dataclass
+from typing import Iterable, Mapping, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+from conversation import RollingSummary
+from database import rollback_on_error
+
+log = logging.getLogger(__name__)
+
+COMPRESS_OVER = 512
+
+# Dataclasses stored in the session, by name.
+TYPES = {cls.__name__: cls for cls in (RollingSummary,)}
+
+# Fields recomputed when missing (see transcript.message_html), per key.
+DERIVED_FIELDS = {"messages": ("html",)}
+
+_TOKEN_RE = re.compile(r"[A-Za-z0-9_-]{43}")
+
+
+def _default(value):
+    if is_dataclass(value) and type(value).__name__ in TYPES:
+        return {"__type__": type(value).__name__, **asdict(value)}
+    raise TypeError(f"Cannot store {type(value).__name__} in the session")
+
+
+def _object_hook(obj):
+    cls = TYPES.get(obj.get("__type__"))
+    if cls is None:
+        return obj
+    return cls(**{f.name: obj[f.name] for f in fields(cls) if f.name in obj})
+
+
+def encode(value, drop: Iterable[str] = ()) -> bytes:
+    """Serialize ``value``; ``drop`` names dict keys left out of a list of dicts."""
+    drop = tuple(drop)
+    if drop and isinstance(value, list):
+        value = [{k: v for k, v in item.items() if k not in drop} if isinstance(item, dict) else item
+                 for item in value]
+    raw = json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=_default).encode()
+    if len(raw) > COMPRESS_OVER:
+        return b"z" + zlib.compress(raw)
+    return b"j" + raw
+
+
+def decode(data: bytes):
+    data = bytes(data)
+    raw = zlib.decompress(data[1:]) if data[:1] == b"z" else data[1:]
+    return json.loads(raw, object_hook=_object_hook)
+
+
+class MemoryBackend:
+    """Backend for a single process (development and tests)."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def load(self, session_id: str, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._data.get((session_id, key))
+
+    def save(self, session_id: str, values: Mapping[str, bytes]):
+        with self._lock:
+            for key, value in values.items():
+                self._data[(session_id, key)] = value
+
+    def exists(self, session_id: str) -> bool:
+        with self._lock:
+            return any(sid == session_id for sid, _ in self._data)
+
+
+class PostgresBackend:
+    """Backend in the ``session_state`` table, shared by every replica.
+
+    ``connect`` returns a context manager yielding a psycopg2 connection (e.g.
+    ``ConnectionPool.connection``).
+    """
+
+    def __init__(self, connect):
+        self.connect = connect
+
+    def load(self, session_id: str, key: str) -> Optional[bytes]:
+        with self.connect() as conn, conn.cursor() as cur:
+            cur.execute(
+                "SELECT value FROM session_state WHERE session_id = %s AND key = %s;", (session_id, key)
+            )
+            row = cur.fetchone()
+        return bytes(row[0]) if row else None
+
+    def exists(self, session_id: str) -> bool:
+        with self.connect() as conn, conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM session_state WHERE session_id = %s LIMIT 1;", (session_id,))
+            return cur.fetchone() is not None
+
+    def save(self, session_id: str, values: Mapping[str, bytes]):
+        rows = [(session_id, key, value) for key, value in values.items()]
+        with self.connect() as conn, rollback_on_error(conn):
+            with conn.cursor() as cur:
+                execute_values(
+                    cur,
+                    """
+                    INSERT INTO session_state (session_id, key, value) VALUES %s
+                    ON CONFLICT (session_id, key)
+                    DO UPDATE SET value = EXCLUDED.value, updated_at = now();
+                    """,
+                    rows,
+                    template="(%s, %s, %s)",
+                )
+            conn.commit()
+
+    def purge(self, max_age_seconds: float) -> int:
+        """Delete sessions not written for ``max_age_seconds``. Returns the rows removed."""
+        with self.connect() as conn, rollback_on_error(conn):
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    DELETE FROM session_state WHERE session_id IN (
+                        SELECT session_id FROM session_state GROUP BY session_id
+                        HAVING max(updated_at) < now() - make_interval(secs => %s)
+                    );
+                    """,
+                    (max_age_seconds,),
+                )
+                removed = cur.rowcount
+            conn.commit()
+        return removed
+
+
+def make_backend(kind: str, connect=None):
+    """Build the backend named by ``kind`` ("memory" or "postgres")."""
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "postgres":
+        return PostgresBackend(connect)
+    raise ValueError(f"Unknown session backend: {kind}")
+
+
+def new_token() -> str:
+    return secrets.token_urlsafe(32)
+
+
+def session_id_for(token: str) -> str:
+    """Backend id of the session behind ``token``; the token itself is never stored."""
+    return str(uuid.UUID(bytes=hashlib.sha256(token.encode()).digest()[:16]))
+
+
+class SessionState:
+    """The persisted keys of one browser session.
+
+    Keep one instance per Streamlit session: it remembers the serialized value
+    of every key it loaded or saved, which is what makes ``save`` write only
+    the dirty ones. Backend errors are logged and otherwise ignored, so the app
+    keeps working on its in-process state while the store is down.
+    """
+
+    def __init__(self, backend, session_id: str, keys: Iterable[str]):
+        self.backend = backend
+        self.session_id = session_id
+        self.keys = tuple(keys)
+        self._stored = {}  # key -> serialized value in the backend, None when absent
+
+    def get(self, key: str, default=None):
+        if key not in self._stored:
+            try:
+                self._stored[key] = self.backend.load(self.session_id, key)
+            except Exception:
+                log.warning("could not load session key %s", key, exc_info=True)
+                return default
+        data = self._stored[key]
+        return decode(data) if data is not None else default
+
+    def dirty(self, state: Mapping) -> dict:
+        """Serialized values of the keys in ``state`` that differ from the backend."""
+        changed = {}
+        for key in self.keys:
+            if key in state:
+                data = encode(state[key], DERIVED_FIELDS.get(key, ()))
+                if data != self._stored.get(key):
+                    changed[key] = data
+        return changed
+
+    def save(self, state: Mapping) -> int:
+        """Write the dirty keys of ``state``. Returns how many were written."""
+        try:
+            changed = self.dirty(state)
+            if not changed:
+                return 0
+            self.backend.save(self.session_id, changed)
+        except Exception:
+            log.warning("could not save session %s", self.session_id, exc_info=True)
+            return 0
+        self._stored.update(changed)
+        return len(changed)
+
+
+def open_session(backend, token: Optional[str], keys: Iterable[str]) -> Tuple[SessionState, str]:
+    """``(SessionState, token)`` for the session behind ``token``, or for a new one.
+
+    A token the backend has no session for (or cannot check) is replaced by a
+    new one rather than adopted.
+    """
+    if token and _TOKEN_RE.fullmatch(token):
+        session_id = session_id_for(token)
+        try:
+            if backend.exists(session_id):
+                return SessionState(backend, session_id, keys), token
+        except Exception:
+            log.warning("could not look up session", exc_info=True)
+    token = new_token()
+    return SessionState(backend, session_id_for(token), keys), token
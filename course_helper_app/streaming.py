@@ -0,0 +1,148 @@
+"""Token streaming helpers for the chatbot.
+
+Chat completions are requested with ``stream=True`` and the deltas are pushed
+into a Streamlit placeholder as they arrive instead of replaying the finished
+answer word by word.
+"""
+
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from html import escape
+from typing import Callable, Iterable, Optional
+
+import telemetry
+from tokens import count_tokens
+
+# Placeholder redraws are throttled to at most one every UPDATE_INTERVAL seconds.
+UPDATE_INTERVAL = 0.05
+
+# Most recent time-to-first-token samples (seconds), shared by all sessions.
+TTFT_SAMPLES = deque(maxlen=1000)
+_samples_lock = threading.Lock()
+
+
+@dataclass
+class StreamResult:
+    text: str
+    ttft: Optional[float]
+    elapsed: float
+    cancelled: bool = False
+
+
+class IncrementalEscaper:
+    """HTML-escape a growing string one delta at a time.
+
+    ``html.escape`` works character by character, so escaping each delta and
+    joining the pieces gives the same result as escaping the full text, without
+    re-escaping everything on every token.
+    """
+
+    def __init__(self):
+        self._raw = []
+        self._escaped = []
+
+    def feed(self, delta: str):
+        self._raw.append(delta)
+        self._escaped.append(escape(delta))
+
+    @property
+    def text(self) -> str:
+        return "".join(self._raw)
+
+    @property
+    def html(self) -> str:
+        return "".join(self._escaped)
+
+
+def record_ttft(seconds: float):
+    with _samples_lock:
+        TTFT_SAMPLES.append(seconds)
+
+
+def percentile(samples: Iterable[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile (0-100) of ``samples``, or None without any."""
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def ttft_percentile(pct: float) -> Optional[float]:
+    """Return the given percentile (0-100) of recorded time-to-first-token."""
+    with _samples_lock:
+        samples = list(TTFT_SAMPLES)
+    return percentile(samples, pct)
+
+
+def iter_deltas(stream) -> Iterable[str]:
+    """Yield the text deltas of a chat.completions stream."""
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
+
+
+def stream_to_placeholder(
+    deltas: Iterable[str],
+    on_update: Callable[[str], None],
+    interval: float = UPDATE_INTERVAL,
+    should_cancel: Optional[Callable[[], bool]] = None,
+    clock: Callable[[], float] = time.monotonic,
+    start: Optional[float] = None,
+) -> StreamResult:
+    """Consume ``deltas`` and call ``on_update`` with the escaped partial text.
+
+    Redraws happen at most once per ``interval`` seconds; the caller is
+    responsible for the final redraw using ``StreamResult.text``. TTFT and
+    elapsed time count from ``start`` (a ``clock()`` reading), by default
+    from the call.
+    """
+    escaper = IncrementalEscaper()
+    if start is None:
+        start = clock()
+    last_draw = None
+    ttft = None
+    cancelled = False
+
+    for delta in deltas:
+        if ttft is None:
+            ttft = clock() - start
+            record_ttft(ttft)
+        escaper.feed(delta)
+        if should_cancel and should_cancel():
+            cancelled = True
+            break
+        now = clock()
+        if last_draw is None or now - last_draw >= interval:
+            on_update(escaper.html)
+            last_draw = now
+
+    return StreamResult(escaper.text, ttft, clock() - start, cancelled)
+
+
+def stream_via_gateway(gateway, messages, on_update, model="gpt-5-nano", priority=0, **kwargs) -> StreamResult:
+    """Stream a chat completion through the shared ``llm_gateway.LLMGateway``
+    and render it through ``on_update``.
+
+    The deltas are always closed, so when Streamlit interrupts the script for
+    a rerun the upstream request is cancelled instead of running on.
+    """
+    with telemetry.span("llm.stream", model=model, priority=priority) as s:
+        # Time to first token includes sending the request.
+        start = kwargs.get("clock", time.monotonic)()
+        deltas = gateway.stream(messages, model=model, priority=priority)
+        try:
+            result = stream_to_placeholder(deltas, on_update, start=start, **kwargs)
+        finally:
+            deltas.close()
+        if telemetry.ENABLED:
+            # Streamed responses carry no usage block, so count locally.
+            completion_tokens = count_tokens(result.text)
+            s.set(ttft=result.ttft, completion_tokens=completion_tokens, cancelled=result.cancelled)
+            telemetry.count("llm_tokens_total", completion_tokens, kind="completion")
+    return result
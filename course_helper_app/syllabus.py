@@ -0,0 +1,274 @@
+"""Deterministic answers to syllabus questions.
+
+Questions such as "What are the prerequisites for CSC 4350?" or "When is the
+midterm?" have exact answers in the ``courses``, ``prerequisites`` and
+``deadlines`` tables (db/migrations/007_syllabus_facts.sql). ``SyllabusRouter``
+recognises them locally, first with keyword patterns and then with a small
+naive Bayes classifier for other phrasings, and answers from SQL with a
+template. Anything it does not recognise, or has no facts for, returns None
+and goes to the LLM as before.
+"""
+
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from transcript import APP_TZ, format_ts, now_in_app_tz
+
+PREREQUISITES = "prerequisites"
+DEADLINES = "deadlines"
+COURSE_INFO = "course_info"
+OTHER = "other"
+
+# Questions that do not name a course are about this one.
+DEFAULT_COURSE = "CSC 4350"
+
+_COURSE_RE = re.compile(r"\b([A-Za-z]{2,4})\s*-?\s*(\d{4})\b")
+_WORD_RE = re.compile(r"[a-z]+")
+# Words that say nothing about which deadline is meant.
+_DEADLINE_STOPWORDS = {"when", "what", "whats", "s", "which", "the", "next", "is", "are", "due", "deadline",
+                       "deadlines", "for", "our", "my", "does", "do", "we", "i", "have", "a", "an", "of", "any",
+                       "all", "upcoming", "coming", "up", "soon", "still", "left", "remaining", "dates", "date",
+                       "this", "week", "course", "class", "there", "tell", "show", "me", "list", "please", "to"}
+
+# Unambiguous phrasings, checked before the classifier.
+PATTERNS = [
+    (PREREQUISITES, re.compile(r"\bpre-?req(uisite)?s?\b|\btake before\b", re.I)),
+    (DEADLINES, re.compile(
+        r"\bdeadlines?\b|\bdue\b(?! to)|\bwhen (is|are) (the )?(next )?"
+        r"(midterm|final|exam|quiz|project|assignment|homework|presentation|milestone)",
+        re.I,
+    )),
+    (COURSE_INFO, re.compile(r"^\s*what(?:'s| is) [a-z]{2,4}\s*-?\s*\d{4}\s*\??\s*$", re.I)),
+]
+
+TRAINING_EXAMPLES = {
+    PREREQUISITES: [
+        "what courses do i need before this class",
+        "which classes are required before software engineering",
+        "what should i have completed before enrolling",
+        "can i take this course without data structures",
+        "what is required to register for this course",
+        "which courses come before csc",
+    ],
+    DEADLINES: [
+        "when do we submit the project",
+        "what is due this week",
+        "when is the final exam",
+        "what date is the midterm",
+        "when does the sprint end",
+        "what is the last day to turn in homework",
+        "when are presentations scheduled",
+    ],
+    COURSE_INFO: [
+        "what is this course about",
+        "how many credits is this course",
+        "what is the course title",
+        "what does csc cover",
+        "describe the class",
+        "how many credit hours do i get",
+        "tell me about this class",
+        "what course is this",
+    ],
+    OTHER: [
+        "what is software engineering",
+        "explain the waterfall model",
+        "what is a use case diagram",
+        "what is version control",
+        "how does agile differ from waterfall",
+        "what is a class diagram",
+        "give me an example of a functional requirement",
+        "what is unit testing",
+        "explain the difference between verification and validation",
+        "what is the weather today",
+        "who won the game last night",
+        "write me a poem",
+        "what is a design pattern",
+        "how do i write a user story",
+    ],
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+def normalize_course(subject: str, number: str) -> str:
+    return f"{subject.upper()} {number}"
+
+
+def find_course(text: str) -> Optional[str]:
+    """The first course code mentioned in ``text``, e.g. "csc4350" -> "CSC 4350"."""
+    match = _COURSE_RE.search(text)
+    return normalize_course(*match.groups()) if match else None
+
+
+class IntentClassifier:
+    """Multinomial naive Bayes over word counts with add-one smoothing."""
+
+    def __init__(self, examples: Dict[str, Sequence[str]] = TRAINING_EXAMPLES):
+        self.labels = list(examples)
+        self._word_counts = {label: Counter() for label in self.labels}
+        self._totals = {}
+        vocabulary = set()
+        for label, texts in examples.items():
+            for text in texts:
+                words = tokenize(text)
+                self._word_counts[label].update(words)
+                vocabulary.update(words)
+        self._vocab_size = len(vocabulary)
+        n = sum(len(texts) for texts in examples.values())
+        self._log_prior = {label: math.log(len(examples[label]) / n) for label in self.labels}
+        for label in self.labels:
+            self._totals[label] = sum(self._word_counts[label].values())
+
+    def probabilities(self, text: str) -> Dict[str, float]:
+        words = tokenize(text)
+        scores = {}
+        for label in self.labels:
+            counts, denom = self._word_counts[label], self._totals[label] + self._vocab_size
+            scores[label] = self._log_prior[label] + sum(math.log((counts[w] + 1) / denom) for w in words)
+        top = max(scores.values())
+        exp = {label: math.exp(s - top) for label, s in scores.items()}
+        total = sum(exp.values())
+        return {label: v / total for label, v in exp.items()}
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        probs = self.probabilities(text)
+        label = max(probs, key=probs.get)
+        return label, probs[label]
+
+
+def classify(question: str, classifier: IntentClassifier, min_confidence: float = 0.8) -> str:
+    """The question's intent, or OTHER when neither patterns nor classifier are sure."""
+    for intent, pattern in PATTERNS:
+        if pattern.search(question):
+            return intent
+    intent, confidence = classifier.predict(question)
+    return intent if confidence >= min_confidence else OTHER
+
+
+# -- SQL ---------------------------------------------------------------------
+
+def load_course(conn, code: str) -> Optional[tuple]:
+    """(code, title, credits, description) or None."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT code, title, credits, description FROM courses WHERE code = %s;", (code,))
+        return cur.fetchone()
+
+
+def load_prerequisites(conn, code: str) -> Optional[List[tuple]]:
+    """(prerequisite code, title or None) pairs; None if the course is unknown."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT p.prerequisite_code, pc.title
+            FROM courses c
+            LEFT JOIN prerequisites p ON p.course_code = c.code
+            LEFT JOIN courses pc ON pc.code = p.prerequisite_code
+            WHERE c.code = %s
+            ORDER BY p.prerequisite_code;
+            """,
+            (code,),
+        )
+        rows = cur.fetchall()
+    if not rows:
+        return None
+    return [(prereq, title) for prereq, title in rows if prereq is not None]
+
+
+def load_deadlines(conn, code: str, after: datetime, limit: int = 10) -> List[tuple]:
+    """(title, due_at, details) of the course's deadlines due after ``after``."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT title, due_at, details FROM deadlines
+            WHERE course_code = %s AND due_at >= %s
+            ORDER BY due_at LIMIT %s;
+            """,
+            (code, after, limit),
+        )
+        return cur.fetchall()
+
+
+# -- templates ---------------------------------------------------------------
+
+def _course_label(code: str, title: Optional[str]) -> str:
+    return f"{code} ({title})" if title else code
+
+
+def format_due(dt: datetime) -> str:
+    if APP_TZ:
+        dt = dt.astimezone(APP_TZ)
+    return f"{dt.strftime('%a, %b')} {dt.day} at {format_ts(dt)}"
+
+
+def prerequisites_answer(code: str, prereqs: List[tuple]) -> str:
+    if not prereqs:
+        return f"{code} has no prerequisites."
+    listing = ", ".join(_course_label(p, title) for p, title in prereqs)
+    return f"The prerequisites for {code} are: {listing}."
+
+
+def deadlines_answer(code: str, deadlines: List[tuple]) -> str:
+    if len(deadlines) == 1:
+        title, due_at, details = deadlines[0]
+        return f"{title} for {code} is due {format_due(due_at)}." + (f" {details}" if details else "")
+    lines = [f"Upcoming deadlines for {code}:"]
+    lines += [f"- {title}: {format_due(due_at)}" for title, due_at, _ in deadlines]
+    return "\n".join(lines)
+
+
+def course_answer(course: tuple) -> str:
+    code, title, credits, description = course
+    text = f"{code} is {title}"
+    text += f", a {credits}-credit course." if credits else "."
+    return f"{text} {description}" if description else text
+
+
+@dataclass
+class RoutedAnswer:
+    intent: str
+    course: str
+    text: str
+
+
+class SyllabusRouter:
+    """Answers recognised syllabus questions from SQL; ``answer`` returns None otherwise."""
+
+    def __init__(self, connect, classifier: Optional[IntentClassifier] = None,
+                 default_course: str = DEFAULT_COURSE, now=now_in_app_tz):
+        self.connect = connect
+        self.classifier = classifier or IntentClassifier()
+        self.default_course = default_course
+        self.now = now
+
+    def answer(self, question: str) -> Optional[RoutedAnswer]:
+        intent = classify(question, self.classifier)
+        if intent == OTHER:
+            return None
+        course = find_course(question) or self.default_course
+        with self.connect() as conn:
+            text = self._answer(conn, intent, course, question)
+        return RoutedAnswer(intent, course, text) if text else None
+
+    def _answer(self, conn, intent: str, course: str, question: str) -> Optional[str]:
+        if intent == PREREQUISITES:
+            prereqs = load_prerequisites(conn, course)
+            return prerequisites_answer(course, prereqs) if prereqs is not None else None
+        if intent == DEADLINES:
+            deadlines = load_deadlines(conn, course, self.now())
+            wanted = set(tokenize(_COURSE_RE.sub(" ", question))) - _DEADLINE_STOPWORDS
+            matching = [d for d in deadlines if wanted & set(tokenize(d[0]))]
+            if wanted and not matching:
+                return None  # names a deadline the table does not have; let the LLM answer
+            # "When is the midterm?" gets the midterm; "what's due?" gets the list.
+            chosen = matching[:1] if matching else deadlines[:5]
+            return deadlines_answer(course, chosen) if chosen else None
+        if intent == COURSE_INFO:
+            course_row = load_course(conn, course)
+            return course_answer(course_row) if course_row else None
+        return None
@@ -0,0 +1,316 @@
+"""Lightweight timing spans, histograms and an optional sampling profiler.
+
+    with span("retrieval.search", k=4) as s:
+        chunks = retriever.search(...)
+        s.set(chunks=len(chunks))
+
+Finished spans are aggregated into per-name latency histograms (exported in
+Prometheus text format by ``start_metrics_server``) and, with TRACE_LOG set,
+logged as one JSON line each, tagged with the trace id of the Streamlit rerun
+that produced them (see ``new_trace``).
+
+Everything is off unless TELEMETRY_ENABLED is set: ``span`` then returns a
+shared no-op object, so instrumented code pays one flag check per span.
+Setting PROFILE_INTERVAL starts ``SamplingProfiler``, which samples every
+thread's stack and writes collapsed stacks (flamegraph input) to
+PROFILE_OUTPUT at exit.
+"""
+
+import atexit
+import bisect
+import errno
+import json
+import logging
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from config import METRICS_PORT, PROFILE_INTERVAL, PROFILE_OUTPUT, TELEMETRY_ENABLED, TRACE_LOG
+
+log = logging.getLogger("course_helper.trace")
+
+ENABLED = TELEMETRY_ENABLED
+
+# Histogram bucket upper bounds, in seconds.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_trace_id = ContextVar("trace_id", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Span histograms keyed by span name, plus labelled counters."""
+
+    def __init__(self, prefix: str = "coursehelper"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = Counter()
+
+    def observe(self, name: str, seconds: float, error: bool = False):
+        with self._lock:
+            hist = self._histograms.get(name)
+            if hist is None:
+                hist = self._histograms[name] = Histogram()
+            hist.observe(seconds)
+            if error:
+                self._counters[("span_errors_total", (("span", name),))] += 1
+
+    def inc(self, name: str, value: float = 1, **labels):
+        with self._lock:
+            self._counters[(name, tuple(sorted(labels.items())))] += value
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "spans": {
+                    name: {"count": h.count, "sum": h.sum, "buckets": dict(zip(map(str, h.buckets + ("+Inf",)), h.counts))}
+                    for name, h in self._histograms.items()
+                },
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in self._counters.items()
+                ],
+            }
+
+    def render_prometheus(self) -> str:
+        p = self.prefix
+        lines = [f"# TYPE {p}_span_seconds histogram"]
+        with self._lock:
+            for name, h in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, n in zip(h.buckets + (float("inf"),), h.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{p}_span_seconds_bucket{{span="{name}",le="{le}"}} {cumulative}')
+                lines.append(f'{p}_span_seconds_sum{{span="{name}"}} {h.sum}')
+                lines.append(f'{p}_span_seconds_count{{span="{name}"}} {h.count}')
+            for (name, labels), value in sorted(self._counters.items()):
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{p}_{name}{{{label_text}}} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def new_trace() -> str:
+    """Start a trace for the current rerun; later spans in this context carry its id."""
+    trace_id = uuid.uuid4().hex[:16]
+    _trace_id.set(trace_id)
+    return trace_id
+
+
+def current_trace() -> Optional[str]:
+    return _trace_id.get()
+
+
+class Span:
+    __slots__ = ("name", "attrs", "_start", "_error")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self._start = None
+        self._error = False
+
+    def start(self) -> "Span":
+        self._start = time.perf_counter()
+        return self
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def end(self):
+        if self._start is None:
+            return
+        seconds = time.perf_counter() - self._start
+        self._start = None
+        REGISTRY.observe(self.name, seconds, self._error)
+        if TRACE_LOG:
+            log.info(json.dumps({
+                "trace": _trace_id.get(),
+                "span": self.name,
+                "ms": round(seconds * 1000, 3),
+                "error": self._error,
+                **self.attrs,
+            }, default=str))
+
+    def __enter__(self) -> "Span":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        # st.rerun()/st.stop() unwind with exceptions that are not failures.
+        self._error = exc_type is not None and issubclass(exc_type, Exception)
+        self.end()
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def start(self):
+        return self
+
+    def set(self, **attrs):
+        pass
+
+    def end(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str, **attrs):
+    """A timing span; use as a context manager or call ``start()``/``end()``."""
+    if not ENABLED:
+        return NOOP_SPAN
+    return Span(name, attrs)
+
+
+def timed(name: Optional[str] = None):
+    """Decorator wrapping every call of the function in a span."""
+
+    def decorate(fn):
+        span_name = name or fn.__qualname__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            with Span(span_name, {}):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def count(name: str, value: float = 1, **labels):
+    """Add ``value`` to a counter, e.g. ``count("llm_tokens_total", 120, kind="prompt")``."""
+    if ENABLED:
+        REGISTRY.inc(name, value, **labels)
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = "0.0.0.0", registry: Registry = REGISTRY,
+                         ports: int = 1):
+    """Serve ``/metrics`` (Prometheus text) and ``/metrics.json`` on a daemon thread.
+
+    With ``ports`` > 1 the first free port of ``port, port + 1, ...`` is
+    used, so each worker process of a server can export its own registry.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.startswith("/metrics.json"):
+                body, kind = json.dumps(registry.snapshot()).encode(), "application/json"
+            elif self.path.startswith("/metrics"):
+                body, kind = registry.render_prometheus().encode(), "text/plain; version=0.0.4"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", kind)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    for attempt in range(ports):
+        try:
+            server = ThreadingHTTPServer((host, port + attempt), Handler)
+            break
+        except OSError as e:
+            if e.errno != errno.EADDRINUSE or attempt == ports - 1:
+                raise
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+class SamplingProfiler:
+    """Samples the stacks of all other threads every ``interval`` seconds."""
+
+    def __init__(self, interval: float = 0.01, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                names = []
+                while frame is not None and len(names) < self.max_depth:
+                    code = frame.f_code
+                    names.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def dump(self, path: str):
+        """Write collapsed stacks (``frame;frame;frame count``) to ``path``."""
+        with open(path, "w") as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+
+
+def start_profiler_from_env() -> Optional[SamplingProfiler]:
+    """Start a profiler when PROFILE_INTERVAL is set; it dumps to PROFILE_OUTPUT at exit."""
+    if PROFILE_INTERVAL <= 0:
+        return None
+    profiler = SamplingProfiler(PROFILE_INTERVAL).start()
+
+    def finish():
+        profiler.stop()
+        profiler.dump(PROFILE_OUTPUT)
+
+    atexit.register(finish)
+    return profiler
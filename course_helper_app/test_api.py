@@ -0,0 +1,224 @@
+import asyncio
+import json
+import unittest
+from contextlib import contextmanager
+
+from api import create_app
+from conversation import ConversationContext
+from deck_cache import Card, Deck
+from fake_openai import DEFAULT_REPLY, FakeOpenAIServer
+from grading import Grader
+from llm_gateway import LLMGateway
+from response_cache import ResponseCache
+from scope import build_classifier
+from service import CourseHelperService
+from syllabus import RoutedAnswer
+
+CARDS = {7: ("What is version control?", "A system for tracking changes in code over time.")}
+
+
+class FakeCursor:
+    def __init__(self):
+        self.row = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.rows = []
+        if "FROM flashcards WHERE id" in sql:
+            self.row = CARDS.get(params[0])
+        elif "FROM fallbacks" in sql:
+            self.row = ("Out of scope, sorry.",)
+        elif "search_tsv @@" in sql:
+            self.rows = [(7, *CARDS[7])] if "version" in params["query"] and params["chapter"] in (None, 1) else []
+        else:
+            self.row = None
+
+    def fetchone(self):
+        return self.row
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConn:
+    def cursor(self):
+        return FakeCursor()
+
+
+@contextmanager
+def connect():
+    yield FakeConn()
+
+
+class FakeDeckCache:
+    def chapters(self):
+        return (1, 2)
+
+    def get(self, chapter):
+        return Deck([Card(7, *CARDS[7])]) if chapter == 1 else Deck()
+
+
+class FakeRetriever:
+    def __init__(self):
+        self.chapters = []
+
+    def search(self, question, k, chapter=None):
+        self.chapters.append(chapter)
+        return []
+
+
+class FakeSyllabus:
+    def answer(self, question):
+        if "prerequisites" in question:
+            return RoutedAnswer("prerequisites", "CSC 4350", "The prerequisites for CSC 4350 are: CSC 2720.")
+        return None
+
+
+class FakeChatStore:
+    def __init__(self):
+        self.messages = []
+
+    def append(self, conversation_id, message):
+        self.messages.append((conversation_id, message["role"], message["content"]))
+
+    def close(self):
+        pass
+
+
+def call(app, method, path, body=None):
+    """Run one request through the ASGI app; returns (status, body bytes)."""
+
+    async def run():
+        sent = []
+        payload = json.dumps(body).encode() if body is not None else b""
+        delivered = False
+
+        async def receive():
+            nonlocal delivered
+            if not delivered:
+                delivered = True
+                return {"type": "http.request", "body": payload, "more_body": False}
+            await asyncio.Event().wait()  # the client stays connected
+
+        async def send(message):
+            sent.append(message)
+
+        route, _, query = path.partition("?")
+        scope = {
+            "type": "http", "method": method, "path": route, "raw_path": route.encode(), "query_string": query.encode(),
+            "headers": [(b"content-type", b"application/json")], "http_version": "1.1", "scheme": "http",
+            "server": ("test", 80), "client": ("test", 1), "root_path": "",
+        }
+        await app(scope, receive, send)
+        status = next(m["status"] for m in sent if m["type"] == "http.response.start")
+        return status, b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+
+    return asyncio.run(run())
+
+
+def parse_sse(raw: bytes):
+    events = []
+    for block in raw.decode().strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+class TestAPI(unittest.TestCase):
+
+    def setUp(self):
+        server = FakeOpenAIServer(tokens_per_second=500).start()
+        self.addCleanup(server.stop)
+        self.server = server
+        gateway = LLMGateway(base_url=server.base_url, api_key="test")
+        self.addCleanup(gateway.close)
+        self.chat_store = FakeChatStore()
+        self.service = CourseHelperService(
+            connect=connect,
+            deck_cache=FakeDeckCache(),
+            retriever=FakeRetriever(),
+            response_cache=ResponseCache(),
+            llm_gateway=gateway,
+            conversation=ConversationContext(),
+            grader=Grader(),
+            syllabus_router=FakeSyllabus(),
+            scope_classifier=build_classifier(),
+            chat_store=self.chat_store,
+        )
+        self.app = create_app(lambda: self.service)
+        self.app.state.service = self.service
+
+    def test_flashcard_endpoints(self):
+        self.assertEqual(call(self.app, "GET", "/chapters"), (200, b'{"chapters":[1,2]}'))
+        status, body = call(self.app, "GET", "/chapters/1/flashcards")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)["cards"][0]["id"], 7)
+        self.assertEqual(json.loads(call(self.app, "GET", "/chapters/2/flashcards")[1])["cards"], [])
+
+    def test_flashcard_search(self):
+        status, body = call(self.app, "GET", "/flashcards/search?q=version+control")
+        self.assertEqual(status, 200)
+        self.assertEqual([c["id"] for c in json.loads(body)["cards"]], [7])
+        self.assertEqual(json.loads(call(self.app, "GET", "/flashcards/search?q=version&chapter=2")[1])["cards"], [])
+        self.assertEqual(call(self.app, "GET", "/flashcards/search?q=")[0], 400)
+        self.assertEqual(call(self.app, "GET", "/flashcards/search?q=uml&chapter=two")[0], 400)
+
+    def test_grade(self):
+        status, body = call(self.app, "POST", "/grade", {"card_id": 7, "answer": "a system for tracking changes in code over time"})
+        self.assertEqual(status, 200)
+        self.assertTrue(json.loads(body)["correct"])
+        self.assertEqual(call(self.app, "POST", "/grade", {"card_id": 99, "answer": "x"})[0], 404)
+        self.assertEqual(call(self.app, "POST", "/grade", {"card_id": "7"})[0], 400)
+
+    def test_chat_streams_llm_answers_and_caches_them(self):
+        conversation_id = "6f1c1c36-3d55-4c53-9a1e-4f0a4b6f2a10"
+        status, body = call(self.app, "POST", "/chat", {"question": "What is the waterfall model?", "conversation_id": conversation_id})
+        self.assertEqual(status, 200)
+        events = parse_sse(body)
+        self.assertEqual(events[0], ("meta", {"source": "llm"}))
+        deltas = [data["text"] for name, data in events if name == "delta"]
+        self.assertGreater(len(deltas), 1)
+        done = events[-1][1]
+        self.assertEqual(("".join(deltas), done["text"]), (DEFAULT_REPLY, DEFAULT_REPLY))
+        self.assertGreater(done["prompt_tokens"], 0)
+        self.assertEqual([m[1] for m in self.chat_store.messages], ["user", "assistant"])
+
+        events = parse_sse(call(self.app, "POST", "/chat", {"question": "What is the waterfall model?"})[1])
+        self.assertEqual(events[0], ("meta", {"source": "cache"}))
+        self.assertEqual(self.server.requests["/v1/chat/completions"], 1)
+
+        # Cached answers are kept per chapter.
+        events = parse_sse(call(self.app, "POST", "/chat", {"question": "What is the waterfall model?", "chapter": 2})[1])
+        self.assertEqual(events[0], ("meta", {"source": "llm"}))
+        self.assertEqual(self.service.retriever.chapters, [None, 2])  # retrieval is filtered too
+        self.assertEqual(call(self.app, "POST", "/chat", {"question": "hi", "chapter": "2"})[0], 400)
+
+    def test_chat_answers_without_the_llm(self):
+        events = parse_sse(call(self.app, "POST", "/chat", {"question": "What are the prerequisites for CSC 4350?"})[1])
+        self.assertEqual(events[0], ("meta", {"source": "syllabus"}))
+        events = parse_sse(call(self.app, "POST", "/chat", {"question": "Write my history essay"})[1])
+        self.assertEqual(events[-1][1]["text"], "Out of scope, sorry.")
+        self.assertEqual(self.server.requests["/v1/chat/completions"], 0)
+
+    def test_chat_returns_the_summary_updated_after_the_reply(self):
+        self.service.conversation = ConversationContext(lambda previous, turns: "notes", history_budget=60)
+        history = [{"role": "user", "content": "tell me about UML " * 10}, {"role": "assistant", "content": "UML is " * 10}] * 2
+        events = parse_sse(call(self.app, "POST", "/chat", {"question": "And sequence diagrams?", "history": history})[1])
+        self.assertEqual(events[0], ("meta", {"source": "llm"}))
+        summary = events[-1][1]["summary"]
+        self.assertEqual(summary["text"], "notes")
+        self.assertGreater(summary["covered"], 0)
+
+    def test_chat_validates_input(self):
+        self.assertEqual(call(self.app, "POST", "/chat", {"question": ""})[0], 400)
+        self.assertEqual(call(self.app, "POST", "/chat", {"question": "hi", "history": [{"role": "system"}]})[0], 400)
+        self.assertEqual(call(self.app, "POST", "/chat", {"question": "hi", "conversation_id": "nope"})[0], 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,6 @@
 import unittest
 import psycopg2
-from app import get_flashcards, get_fallback_message, get_chatbot_response, init_connection
+from service import get_flashcards, get_fallback_message, get_chatbot_response, init_connection
 
 
 class TestCourseHelperApp(unittest.TestCase):
@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import assets
+
+
+class TestAssets(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.static = Path(self.tmp.name) / "static"
+        patcher = mock.patch.multiple(assets, STATIC_DIR=self.static, _cache={})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_variant_is_built_once_and_served_by_url(self):
+        src = assets.APP_DIR / "assets" / "wood_background.png"
+        with mock.patch.object(assets, "build_variant", wraps=assets.build_variant) as build:
+            first = assets.asset_url(src, max_width=400)
+            second = assets.asset_url(src, max_width=400)
+        self.assertEqual(first, second)
+        self.assertEqual(build.call_count, 1)
+        self.assertTrue(first.startswith(assets.STATIC_URL + "/"))
+        out = self.static / first.rsplit("/", 1)[1]
+        self.assertLess(out.stat().st_size, src.stat().st_size)
+
+    def test_each_build_writes_its_own_temp_file(self):
+        src = assets.APP_DIR / "assets" / "textbook_frame.png"
+        temps = []
+        real = assets.tempfile.NamedTemporaryFile
+
+        def recording(*args, **kwargs):
+            f = real(*args, **kwargs)
+            temps.append(f.name)
+            return f
+
+        with mock.patch.object(assets.tempfile, "NamedTemporaryFile", recording):
+            first = assets.build_variant(src, 200)
+            first.unlink()
+            second = assets.build_variant(src, 200)
+        self.assertEqual(first, second)
+        self.assertEqual(len(set(temps)), 2)
+        self.assertEqual([p.name for p in self.static.iterdir()], [second.name])  # no temp files left
+
+    def test_changed_file_gets_new_variant(self):
+        src = Path(self.tmp.name) / "frame.png"
+        src.write_bytes((assets.APP_DIR / "assets" / "wood_background.png").read_bytes())
+        first = assets.asset_url(src)
+        with open(src, "ab") as f:
+            f.write(b"\0")
+        os.utime(src, ns=(0, 0))
+        self.assertNotEqual(first, assets.asset_url(src))
+
+
+if __name__ == "__main__":
+    unittest.main()
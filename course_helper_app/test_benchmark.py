@@ -0,0 +1,53 @@
+import unittest
+from types import SimpleNamespace
+
+from benchmark import QueryCounter, compare, percentile, rendered_bytes, summarize
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_percentiles(self):
+        samples = [float(i) for i in range(1, 101)]
+        self.assertEqual(percentile(samples, 50), 51.0)
+        self.assertEqual(percentile(samples, 99), 99.0)
+        self.assertIsNone(percentile([], 50))
+        stats = summarize([0.2, 0.1, 0.3])
+        self.assertEqual((stats["count"], stats["p50"], stats["max"]), (3, 0.2, 0.3))
+        self.assertEqual(summarize([]), {"count": 0})
+
+    def test_compare_reports_relative_change(self):
+        baseline = {"rerun_seconds": {"chat": {"p50": 0.2, "p95": 0.5}}}
+        current = {"rerun_seconds": {"chat": {"p50": 0.3, "p95": 0.5}, "quiz": {"p50": 0.1}}}
+        lines = compare(current, baseline)
+        self.assertEqual(lines, [
+            "rerun_seconds.chat.p50: 0.2 -> 0.3 (+50.0%)",
+            "rerun_seconds.chat.p95: 0.5 -> 0.5 (+0.0%)",
+        ])
+
+    def test_rendered_bytes_walks_the_tree(self):
+        leaf = SimpleNamespace(proto=SimpleNamespace(ByteSize=lambda: 40), children={})
+        block = SimpleNamespace(proto=None, children={0: leaf, 1: leaf})
+        self.assertEqual(rendered_bytes(SimpleNamespace(_tree=SimpleNamespace(children={0: block}))), 80)
+
+    def test_query_counter_cursor(self):
+        executed = []
+
+        class FakeCursor:
+            def execute(self, query, vars=None):
+                executed.append(query)
+
+            def executemany(self, query, vars_list):
+                executed.append(query)
+
+        counter = QueryCounter()
+        cur = counter.cursor_factory(FakeCursor)()
+        cur.execute("SELECT 1;")
+        cur.execute("SELECT %s;", (2,))
+        cur.executemany("INSERT INTO t VALUES (%s);", [(1,), (2,)])
+        self.assertEqual(executed, ["SELECT 1;", "SELECT %s;", "INSERT INTO t VALUES (%s);"])
+        self.assertEqual(counter.count, 3)
+        self.assertTrue(callable(counter.cursor_factory().execute))
+
+
+if __name__ == "__main__":
+    unittest.main()
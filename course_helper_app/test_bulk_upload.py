@@ -0,0 +1,200 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+from bulk_upload import BulkUploader, expand_paths
+from util import file_hash
+from vector_manifest import VectorManifest
+
+
+class ClientError(Exception):
+    """Stands in for a 4xx from the API."""
+
+    status_code = 400
+
+
+class FakeClient:
+    """Records uploads; each upload takes ``delay`` seconds and the first ``flaky`` fail."""
+
+    def __init__(self, delay=0.0, flaky=0, error=ConnectionError("reset"), attach_error=None, poll_error=None,
+                 failing=()):
+        self.delay = delay
+        self.flaky = flaky
+        self.error = error
+        self.attach_error = attach_error
+        self.poll_error = poll_error
+        self.failing = set(failing)  # file ids the store fails to index
+        self.attach_calls = 0
+        self.uploads = []
+        self.batches = []
+        self.deleted = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self.files = SimpleNamespace(create=self._create_file, delete=self.deleted.append)
+        self.vector_stores = SimpleNamespace(file_batches=SimpleNamespace(
+            create=self._attach, poll=self._poll, list_files=self._list_files,
+        ))
+
+    def _create_file(self, file, purpose):
+        with self.lock:
+            if self.flaky:
+                self.flaky -= 1
+                raise self.error
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            name = os.path.basename(file.name)
+        time.sleep(self.delay)
+        with self.lock:
+            self.in_flight -= 1
+            self.uploads.append(name)
+            return SimpleNamespace(id=f"file-{len(self.uploads)}")
+
+    def _attach(self, vector_store_id, files):
+        self.attach_calls += 1
+        if self.attach_error:
+            raise self.attach_error
+        files = list(files)
+        self.batches.append(files)
+        return SimpleNamespace(id=f"batch-{len(self.batches)}", status="in_progress")
+
+    def _poll(self, batch_id, vector_store_id):
+        if self.poll_error:
+            raise self.poll_error
+        statuses = [f.status for f in self._list_files(batch_id, vector_store_id)]
+        return SimpleNamespace(
+            id=batch_id, status="completed",
+            file_counts=SimpleNamespace(failed=statuses.count("failed"), completed=statuses.count("completed")),
+        )
+
+    def _list_files(self, batch_id, vector_store_id, filter=None):
+        files = self.batches[int(batch_id.split("-")[1]) - 1]
+        listed = [
+            SimpleNamespace(id=f["file_id"], status="failed" if f["file_id"] in self.failing else "completed")
+            for f in files
+        ]
+        return [f for f in listed if filter in (None, f.status)]
+
+
+class TestBulkUpload(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        slides = self.root / "slides"
+        (slides / "week1").mkdir(parents=True)
+        for i in range(6):
+            (slides / f"week1/lecture{i}.pdf").write_bytes(f"lecture {i}".encode())
+        (slides / "notes.md").write_text("notes")
+        (slides / "thumbs.db").write_bytes(b"skip me")
+        (slides / ".hidden.pdf").write_bytes(b"skip me too")
+        self.manifest = VectorManifest(self.root / "manifest.sqlite3")
+        self.addCleanup(self.manifest.close)
+
+    def uploader(self, client, **kwargs):
+        return BulkUploader(client, self.manifest, "vs_1", sleep=lambda s: None, **kwargs)
+
+    def test_expand_paths(self):
+        slides = self.root / "slides"
+        from_dir = expand_paths(str(slides))
+        self.assertEqual(len(from_dir), 7)
+        self.assertNotIn("thumbs.db", {p.name for p in from_dir})
+        from_glob = expand_paths(f"{slides}/week1/lecture[0-2].pdf {slides}/notes.md")
+        self.assertEqual([p.name for p in from_glob], ["lecture0.pdf", "lecture1.pdf", "lecture2.pdf", "notes.md"])
+        self.assertEqual(len(expand_paths(f"{slides} {slides}/notes.md")), 7)
+        self.assertEqual(expand_paths(str(self.root / "missing.pdf")), [])
+
+    def test_uploads_run_in_parallel_and_attach_in_batches(self):
+        client = FakeClient(delay=0.05)
+        stats = self.uploader(client, concurrency=4, batch_size=3).run(expand_paths(str(self.root / "slides")))
+        self.assertEqual((stats.uploaded, stats.attached, stats.failed), (7, 7, 0))
+        self.assertEqual(client.max_in_flight, 4)
+        self.assertEqual([len(b) for b in client.batches], [3, 3, 1])
+        attrs = {f["attributes"]["filename"]: f["attributes"] for b in client.batches for f in b}
+        self.assertEqual(set(attrs["notes.md"]), {"sha256", "filename"})
+        self.assertIn("files/s", stats.summary())
+
+    def test_chapter_attribute_from_file_name(self):
+        path = self.root / "Chapter_05_design.pdf"
+        path.write_bytes(b"design")
+        client = FakeClient()
+        self.uploader(client).run([path])
+        self.assertEqual(client.batches[0][0]["attributes"]["chapter"], 5)
+
+    def test_files_already_in_store_are_skipped(self):
+        paths = expand_paths(str(self.root / "slides"))
+        self.uploader(FakeClient()).run(paths)
+        self.assertEqual(len(self.manifest.known_hashes("vs_1")), 7)
+
+        copy = self.root / "copy_of_lecture0.pdf"
+        copy.write_bytes((self.root / "slides/week1/lecture0.pdf").read_bytes())
+        client = FakeClient()
+        stats = self.uploader(client).run(paths + [copy])
+        self.assertEqual(stats.skipped, 8)
+        self.assertEqual(client.uploads, [])
+
+    def test_duplicates_within_one_run_upload_once(self):
+        a, b = self.root / "a.txt", self.root / "b.txt"
+        a.write_text("same")
+        b.write_text("same")
+        client = FakeClient()
+        stats = self.uploader(client).run([a, b])
+        self.assertEqual((stats.uploaded, stats.skipped), (1, 1))
+        self.assertEqual(self.manifest.known_hashes("vs_1"), {file_hash(a)})
+
+    def test_transient_errors_are_retried(self):
+        client = FakeClient(flaky=2)
+        stats = self.uploader(client, concurrency=1).run(expand_paths(str(self.root / "slides/notes.md")))
+        self.assertEqual((stats.uploaded, stats.failed), (1, 0))
+
+    def test_persistent_errors_are_counted(self):
+        client = FakeClient(flaky=100)
+        stats = self.uploader(client, attempts=2).run(expand_paths(str(self.root / "slides")))
+        self.assertEqual((stats.uploaded, stats.failed), (0, 7))
+        self.assertEqual(client.batches, [])
+
+    def test_client_errors_are_not_retried(self):
+        client = FakeClient(flaky=1, error=ClientError("unsupported file type"))
+        stats = self.uploader(client, concurrency=1).run(expand_paths(str(self.root / "slides/notes.md")))
+        self.assertEqual((stats.uploaded, stats.failed), (0, 1))
+        self.assertEqual(client.flaky, 0)
+
+    def test_a_copy_is_uploaded_when_the_first_upload_fails(self):
+        a, b = self.root / "a.txt", self.root / "b.txt"
+        a.write_text("same")
+        b.write_text("same")
+        client = FakeClient(flaky=1)
+        stats = self.uploader(client, concurrency=2, attempts=1).run([a, b])
+        self.assertEqual((stats.uploaded, stats.failed, stats.skipped), (1, 1, 0))
+        self.assertEqual(self.manifest.known_hashes("vs_1"), {file_hash(a)})
+
+    def test_unattached_uploads_are_deleted(self):
+        client = FakeClient(attach_error=ConnectionError("reset"))
+        stats = self.uploader(client, batch_size=10).run(expand_paths(str(self.root / "slides")))
+        self.assertEqual((stats.uploaded, stats.attached, stats.failed), (7, 0, 7))
+        self.assertEqual(client.attach_calls, 1)  # a retry could attach the batch twice
+        self.assertEqual(sorted(client.deleted), sorted(f"file-{i}" for i in range(1, 8)))
+        self.assertEqual(self.manifest.known_hashes("vs_1"), set())
+
+    def test_uploads_are_kept_when_the_batch_outcome_is_unknown(self):
+        client = FakeClient(poll_error=ConnectionError("reset"))
+        stats = self.uploader(client, batch_size=10).run(expand_paths(str(self.root / "slides")))
+        self.assertEqual((stats.attached, stats.unconfirmed, stats.failed), (0, 7, 0))
+        self.assertEqual(client.deleted, [])  # the batch was created; the next /list sync records it
+        self.assertIn("7 unconfirmed", stats.summary())
+
+    def test_files_the_store_fails_to_index_are_deleted(self):
+        client = FakeClient(failing={"file-2", "file-5"})
+        stats = self.uploader(client, concurrency=1, batch_size=10).run(expand_paths(str(self.root / "slides")))
+        self.assertEqual((stats.attached, stats.failed), (5, 2))
+        self.assertEqual(sorted(client.deleted), ["file-2", "file-5"])
+        self.assertEqual(len(self.manifest.known_hashes("vs_1")), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import threading
+import unittest
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from unittest import mock
+
+import chat_store
+from chat_store import ChatStore
+from test_retrieval import FakeConnection
+
+CONVERSATION = "3f2b8c4e-3c1a-4c55-9a57-0d8f4a1e9b10"
+
+
+class RecordingConnect:
+    """``connect`` stand-in counting checkouts and recording execute_values calls."""
+
+    def __init__(self, rows=(), fail=0):
+        self.conn = FakeConnection(rows)
+        self.checkouts = 0
+        self.batches = []
+        self.fail = fail
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def __call__(self):
+        with self.lock:
+            self.checkouts += 1
+            if self.fail:
+                self.fail -= 1
+                raise RuntimeError("database down")
+        yield self.conn
+
+    def execute_values(self, cur, sql, rows, **kwargs):
+        self.batches.append((sql, list(rows)))
+
+
+def message(role, content, minute=0, **extra):
+    return {"role": role, "content": content, "ts": f"2025-10-01T14:{minute:02d}:00-04:00", **extra}
+
+
+class TestChatStore(unittest.TestCase):
+
+    def make(self, connect, **kwargs):
+        patcher = mock.patch.object(chat_store, "execute_values", connect.execute_values)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        store = ChatStore(connect, **kwargs)
+        self.addCleanup(store.close)
+        return store
+
+    def test_appends_are_written_in_one_batch(self):
+        connect = RecordingConnect()
+        store = self.make(connect, flush_interval=0.2)
+        for i in range(10):
+            store.append(CONVERSATION, message("user", f"q{i}", i))
+        self.assertEqual(connect.checkouts, 0)  # nothing written on the caller's thread
+        self.assertTrue(store.flush(2))
+        self.assertEqual(connect.checkouts, 1)
+        (conv_sql, conversations), (msg_sql, rows) = connect.batches
+        self.assertIn("INSERT INTO conversations", conv_sql)
+        self.assertEqual([c[0] for c in conversations], [CONVERSATION])
+        self.assertEqual(conversations[0][2].minute, 9)  # updated_at is the newest message
+        self.assertEqual([r[2] for r in rows], [f"q{i}" for i in range(10)])
+        self.assertEqual(store.metrics()["written"], 10)
+
+    def test_batches_are_capped(self):
+        connect = RecordingConnect()
+        store = self.make(connect, batch_size=4, flush_interval=0.2)
+        for i in range(10):
+            store.append(CONVERSATION, message("user", f"q{i}"))
+        store.flush(2)
+        sizes = [len(rows) for sql, rows in connect.batches if "INSERT INTO messages" in sql]
+        self.assertEqual(sizes, [4, 4, 2])
+
+    def test_failed_batch_is_retried(self):
+        connect = RecordingConnect(fail=1)
+        store = self.make(connect, flush_interval=0.01, backoff=0.01)
+        store.append(CONVERSATION, message("assistant", "a", ttft=0.2, prompt_tokens=120))
+        store.flush(2)
+        self.assertEqual(store.stats["written"], 1)
+        self.assertEqual(store.stats.get("dropped", 0), 0)
+        row = connect.batches[-1][1][0]
+        self.assertEqual(row[4:], (0.2, 120))
+
+    def test_pages_walk_backwards_by_id(self):
+        created = datetime(2025, 10, 1, 18, 0, tzinfo=timezone.utc)
+        rows = [(i, "user", f"q{i}", created, None, None) for i in (30, 29, 28, 27)]
+        connect = RecordingConnect(rows)
+        store = self.make(connect)
+
+        page = store.load_page(CONVERSATION, limit=3)
+        self.assertTrue(page.has_more)
+        self.assertEqual([m.content for m in page.messages], ["q28", "q29", "q30"])
+        self.assertEqual(page.cursor, 28)
+        sql, params = connect.conn.cur.executed[-1]
+        self.assertNotIn("id <", sql)
+        self.assertEqual(params, [CONVERSATION, 4])
+
+        store.load_page(CONVERSATION, before_id=page.cursor, limit=3)
+        sql, params = connect.conn.cur.executed[-1]
+        self.assertIn("id < %s", sql)
+        self.assertEqual(params, [CONVERSATION, 28, 4])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+import threading
+import unittest
+
+from conversation import ConversationContext, RollingSummary, make_llm_summarizer, message_tokens
+from retrieval import build_messages
+
+
+def turns(n, words=40):
+    history = []
+    for i in range(n):
+        history.append({"role": "user", "content": f"question {i} " + "word " * words})
+        history.append({"role": "assistant", "content": f"answer {i} " + "word " * words, "html": "<div/>"})
+    return history
+
+
+class FakeSummarizer:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, previous, folded):
+        self.calls.append(folded)
+        return (previous + " " if previous else "") + f"{len(folded)} turns"
+
+
+class TestConversationContext(unittest.TestCase):
+
+    def test_short_history_is_sent_verbatim(self):
+        summarize = FakeSummarizer()
+        context = ConversationContext(summarize, history_budget=2000)
+        history = turns(2)
+        result = context.build(history, build_messages("explain that again", []), RollingSummary())
+        self.assertEqual(summarize.calls, [])
+        self.assertEqual(result.history_turns, 4)
+        self.assertEqual(result.messages[0]["role"], "system")
+        self.assertEqual(result.messages[-1]["content"], "explain that again")
+        self.assertEqual([m["content"] for m in result.messages[1:-1]], [m["content"] for m in history])
+        self.assertNotIn("html", result.messages[1])
+        self.assertEqual(result.prompt_tokens, message_tokens(result.messages))
+
+    def test_prompt_tokens_stay_bounded(self):
+        context = ConversationContext(FakeSummarizer(), history_budget=300)
+        summary = RollingSummary()
+        history = []
+        sizes = []
+        for i in range(30):
+            question = build_messages(f"question {i}", [])
+            result = context.build(history, question, summary)
+            sizes.append(result.prompt_tokens)
+            if result.fold:
+                context.fold(result.fold)
+            history += turns(1)
+        self.assertLess(max(sizes), 300 + 100)
+        self.assertGreater(summary.covered, 0)
+
+    def test_summary_is_reused_until_stale(self):
+        summarize = FakeSummarizer()
+        context = ConversationContext(summarize, history_budget=300)
+        summary = RollingSummary()
+        history = turns(4)
+        first = context.build(history, build_messages("q", []), summary)
+        self.assertEqual(summarize.calls, [])  # not while building the prompt
+        self.assertLessEqual(first.prompt_tokens, 300)
+        self.assertTrue(context.fold(first.fold))
+        self.assertEqual(summary.covered, first.fold.start + len(first.fold.turns))
+
+        again = context.build(history + turns(1, words=5), build_messages("q", []), summary)
+        self.assertIsNone(again.fold)
+        self.assertEqual(len(summarize.calls), 1)
+        self.assertIn("Summary of the earlier conversation", again.messages[1]["content"])
+
+    def test_rolling_summary_only_sees_new_turns(self):
+        summarize = FakeSummarizer()
+        context = ConversationContext(summarize, history_budget=300)
+        summary = RollingSummary()
+        history = turns(4)
+        context.fold(context.build(history, build_messages("q", []), summary).fold)
+        covered = summary.covered
+        history += turns(4)
+        context.fold(context.build(history, build_messages("q", []), summary).fold)
+        self.assertEqual(len(summarize.calls), 2)
+        self.assertEqual(len(summarize.calls[1]), summary.covered - covered)
+
+    def test_failed_summary_drops_old_turns(self):
+        def broken(previous, folded):
+            raise RuntimeError("upstream down")
+
+        context = ConversationContext(broken, history_budget=300)
+        summary = RollingSummary()
+        result = context.build(turns(6), build_messages("q", []), summary)
+        self.assertFalse(context.fold(result.fold))
+        self.assertEqual(summary.text, "")
+        self.assertGreater(summary.covered, 0)
+        self.assertLessEqual(result.prompt_tokens, 300)
+
+    def test_fold_later_runs_in_the_background(self):
+        release = threading.Event()
+
+        def slow(previous, folded):
+            release.wait(5)
+            return "notes"
+
+        context = ConversationContext(slow, history_budget=300)
+        summary = RollingSummary()
+        history = turns(6)
+        first = context.build(history, build_messages("q", []), summary)
+        pending = context.fold_later(first.fold)
+        # The next question uses the previous summary and starts no second fold.
+        second = context.build(history + turns(1), build_messages("q", []), summary)
+        self.assertIsNone(second.fold)
+        self.assertEqual(summary, RollingSummary())
+        release.set()
+        pending.result(5)
+        self.assertEqual(summary.text, "notes")
+        self.assertIsNone(context.fold_later(None))
+
+    def test_turns_after_a_pending_fold_are_kept(self):
+        context = ConversationContext(FakeSummarizer(), history_budget=300)
+        summary = RollingSummary()
+        history = turns(6)
+        first = context.build(history, build_messages("q", []), summary)
+        folded = first.fold.start + len(first.fold.turns)
+        # Two more questions before the fold is applied: neither drops the
+        # turns the pending fold does not cover.
+        for extra in (1, 3):
+            later = history + turns(extra)
+            result = context.build(later, build_messages("q", []), summary)
+            self.assertIsNone(result.fold)
+            self.assertGreaterEqual(result.history_turns, len(later) - folded)
+            sent = [m["content"] for m in result.messages[1:-1]]
+            self.assertEqual(sent, [m["content"] for m in later[len(later) - result.history_turns:]])
+        context.fold(first.fold)
+        self.assertIsNotNone(context.build(later, build_messages("q", []), summary).fold)
+
+    def test_cleared_history_resets_summary(self):
+        summary = RollingSummary("old notes", covered=10)
+        result = ConversationContext(FakeSummarizer()).build([], build_messages("q", []), summary)
+        self.assertEqual(summary, RollingSummary())
+        self.assertEqual(len(result.messages), 2)
+
+    def test_llm_summarizer_prompt(self):
+        sent = []
+
+        def complete(messages):
+            sent.append(messages)
+            return " notes \n"
+
+        summarize = make_llm_summarizer(complete, max_tokens=100)
+        self.assertEqual(summarize("earlier", [{"role": "user", "content": "What is UML?"}]), "notes")
+        prompt = sent[0][-1]["content"]
+        self.assertIn("earlier", prompt)
+        self.assertIn("User: What is UML?", prompt)
+        self.assertIn("100 tokens", prompt)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import threading
+import unittest
+from unittest import mock
+
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+import database
+
+
+class FakeConnection:
+    def __init__(self, alive=True):
+        self.closed = 0
+        self.alive = alive
+        self.rollbacks = 0
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql, params=None):
+                if not conn.alive:
+                    raise psycopg2.OperationalError("server closed the connection")
+
+        return Cursor()
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def get_transaction_status(self):
+        return TRANSACTION_STATUS_IDLE
+
+
+class FakePgPool:
+    def __init__(self, minconn, maxconn, **dsn):
+        self.idle = []
+        self.created = []
+
+    def getconn(self):
+        if self.idle:
+            return self.idle.pop()
+        conn = FakeConnection()
+        self.created.append(conn)
+        return conn
+
+    def putconn(self, conn, close=False):
+        if close:
+            conn.closed = 1
+        else:
+            self.idle.append(conn)
+
+    def closeall(self):
+        pass
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(database.pg_pool, "ThreadedConnectionPool", FakePgPool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_checkout_times_out_when_exhausted(self):
+        pool = database.ConnectionPool(maxconn=1, timeout=0.05)
+        with pool.connection():
+            self.assertEqual(pool.metrics()["in_use"], 1)
+            with self.assertRaises(database.PoolTimeout):
+                with pool.connection():
+                    pass
+        metrics = pool.metrics()
+        self.assertEqual((metrics["in_use"], metrics["timeouts"]), (0, 1))
+        self.assertGreaterEqual(metrics["wait_seconds_max"], 0.05)
+
+    def test_dead_connection_is_replaced_on_checkout(self):
+        pool = database.ConnectionPool(maxconn=2, validate_after=0)
+        with pool.connection() as first:
+            pass
+        first.alive = False
+        with pool.connection() as second:
+            self.assertIsNot(second, first)
+        self.assertTrue(first.closed)
+        self.assertEqual(pool.metrics()["reconnects"], 1)
+
+    def test_operational_error_discards_connection(self):
+        pool = database.ConnectionPool(maxconn=2)
+        with self.assertRaises(psycopg2.OperationalError):
+            with pool.connection() as conn:
+                raise psycopg2.OperationalError("boom")
+        self.assertTrue(conn.closed)
+        with pool.connection() as again:
+            self.assertIsNot(again, conn)
+
+    def test_waiters_get_connection_when_released(self):
+        pool = database.ConnectionPool(maxconn=1, timeout=2)
+        got = []
+
+        def wait_for_connection():
+            with pool.connection() as conn:
+                got.append(conn)
+
+        with pool.connection():
+            worker = threading.Thread(target=wait_for_connection)
+            worker.start()
+            worker.join(0.05)
+            self.assertEqual(got, [])
+        worker.join(1)
+        self.assertEqual(len(got), 1)
+        with pool.connection() as conn:  # returned by the worker
+            self.assertIs(conn, got[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+
+from deck_cache import Card, Deck, DeckCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestDeckCache(unittest.TestCase):
+
+    def setUp(self):
+        self.loads = []
+        self.clock = FakeClock()
+        self.cache = DeckCache(self.load, ttl=60, clock=self.clock, chapters_loader=self.load_chapters)
+
+    def load(self, chapter):
+        self.loads.append(chapter)
+        return Deck([Card(10, "Q1?", "A1"), Card(12, "Q2?", "A2")])
+
+    def load_chapters(self):
+        self.loads.append("chapters")
+        return (1, 2, 5)
+
+    def test_chapter_list_is_cached_until_any_change(self):
+        self.assertEqual(self.cache.chapters(), (1, 2, 5))
+        self.cache.chapters()
+        self.cache.get(1)
+        self.assertEqual(self.loads, ["chapters", 1])
+        self.cache.handle_notification("7")  # a card was added to a new chapter
+        self.cache.chapters()
+        self.cache.get(1)
+        self.assertEqual(self.loads, ["chapters", 1, "chapters"])
+        self.assertEqual(self.cache.stats()["decks"], 1)
+
+    def test_navigation_hits_the_cache(self):
+        for _ in range(5):
+            self.cache.get(1)
+        self.assertEqual(self.loads, [1])
+        self.assertEqual(self.cache.stats()["hits"], 4)
+
+    def test_ttl_and_notifications_invalidate(self):
+        self.cache.get(1)
+        self.cache.get(2)
+        self.cache.handle_notification("1")
+        self.cache.get(1)
+        self.cache.get(2)
+        self.assertEqual(self.loads, [1, 2, 1])
+        self.cache.handle_notification("")
+        self.cache.get(2)
+        self.clock.now = 61
+        self.cache.get(2)
+        self.assertEqual(self.loads, [1, 2, 1, 2, 2])
+
+    def test_invalidation_during_load_is_not_cached(self):
+        def racing_load(chapter):
+            self.cache.invalidate(chapter)
+            return Deck([Card(1, "old?", "old")])
+
+        self.cache.loader = racing_load
+        self.cache.get(3)
+        self.cache.loader = self.load
+        self.assertEqual(self.cache.get(3)[0].id, 10)
+
+    def test_position_follows_card_id(self):
+        deck = Deck([Card(10, "Q1?", "A1"), Card(12, "Q2?", "A2")])
+        edited = Deck([Card(5, "Q0?", "A0")] + list(deck))
+        self.assertEqual(deck.position(12), 1)
+        self.assertEqual(edited.position(12), 2)
+        self.assertEqual(edited.position(99, fallback=7), 2)
+        self.assertEqual(Deck().position(12), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
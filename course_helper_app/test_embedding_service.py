@@ -0,0 +1,156 @@
+import os
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+from embedding_service import EmbeddingService, VectorCache, VectorStore, text_key
+from embeddings import HashEmbedder
+
+
+class RecordingEmbedder(HashEmbedder):
+    """HashEmbedder recording the size of every embed call."""
+
+    def __init__(self, dim=32, fail=False):
+        super().__init__(dim)
+        self.calls = []
+        self.fail = fail
+
+    def embed(self, texts):
+        self.calls.append(list(texts))
+        if self.fail:
+            raise RuntimeError("rate limited")
+        return super().embed(texts)
+
+
+class TestEmbeddingService(unittest.TestCase):
+
+    def make(self, embedder, **kwargs):
+        service = EmbeddingService(embedder, **kwargs)
+        self.addCleanup(service.close)
+        return service
+
+    def test_concurrent_requests_share_one_batch(self):
+        embedder = RecordingEmbedder()
+        service = self.make(embedder, max_batch=64, max_wait=0.2)
+        texts = [f"question {i % 10}" for i in range(30)]
+        results = [None] * len(texts)
+        start = threading.Barrier(len(texts))
+
+        def ask(i):
+            start.wait()
+            results[i] = service.embed_one(texts[i])
+
+        threads = [threading.Thread(target=ask, args=(i,)) for i in range(len(texts))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(embedder.calls), 1)
+        self.assertEqual(sorted(embedder.calls[0]), sorted(set(texts)))  # duplicates embedded once
+        for text, vector in zip(texts, results):
+            np.testing.assert_allclose(vector, HashEmbedder(32).embed_one(text), rtol=1e-6)
+
+        stats = service.stats()
+        self.assertEqual((stats["batches"], stats["batch_sizes"]), (1, {10: 1}))
+        self.assertEqual(stats["requests"]["miss"], 10)
+
+    def test_batches_are_capped_and_cached(self):
+        embedder = RecordingEmbedder()
+        service = self.make(embedder, max_batch=4, max_wait=0.05)
+        texts = [f"text {i}" for i in range(10)]
+        first = service.embed(texts)
+        self.assertEqual([len(c) for c in embedder.calls], [4, 4, 2])
+        self.assertEqual(service.embed(texts), first)
+        self.assertEqual(len(embedder.calls), 3)
+        self.assertEqual(service.stats()["hit_rate"], 0.5)
+        self.assertEqual(service.embed([]), [])
+
+    def test_errors_reach_every_caller_in_the_batch(self):
+        service = self.make(RecordingEmbedder(fail=True), max_wait=0.01)
+        with self.assertLogs("embedding_service", "WARNING"), self.assertRaises(RuntimeError):
+            service.embed(["a", "b"])
+        service.embedder.fail = False
+        self.assertEqual(len(service.embed(["a"])[0]), 32)  # failures are not cached
+
+    def test_malformed_results_fail_the_batch(self):
+        embedder = RecordingEmbedder()
+        service = self.make(embedder, max_wait=0.01)
+        for wrong in (lambda texts: [[0.0] * 32], lambda texts: [[0.0] * 8 for _ in texts]):
+            embedder.embed = wrong
+            with self.assertLogs("embedding_service", "WARNING"), self.assertRaises(ValueError):
+                service.embed(["a", "b"])
+        self.assertEqual(len(service.cache), 0)
+
+    def test_cache_errors_fail_the_batch_instead_of_hanging(self):
+        service = self.make(RecordingEmbedder(), max_wait=0.01, timeout=5)
+        service.cache.put = lambda key, vector: (_ for _ in ()).throw(MemoryError("full"))
+        with self.assertLogs("embedding_service", "WARNING"), self.assertRaises(MemoryError):
+            service.embed(["a"])
+
+    def test_callers_stop_waiting_after_the_timeout(self):
+        release = threading.Event()
+        embedder = RecordingEmbedder()
+        embedder.embed = lambda texts: release.wait(5) and HashEmbedder(32).embed(texts)
+        service = self.make(embedder, max_wait=0.01, timeout=0.05)
+        with self.assertRaises(TimeoutError):
+            service.embed(["a"])
+        release.set()
+
+    def test_lru_evicts_the_least_recently_used(self):
+        cache = VectorCache(dim=2, capacity=2)
+        cache.put(b"a", [1, 0])
+        cache.put(b"b", [0, 1])
+        cache.get(b"a")
+        cache.put(b"c", [1, 1])
+        self.assertIsNone(cache.get(b"b"))
+        self.assertEqual(cache.get(b"a").tolist(), [1.0, 0.0])
+        self.assertEqual(cache.get(b"c").dtype, np.float32)
+
+    def test_store_persists_across_services(self):
+        path = os.path.join(tempfile.mkdtemp(), "vectors.f32")
+        first = RecordingEmbedder()
+        self.make(first, store=VectorStore(path, dim=32, capacity=64)).embed(["uml", "scrum"])
+        self.make(first, store=VectorStore(path, dim=32, capacity=64)).close()  # flushes the store
+
+        second = RecordingEmbedder()
+        service = self.make(second, store=VectorStore(path, dim=32, capacity=64))
+        self.assertEqual(service.embed_one("uml"), first.embed(["uml"])[0])
+        self.assertEqual(second.calls, [])
+        self.assertEqual(service.stats()["requests"], {"disk": 1})
+
+    def test_store_probes_and_overwrites_when_full(self):
+        store = VectorStore(os.path.join(tempfile.mkdtemp(), "v.f32"), dim=2, capacity=4, probes=2)
+        keys = [text_key("m", str(i)) for i in range(12)]
+        for i, key in enumerate(keys):
+            store.put(key, [i, i])
+        self.assertEqual(store.get(keys[-1]).tolist(), [11.0, 11.0])
+        found = [store.get(k) for k in keys]
+        self.assertLessEqual(sum(v is not None for v in found), 4)
+        for i, vector in enumerate(found):
+            if vector is not None:
+                self.assertEqual(vector.tolist(), [i, i])
+
+
+    def test_store_reader_misses_a_slot_rewritten_while_it_reads(self):
+        path = os.path.join(tempfile.mkdtemp(), "v.f32")
+        writer = VectorStore(path, dim=2, capacity=1, probes=1)
+        reader = VectorStore(path, dim=2, capacity=1, probes=1)  # e.g. another process
+        old, new = text_key("m", "old"), text_key("m", "new")
+        writer.put(old, [1, 1])
+        vectors = reader._vectors
+
+        class RacingRows:
+            def __getitem__(self, row):
+                writer.put(new, [2, 2])  # lands while the reader copies the row
+                return vectors[row]
+
+        reader._vectors = RacingRows()
+        self.assertIsNone(reader.get(old))
+        reader._vectors = vectors
+        self.assertEqual(reader.get(new).tolist(), [2.0, 2.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+
+from grading import Grader, Verdict, keyword_recall, normalize_answer, parse_llm_verdict
+
+ANSWER = "A system for tracking changes in code over time."
+
+
+class TestGrading(unittest.TestCase):
+
+    def setUp(self):
+        self.llm_calls = []
+
+        def llm_grade(question, answer, user_answer, rubric=None):
+            self.llm_calls.append(user_answer)
+            return Verdict(True, "llm", 1.0, "Correct. Good.")
+
+        self.grader = Grader(llm_grade=llm_grade)
+
+    def test_normalized_exact_match(self):
+        self.assertEqual(normalize_answer("  The System, for tracking!"), "system for tracking")
+        verdict = self.grader.grade("What is version control?", ANSWER, "a system for tracking changes in code over time")
+        self.assertEqual((verdict.correct, verdict.method), (True, "exact"))
+
+    def test_keyword_overlap_accepts_and_rejects(self):
+        good = self.grader.grade("Q", ANSWER, "system that tracks code changes over time")
+        bad = self.grader.grade("Q", ANSWER, "a kind of diagram")
+        self.assertEqual((good.correct, good.method), (True, "keyword"))
+        self.assertEqual((bad.correct, bad.method), (False, "keyword"))
+        self.assertEqual(self.llm_calls, [])
+
+    def test_negated_answers_are_not_accepted_locally(self):
+        for user_answer in ("It is not a system for tracking changes in code over time",
+                            "A system that doesn't track code changes over time"):
+            verdict = self.grader.grade("Q", ANSWER, user_answer)
+            self.assertEqual(verdict.method, "llm")
+        self.assertFalse(Grader().grade("Q", ANSWER, "It is not a system for tracking changes in code over time").correct)
+        vectors = {ANSWER: [1.0, 0.0], "never a system for tracking code changes over time": [0.99, 0.1]}
+        self.assertIsNone(Grader(embed=vectors.__getitem__).grade_locally(
+            "Q", ANSWER, "never a system for tracking code changes over time"
+        ))
+
+    def test_padded_answers_are_not_accepted_locally(self):
+        padded = ("A system for tracking changes in code over time, a compiler, a database server, "
+                  "a requirements diagram and a deployment pipeline")
+        self.assertEqual(self.grader.grade("Q", ANSWER, padded).method, "llm")
+        self.assertEqual(self.llm_calls, [padded])
+
+    def test_ambiguous_answer_escalates_to_llm(self):
+        verdict = self.grader.grade("Q", ANSWER, "it keeps code history")
+        self.assertEqual(verdict.method, "llm")
+        self.assertEqual(self.llm_calls, ["it keeps code history"])
+
+    def test_embedding_tier(self):
+        vectors = {ANSWER: [1.0, 0.0], "git, basically": [0.95, 0.1], "unrelated": [0.0, 1.0]}
+        grader = Grader(embed=vectors.__getitem__)
+        self.assertEqual(grader.grade("Q", ANSWER, "git, basically").method, "embedding")
+        self.assertFalse(grader.grade("Q", ANSWER, "unrelated").correct)
+
+    def test_keyword_recall(self):
+        self.assertEqual(keyword_recall(ANSWER, ANSWER), 1.0)
+        self.assertEqual(keyword_recall("", "anything"), 0.0)
+
+    def test_llm_reply_is_structured(self):
+        verdict = parse_llm_verdict('{"correct": false, "feedback": "Close, but not quite."}')
+        self.assertEqual((verdict.correct, verdict.feedback), (False, "Close, but not quite."))
+        self.assertTrue(parse_llm_verdict("Correct, not incorrect.").correct)
+        self.assertFalse(parse_llm_verdict('{"correct": "false", "feedback": "Not yet."}').correct)
+        self.assertTrue(parse_llm_verdict('{"correct": "True"}').correct)
+        unclear = parse_llm_verdict('{"correct": "no", "feedback": "Not yet."}')
+        self.assertEqual((unclear.correct, unclear.confidence), (False, 0.5))
+        self.assertEqual(parse_llm_verdict('{"correct": 1}').confidence, 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
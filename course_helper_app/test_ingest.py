@@ -0,0 +1,181 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import ingest
+from embeddings import HashEmbedder
+from ingest import Ingestor, chunk_hash, chunk_text, extract_text, guess_chapter, iter_source_files
+
+
+class FakeDB:
+    """Just enough of Postgres for the statements ``Ingestor`` runs."""
+
+    def __init__(self):
+        self.documents = {}  # source -> [file_hash, size, mtime_ns, chapter]
+        self.chunks = []  # [source, chapter, content_hash, deleted]
+
+    def cursor(self):
+        return FakeDBCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def live(self):
+        return sorted((c[0], c[1], c[2]) for c in self.chunks if not c[3])
+
+
+class FakeDBCursor:
+    def __init__(self, db):
+        self.db = db
+        self.result = []
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        db, sql = self.db, " ".join(sql.split())
+        self.result, self.rowcount = [], 0
+        if sql.startswith("SELECT file_hash"):
+            doc = db.documents.get(params[0])
+            self.result = [tuple(doc)] if doc else []
+        elif sql.startswith("UPDATE documents"):
+            db.documents[params[3]][1:] = params[:3]
+        elif sql.startswith("SELECT content_hash"):
+            self.result = [(c[2],) for c in db.chunks if c[0] == params[0] and not c[3]]
+        elif sql.startswith("UPDATE document_chunks SET chapter"):
+            for c in db.chunks:
+                if c[0] == params[1] and not c[3]:
+                    c[1] = params[0]
+        elif sql.startswith("UPDATE document_chunks SET deleted_at"):
+            if "starts_with" in sql:
+                prefix, present = params
+                stale = lambda c: c[0].startswith(prefix) and c[0] not in present
+            else:
+                source, hashes = params
+                stale = lambda c: c[0] == source and c[2] in hashes
+            for c in db.chunks:
+                if not c[3] and stale(c):
+                    c[3] = True
+                    self.rowcount += 1
+        elif sql.startswith("INSERT INTO documents"):
+            db.documents[params[0]] = list(params[1:])
+        elif sql.startswith("DELETE FROM documents"):
+            prefix, present = params
+            for source in [s for s in db.documents if s.startswith(prefix) and s not in present]:
+                del db.documents[source]
+        else:
+            raise AssertionError(sql)
+
+    def insert_chunks(self, rows):
+        self.db.chunks.extend([source, chapter, h, False] for source, chapter, _, _, h, _ in rows)
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+
+class TestIngest(unittest.TestCase):
+
+    def test_chunks_respect_budget_and_overlap(self):
+        words = [f"w{i}" for i in range(100)]
+        chunks = list(chunk_text([" ".join(words[:50]), " ".join(words[50:])], max_tokens=20, overlap=4))
+        self.assertGreater(len(chunks), 4)
+        for chunk in chunks[:-1]:
+            self.assertLessEqual(len(chunk.split()), 20)
+        first, second = chunks[0].split(), chunks[1].split()
+        self.assertEqual(first[-4:], second[:4])
+        self.assertEqual(chunks[-1].split()[-1], "w99")
+
+    def test_no_trailing_chunk_of_pure_overlap(self):
+        chunks = list(chunk_text(["a b c d"], max_tokens=4, overlap=2))
+        self.assertEqual(chunks, ["a b c d"])
+
+    def test_chunk_hash_is_stable(self):
+        self.assertEqual(chunk_hash("UML"), chunk_hash("UML"))
+        self.assertNotEqual(chunk_hash("UML"), chunk_hash("UML "))
+
+    def test_guess_chapter(self):
+        self.assertEqual(guess_chapter(Path("Chapter_03 Requirements.pdf")), 3)
+        self.assertEqual(guess_chapter(Path("ch12-notes.txt")), 12)
+        self.assertIsNone(guess_chapter(Path("syllabus.pdf")))
+
+    def test_text_files_stream_by_paragraph(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "notes.txt"
+            path.write_text("first para\nline two\n\nsecond para\n")
+            (Path(tmp) / "image.png").write_bytes(b"")
+            self.assertEqual(list(iter_source_files(Path(tmp))), [path])
+            self.assertEqual(list(extract_text(path)), ["first para\nline two\n\n", "second para\n"])
+
+
+class TestIngestor(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(ingest, "execute_values", lambda cur, sql, rows, template: cur.insert_chunks(rows))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.root = Path(tempfile.mkdtemp())
+        (self.root / "notes").mkdir()
+        (self.root / "ch1.txt").write_text("Waterfall runs in phases.\n\nAgile iterates.\n")
+        (self.root / "notes" / "ch2.txt").write_text("Use cases name actors.\n")
+        self.db = FakeDB()
+
+    def ingest(self, path=None, chapter=None):
+        return Ingestor(self.db, HashEmbedder(dim=8), self.root, batch_size=2).ingest_path(path or self.root, chapter)
+
+    def test_rerun_on_an_unchanged_corpus_embeds_nothing(self):
+        first = self.ingest()
+        self.assertEqual((first.files_seen, first.chunks_embedded), (2, 2))
+        self.assertEqual(sorted(self.db.documents), ["ch1.txt", "notes/ch2.txt"])
+        second = self.ingest()
+        self.assertEqual((second.files_skipped, second.chunks_embedded, second.chunks_tombstoned), (2, 0, 0))
+
+    def test_sources_are_relative_to_the_corpus_root(self):
+        self.ingest()
+        os.utime(self.root / "ch1.txt", ns=(0, 0))  # touched, same content
+        cwd = os.getcwd()
+        os.chdir(self.root)
+        self.addCleanup(os.chdir, cwd)
+        stats = self.ingest(Path("ch1.txt"))
+        self.assertEqual((stats.files_skipped, stats.chunks_embedded), (1, 0))
+        self.assertEqual(sorted(self.db.documents), ["ch1.txt", "notes/ch2.txt"])
+        with self.assertRaises(ValueError):
+            self.ingest(Path(tempfile.mkdtemp()))
+
+    def test_modified_file_is_rechunked(self):
+        self.ingest()
+        (self.root / "ch1.txt").write_text("Waterfall runs in phases.\n\nScrum has sprints and a backlog.\n")
+        stats = self.ingest()
+        self.assertEqual((stats.chunks_kept, stats.chunks_embedded, stats.chunks_tombstoned), (0, 1, 1))
+        live = [c for c in self.db.live() if c[0] == "ch1.txt"]
+        self.assertEqual(live, [("ch1.txt", 1, chunk_hash("Waterfall runs in phases. Scrum has sprints and a backlog."))])
+
+    def test_removed_files_are_tombstoned(self):
+        self.ingest()
+        (self.root / "notes" / "ch2.txt").unlink()
+        stats = self.ingest(self.root / "notes")
+        self.assertEqual(stats.chunks_tombstoned, 1)
+        self.assertEqual([c[0] for c in self.db.live()], ["ch1.txt"])
+        self.assertEqual(sorted(self.db.documents), ["ch1.txt"])
+
+    def test_changed_chapter_relabels_unchanged_files(self):
+        self.ingest()
+        stats = self.ingest(chapter=7)
+        self.assertEqual((stats.files_skipped, stats.chunks_embedded), (2, 0))
+        self.assertEqual({c[1] for c in self.db.live()}, {7})
+        self.assertEqual({doc[3] for doc in self.db.documents.values()}, {7})
+
+
+if __name__ == "__main__":
+    unittest.main()
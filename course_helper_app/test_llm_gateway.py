@@ -0,0 +1,107 @@
+import asyncio
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_openai import DEFAULT_REPLY, FakeOpenAIServer
+from llm_gateway import PRIORITY_BACKGROUND, PRIORITY_CHAT, LLMGateway
+
+MESSAGES = [{"role": "user", "content": "When is the midterm?"}]
+
+
+class TestLLMGateway(unittest.TestCase):
+
+    def make(self, latency=0.0, tokens_per_second=0.0, **kwargs):
+        server = FakeOpenAIServer(latency=latency, tokens_per_second=tokens_per_second).start()
+        self.addCleanup(server.stop)
+        gateway = LLMGateway(base_url=server.base_url, api_key="test", **kwargs)
+        self.addCleanup(gateway.close)
+        return server, gateway
+
+    def test_complete_and_stream(self):
+        server, gateway = self.make()
+        self.assertEqual(gateway.complete(MESSAGES, model="gpt-5-nano"), DEFAULT_REPLY)
+        self.assertEqual("".join(gateway.stream(MESSAGES, model="gpt-5-nano")), DEFAULT_REPLY)
+
+    def test_identical_requests_are_coalesced(self):
+        server, gateway = self.make(latency=0.3)
+        with ThreadPoolExecutor(8) as pool:
+            replies = list(pool.map(lambda _: gateway.complete(MESSAGES, model="gpt-5-nano"), range(8)))
+        self.assertEqual(set(replies), {DEFAULT_REPLY})
+        self.assertEqual(server.requests["/v1/chat/completions"], 1)
+        self.assertEqual(gateway.stats["deduplicated"], 7)
+
+    def test_identical_streams_share_one_upstream_call(self):
+        server, gateway = self.make(latency=0.2, tokens_per_second=200)
+        with ThreadPoolExecutor(3) as pool:
+            texts = list(pool.map(lambda _: "".join(gateway.stream(MESSAGES, model="gpt-5-nano")), range(3)))
+        self.assertEqual(texts, [DEFAULT_REPLY] * 3)
+        self.assertEqual(server.requests["/v1/chat/completions"], 1)
+
+    def test_chat_jumps_the_queue(self):
+        server, gateway = self.make(latency=0.2, concurrency=1)
+        finished = []
+
+        def submit(name, priority):
+            future = gateway.submit(priority, model="m", messages=[{"role": "user", "content": name}])
+            future.add_done_callback(lambda _: finished.append(name))
+            return future
+
+        futures = [submit("first", PRIORITY_BACKGROUND)]
+        time.sleep(0.05)
+        futures += [submit("background", PRIORITY_BACKGROUND), submit("chat", PRIORITY_CHAT)]
+        for future in futures:
+            future.result(5)
+        self.assertEqual(finished, ["first", "chat", "background"])
+        self.assertLessEqual(server.max_in_flight, 1)
+
+    def test_timeouts_are_retried_then_raised(self):
+        server, gateway = self.make(latency=0.5, timeout=0.1, retries=1, backoff=0.01)
+        with self.assertRaises(asyncio.TimeoutError):
+            gateway.complete(MESSAGES, model="gpt-5-nano")
+        self.assertEqual(gateway.stats["upstream_calls"], 2)
+        self.assertEqual(gateway.stats["retries"], 1)
+
+    def test_stream_timeout_applies_between_chunks(self):
+        server, gateway = self.make(tokens_per_second=20, timeout=0.3)
+        start = time.monotonic()
+        self.assertEqual("".join(gateway.stream(MESSAGES, model="gpt-5-nano")), DEFAULT_REPLY)
+        self.assertGreater(time.monotonic() - start, 0.3)  # longer than the timeout in total
+
+    def test_silent_stream_raises_timeout_error(self):
+        server, gateway = self.make(latency=1.0, timeout=0.1, retries=2)
+        stream = gateway.stream(MESSAGES, model="gpt-5-nano")
+        with self.assertRaises(TimeoutError):
+            list(stream)
+        deadline = time.monotonic() + 2
+        while gateway.metrics()["in_flight_streams"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(gateway.stats["cancelled"], 1)
+
+    def test_closing_last_subscriber_cancels_upstream(self):
+        server, gateway = self.make(tokens_per_second=20)
+        stream = gateway.stream(MESSAGES, model="gpt-5-nano")
+        next(iter(stream))
+        stream.close()
+        deadline = time.monotonic() + 2
+        while gateway.metrics()["in_flight_streams"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(gateway.stats["cancelled"], 1)
+        self.assertEqual(gateway.metrics()["in_flight_streams"], 0)
+
+    def test_async_stream(self):
+        server, gateway = self.make(tokens_per_second=200)
+
+        async def consume():
+            stream = await gateway.astream(MESSAGES, model="gpt-5-nano")
+            try:
+                return "".join([delta async for delta in stream])
+            finally:
+                stream.close()
+
+        self.assertEqual(asyncio.run(consume()), DEFAULT_REPLY)
+        self.assertEqual(gateway.stats["upstream_calls"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
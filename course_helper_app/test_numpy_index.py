@@ -0,0 +1,149 @@
+import shutil
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from embeddings import HashEmbedder, TfidfHashEmbedder
+from numpy_index import NumpyRetriever, main, quantize, top_k, write_index
+
+CHUNKS = [
+    ("ch1.pdf", 1, "The waterfall model runs requirements, design, implementation and testing in sequence."),
+    ("ch1.pdf", 1, "Agile methods deliver working software in short iterations with customer feedback."),
+    ("ch3.pdf", 3, "A use case diagram shows actors and the use cases they take part in."),
+    ("ch3.pdf", 3, "Sequence diagrams show the messages objects exchange over time."),
+    ("notes.txt", None, "Office hours are Tuesdays at 2pm. Café talk: naïve questions welcome."),
+]
+
+
+class TestNumpyIndex(unittest.TestCase):
+
+    def build(self, **kwargs):
+        path = Path(tempfile.mkdtemp()) / "index"
+        write_index(path, CHUNKS, **kwargs)
+        return path
+
+    def test_tfidf_embedder_weights_rare_terms(self):
+        embedder = TfidfHashEmbedder(dim=512).fit(text for _, _, text in CHUNKS)
+        a, b = embedder.vectors(["sequence diagrams", "the diagrams"])
+        self.assertAlmostEqual(float(np.linalg.norm(a)), 1.0, places=5)
+        self.assertEqual(embedder.embed_one("sequence diagrams"), a.tolist())
+        plain = TfidfHashEmbedder(dim=512)
+        self.assertFalse(np.allclose(plain.vectors(["sequence diagrams"])[0], a))
+        self.assertEqual(embedder.vectors([""]).tolist(), [[0.0] * 512])
+
+    def test_search_ranks_and_filters_by_chapter(self):
+        retriever = NumpyRetriever(self.build())
+        chunks = retriever.search("What does a use case diagram show?", k=2)
+        self.assertEqual((chunks[0].id, chunks[0].source, chunks[0].chapter), (2, "ch3.pdf", 3))
+        self.assertEqual(chunks[0].content, CHUNKS[2][2])
+        self.assertGreater(chunks[0].score, chunks[1].score)
+
+        scoped = retriever.search("use case diagram", k=5, chapter=1)
+        self.assertEqual({c.chapter for c in scoped}, {1})
+        self.assertEqual(retriever.search("café", k=1)[0].content, CHUNKS[4][2])
+        self.assertEqual(retriever.search("anything", chapter=9), [])
+        self.assertEqual(retriever.chapters(), [1, 3])
+
+    def test_quantized_index_ranks_like_the_float_one(self):
+        exact, approx = NumpyRetriever(self.build()), NumpyRetriever(self.build(quantized=True))
+        self.assertEqual(approx.matrix.dtype, np.int8)
+        for question in ("waterfall testing", "agile iterations", "messages between objects"):
+            a, b = exact.search(question, k=3), approx.search(question, k=3)
+            self.assertEqual([c.id for c in a], [c.id for c in b])
+            for x, y in zip(a, b):
+                self.assertAlmostEqual(x.score, y.score, places=2)
+
+        matrix = np.random.default_rng(0).standard_normal((20, 64)).astype(np.float32)
+        q, scales = quantize(matrix)
+        self.assertLess(np.abs(q * scales[:, None] - matrix).max(), scales.max())
+
+    def test_matrix_is_memory_mapped(self):
+        retriever = NumpyRetriever(self.build())
+        self.assertIsInstance(retriever.matrix, np.memmap)
+        self.assertEqual(retriever.matrix.shape, (5, 4096))
+
+    def test_top_k(self):
+        scores = np.array([0.1, 0.9, 0.5, 0.7], dtype=np.float32)
+        self.assertEqual(top_k(scores, 2).tolist(), [1, 3])
+        self.assertEqual(top_k(scores, 10).tolist(), [1, 3, 2, 0])
+        self.assertEqual(top_k(scores, 0).tolist(), [])
+
+    def test_other_embedders_must_match_the_index(self):
+        path = self.build(embedder=HashEmbedder(dim=16))
+        with self.assertRaises(ValueError):
+            NumpyRetriever(path)
+        with self.assertRaises(ValueError):
+            NumpyRetriever(path, HashEmbedder(dim=32))
+        retriever = NumpyRetriever(path, HashEmbedder(dim=16))
+        self.assertEqual(retriever.search("sequence diagrams show messages", k=1)[0].id, 3)
+
+    def test_add_chunks(self):
+        retriever = NumpyRetriever(self.build())
+        retriever.add_chunks("ch5.pdf", 5, ["Test-driven development writes the failing test first."])
+        self.assertEqual(len(retriever), 6)
+        self.assertEqual(retriever.search("test-driven development", k=1)[0].source, "ch5.pdf")
+        self.assertEqual(NumpyRetriever(retriever.path).chapters(), [1, 3, 5])
+
+    def test_add_chunks_leaves_mapped_files_alone(self):
+        path = self.build(quantized=True)
+        reader = NumpyRetriever(path)  # e.g. another process with the index open
+        before = reader.search("waterfall model", k=1)[0]
+        writer = NumpyRetriever(path)
+        writer.add_chunks("ch1.pdf", 1, ["The spiral model adds risk analysis to every iteration."])
+        writer.add_chunks("ch1.pdf", 1, [])
+        self.assertEqual(reader.search("waterfall model", k=1)[0], before)
+        self.assertEqual(len(reader), 5)
+        self.assertEqual(len(writer), 6)
+        self.assertEqual(writer.search("spiral model risk", k=1)[0].id, 5)
+        self.assertEqual(NumpyRetriever(path).sources, ["ch1.pdf", "ch3.pdf", "notes.txt"])
+        self.assertTrue(path.is_symlink())
+        left = sorted(p.name for p in path.parent.iterdir() if p.name != ".index.lock")
+        self.assertEqual(left, sorted(["index", path.resolve().name]))  # no temp dirs left
+
+    def test_writers_append_to_each_others_chunks(self):
+        path = self.build()
+        first, second = NumpyRetriever(path), NumpyRetriever(path)
+        threads = [
+            threading.Thread(target=first.add_chunks, args=("ch5.pdf", 5, ["Refactoring keeps behavior."])),
+            threading.Thread(target=second.add_chunks, args=("ch6.pdf", 6, ["Code review finds defects."])),
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(NumpyRetriever(path).chapters(), [1, 3, 5, 6])
+        self.assertEqual(len(NumpyRetriever(path)), 7)
+
+    def test_index_from_before_the_symlink_is_replaced(self):
+        path = self.build()
+        legacy = path.with_name("legacy")
+        shutil.copytree(path.resolve(), legacy)
+        path.unlink()
+        legacy.rename(path)
+        retriever = NumpyRetriever(path)
+        retriever.add_chunks("ch5.pdf", 5, ["Refactoring keeps behavior."])
+        self.assertTrue(path.is_symlink())
+        self.assertEqual(len(NumpyRetriever(path)), 6)
+
+    def test_rebuild_leaves_open_retrievers_on_their_texts(self):
+        path = self.build()
+        reader = NumpyRetriever(path)  # no search yet
+        write_index(path, [("other.txt", None, "ééééé completely different text here about testing")])
+        found = reader.search("waterfall model")
+        self.assertEqual([c.content for c in found], [CHUNKS[c.id][2] for c in found])
+        self.assertEqual(NumpyRetriever(path).search("testing", k=1)[0].source, "other.txt")
+
+    def test_cli_builds_from_documents(self):
+        docs = Path(tempfile.mkdtemp())
+        (docs / "chapter_2.txt").write_text("Requirements elicitation uses interviews and workshops.\n")
+        out = Path(tempfile.mkdtemp()) / "index"
+        main(["build", str(docs), "--out", str(out), "--quantize"])
+        chunk = NumpyRetriever(out).search("interviews", k=1)[0]
+        self.assertEqual((chunk.source, chunk.chapter), ("chapter_2.txt", 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
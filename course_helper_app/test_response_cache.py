@@ -0,0 +1,70 @@
+import unittest
+from contextlib import nullcontext
+
+from response_cache import DEFAULT_SCOPE, LRUCache, ResponseCache, normalize_prompt, scope_for
+from test_retrieval import FakeConnection
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_normalize_prompt(self):
+        self.assertEqual(normalize_prompt("  When is the MIDTERM?? "), "when is the midterm")
+
+    def test_lru_evicts_oldest_and_expires(self):
+        clock = FakeClock()
+        lru = LRUCache(max_entries=2, ttl=10, clock=clock)
+        lru.put("a", 1)
+        lru.put("b", 2)
+        lru.get("a")
+        lru.put("c", 3)
+        self.assertIsNone(lru.get("b"))
+        self.assertEqual(lru.get("a"), 1)
+        clock.now = 11
+        self.assertIsNone(lru.get("a"))
+
+    def test_exact_hit_is_scoped_and_counted(self):
+        cache = ResponseCache()
+        cache.store("When is the midterm?", "Week 8.", latency=2.0, scope="chapter:1")
+        hit = cache.lookup("when is the midterm", scope="chapter:1")
+        miss = cache.lookup("when is the midterm", scope="chapter:2")
+        self.assertEqual((hit.answer, hit.tier), ("Week 8.", "exact"))
+        self.assertFalse(miss.hit)
+        self.assertEqual(cache.stats.hit_rate, 0.5)
+        self.assertGreater(cache.stats.saved_seconds, 1.9)
+
+    def test_semantic_tier_failure_is_a_miss(self):
+        def broken_connect():
+            raise ConnectionError("db down")
+
+        cache = ResponseCache(embed=lambda text: [1.0, 0.0], connect=broken_connect)
+        self.assertFalse(cache.lookup("prereqs for CSC 4350").hit)
+        cache.store("prereqs for CSC 4350", "CSC 2720", latency=1.0)
+        self.assertTrue(cache.lookup("Prereqs for CSC 4350?").hit)
+
+    def test_rows_are_pruned_every_few_stores_per_scope(self):
+        conn = FakeConnection()
+        cache = ResponseCache(embed=lambda text: [1.0, 0.0], connect=lambda: nullcontext(conn), prune_every=3)
+        for i in range(7):
+            cache.store(f"question {i}", "answer", latency=1.0, scope=scope_for(1 if i % 2 else None))
+        deletes = [params for sql, params in conn.cur.executed if "DELETE" in sql]
+        self.assertEqual([params[0] for params in deletes], [DEFAULT_SCOPE, "chapter:1"])
+        self.assertEqual(deletes[0][1:], (cache.ttl, DEFAULT_SCOPE, cache.max_rows))
+
+    def test_prompts_without_words_skip_the_semantic_tier(self):
+        conn = FakeConnection()
+        cache = ResponseCache(embed=lambda text: [0.0, 0.0], connect=lambda: nullcontext(conn))
+        self.assertFalse(cache.lookup("???").hit)
+        cache.store("???", "answer", latency=1.0)
+        self.assertEqual(conn.cur.executed, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import unittest
+from contextlib import nullcontext
+from types import SimpleNamespace
+from unittest import mock
+
+from embeddings import HashEmbedder
+from retrieval import (
+    Chunk, FileSearchRetriever, PgVectorRetriever, build_messages, chapter_filter, check_backend, parse_chapter,
+    rrf_fuse,
+)
+from vectors import cosine
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConnection:
+    def __init__(self, rows=()):
+        self.cur = FakeCursor(list(rows))
+
+    def cursor(self):
+        return self.cur
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class TestRetrieval(unittest.TestCase):
+
+    def test_hash_embedder_is_deterministic_and_similarity_aware(self):
+        embedder = HashEmbedder(dim=256)
+        a, b, c = embedder.embed([
+            "UML sequence diagram",
+            "what is a sequence diagram in UML",
+            "midterm exam date",
+        ])
+        self.assertEqual(a, embedder.embed_one("UML sequence diagram"))
+        self.assertGreater(cosine(a, b), cosine(a, c))
+
+    def test_search_filters_by_chapter(self):
+        conn = FakeConnection([(7, "ch2.pdf", 2, "Use case diagrams...", 0.81)])
+        retriever = PgVectorRetriever(HashEmbedder(dim=8), connect=lambda: nullcontext(conn))
+        chunks = retriever.search("use case", k=3, chapter=2)
+        sql, params = conn.cur.executed[0]
+        self.assertIn("AND chapter = %s", sql)
+        self.assertEqual(params[1:], [2, params[0], 3])
+        self.assertEqual(chunks, [Chunk(7, "ch2.pdf", 2, "Use case diagrams...", 0.81)])
+
+    def test_lexical_and_hybrid_modes(self):
+        row = (3, "syllabus.pdf", None, "CSC 4350 prerequisites...", 0.03)
+        conn = FakeConnection([row])
+        lexical = PgVectorRetriever(HashEmbedder(dim=8), connect=lambda: nullcontext(conn), mode="lexical")
+        self.assertEqual(lexical.search("CSC 3320", k=2), [Chunk(*row)])
+        sql, params = conn.cur.executed[-1]
+        self.assertIn("content_tsv @@ q.query", sql)
+        self.assertIn("q.query IS NOT NULL", sql)  # a stopword-only question matches no text
+        self.assertNotIn("embedding", sql)
+        self.assertNotIn("chapter = ", sql)
+        self.assertEqual((params["query"], params["k"]), ("CSC 3320", 2))
+
+        hybrid = PgVectorRetriever(HashEmbedder(dim=8), connect=lambda: nullcontext(conn), mode="hybrid")
+        hybrid.search("UML sequence diagram", k=4, chapter=5)
+        sql, params = conn.cur.executed[-1]
+        self.assertEqual(len(conn.cur.executed), 2)  # one round trip for both rankings
+        self.assertIn("UNION ALL", sql)
+        self.assertEqual(sql.count("AND c.chapter = %(chapter)s"), 2)
+        self.assertEqual((params["chapter"], params["candidates"], params["rrf_k"]), (5, 50, 60))
+        self.assertTrue(params["vec"].startswith("["))
+        with self.assertRaises(ValueError):
+            PgVectorRetriever(HashEmbedder(dim=8), connect=None, mode="bm25")
+
+    def test_queries_without_words_skip_the_vector_ranking(self):
+        conn = FakeConnection([(3, "syllabus.pdf", None, "...", 0.1)])
+        vector = PgVectorRetriever(HashEmbedder(dim=8), connect=lambda: nullcontext(conn))
+        self.assertEqual(vector.search("???"), [])
+        self.assertEqual(conn.cur.executed, [])
+
+        hybrid = PgVectorRetriever(HashEmbedder(dim=8), connect=lambda: nullcontext(conn), mode="hybrid")
+        self.assertEqual(len(hybrid.search("???")), 1)
+        sql, params = conn.cur.executed[-1]
+        self.assertNotIn("embedding", sql)
+        self.assertNotIn("vec", params)
+
+    def test_file_search_retriever(self):
+        result = SimpleNamespace(
+            filename="ch3.pdf", score=0.7, attributes={"chapter": 3},
+            content=[SimpleNamespace(type="text", text="Use cases...")],
+        )
+        search = mock.Mock(return_value=SimpleNamespace(data=[result]))
+        client = SimpleNamespace(vector_stores=SimpleNamespace(search=search))
+        retriever = FileSearchRetriever(client, lambda: "vs_1")
+        self.assertEqual(retriever.search("use case", k=2, chapter=3), [Chunk(0, "ch3.pdf", 3, "Use cases...", 0.7)])
+        search.assert_called_once_with("vs_1", query="use case", max_num_results=2, filters=chapter_filter(3))
+        with self.assertRaises(LookupError):
+            FileSearchRetriever(client, lambda: None).search("use case")
+
+    def test_check_backend(self):
+        self.assertEqual(check_backend("remote"), "remote")
+        with self.assertRaises(ValueError):
+            check_backend("pgvector")
+
+    def test_rrf_fuse(self):
+        fused = rrf_fuse([["a", "b", "c"], ["c", "a"]], k=60)
+        self.assertEqual([item for item, _ in fused], ["a", "c", "b"])
+        self.assertAlmostEqual(fused[0][1], 1 / 61 + 1 / 62)
+        self.assertEqual(rrf_fuse([]), [])
+
+    def test_chapter_scoping(self):
+        for text in ("3", "ch3", "Chapter 03", " chapter-3 "):
+            self.assertEqual(parse_chapter(text), 3)
+        self.assertIsNone(parse_chapter("requirements"))
+        self.assertIsNone(chapter_filter(None))
+        self.assertEqual(chapter_filter(3), {"type": "eq", "key": "chapter", "value": 3})
+
+    def test_build_messages_injects_only_retrieved_chunks(self):
+        chunks = [Chunk(1, "syllabus.pdf", None, "Midterm is in week 8.", 0.9)]
+        messages = build_messages("When is the midterm?", chunks)
+        self.assertIn("Midterm is in week 8.", messages[1]["content"])
+        self.assertTrue(messages[1]["content"].endswith("Question: When is the midterm?"))
+        self.assertEqual(len(build_messages("hi", [])), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+
+from embeddings import HashEmbedder
+from retrieval_benchmark import DEFAULT_CORPUS, DEFAULT_QUERIES, Bm25, evaluate, load_jsonl, run, terms
+
+
+class TestRetrievalBenchmark(unittest.TestCase):
+
+    def test_bm25_prefers_rare_exact_terms(self):
+        bm25 = Bm25(["CSC 3320 covers C and Unix", "CSC 4350 software engineering", "Unix shell scripting"])
+        self.assertEqual(bm25.rank("CSC 3320", 5), [0, 1])
+        self.assertEqual(bm25.rank("quantum", 5), [])
+        self.assertEqual(terms("What are the diagrams?"), ["diagram"])
+
+    def test_evaluate(self):
+        queries = [{"query": "a", "relevant": ["x", "y"]}, {"query": "b", "relevant": ["z"]}]
+        results = {"a": ["w", "x"], "b": ["w"]}
+        report = evaluate(lambda q, k: results[q], queries, k=2)
+        self.assertEqual((report["recall_at_k"], report["mrr"], report["misses"]), (0.25, 0.25, ["b"]))
+        self.assertEqual(report["latency_seconds"]["count"], 2)
+
+    def test_bundled_set_in_process(self):
+        results = run(load_jsonl(DEFAULT_CORPUS), load_jsonl(DEFAULT_QUERIES), HashEmbedder(), k=4)
+        modes = results["modes"]
+        self.assertEqual(set(modes), {"vector", "lexical", "hybrid"})
+        self.assertGreaterEqual(modes["hybrid"]["recall_at_k"], modes["vector"]["recall_at_k"])
+        self.assertGreater(modes["lexical"]["recall_at_k"], 0.9)
+
+
+if __name__ == "__main__":
+    unittest.main()
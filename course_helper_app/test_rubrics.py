@@ -0,0 +1,95 @@
+import json
+import re
+import threading
+import unittest
+from types import SimpleNamespace
+
+from grading import Grader
+from rubrics import Rubric, RubricGenerator, card_hash, parse_rubrics
+from util import with_retries
+
+CARDS = [(i, f"Question {i}?", f"Answer {i}.") for i in range(1, 8)]
+
+
+class FakeCompletions:
+    def __init__(self, fail_first=0, stray_id=None):
+        self.calls = 0
+        self.fail_first = fail_first
+        self.stray_id = stray_id  # answered in every batch, as if hallucinated
+        self.lock = threading.Lock()
+
+    def create(self, model, messages, response_format):
+        with self.lock:
+            self.calls += 1
+            if self.calls <= self.fail_first:
+                raise TimeoutError("upstream timeout")
+        ids = [int(i) for i in re.findall(r'"id": (\d+), "question"', messages[1]["content"])]
+        concepts = {i: f"concept {i}" for i in ids}
+        if self.stray_id is not None and self.stray_id not in ids:
+            concepts[self.stray_id] = "from another batch"
+        body = {"rubrics": [
+            {"id": i, "key_concepts": [concept], "misconceptions": [], "hint": "h"} for i, concept in concepts.items()
+        ]}
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps(body)))])
+
+
+class TestRubrics(unittest.TestCase):
+
+    def test_card_hash_changes_with_edits(self):
+        self.assertEqual(card_hash("Q", "A"), card_hash("Q", "A"))
+        self.assertNotEqual(card_hash("Q", "A"), card_hash("Q", "A2"))
+
+    def test_generator_batches_cards(self):
+        completions = FakeCompletions()
+        client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        rubrics = RubricGenerator(client, concurrency=2, batch_size=3).generate(CARDS)
+        self.assertEqual(sorted(rubrics), [c[0] for c in CARDS])
+        self.assertEqual(completions.calls, 3)
+        self.assertEqual(rubrics[4].key_concepts, ("concept 4",))
+
+    def test_ids_outside_the_batch_are_dropped(self):
+        completions = FakeCompletions(stray_id=4)
+        client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        rubrics = RubricGenerator(client, batch_size=3).generate(CARDS)
+        self.assertEqual(sorted(rubrics), [c[0] for c in CARDS])
+        self.assertEqual(rubrics[4].key_concepts, ("concept 4",))
+
+    def test_with_retries(self):
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise ConnectionError
+            return "ok"
+
+        self.assertEqual(with_retries(flaky, sleep=lambda s: None), "ok")
+        with self.assertRaises(ConnectionError):
+            with_retries(lambda: (_ for _ in ()).throw(ConnectionError()), attempts=2, sleep=lambda s: None)
+
+        attempts.clear()
+
+        def rejected():
+            attempts.append(1)
+            raise PermissionError("401")
+
+        with self.assertRaises(PermissionError):
+            with_retries(rejected, sleep=lambda s: None)
+        self.assertEqual(len(attempts), 1)  # only transient errors are retried
+
+    def test_parse_rubrics(self):
+        parsed = parse_rubrics('{"rubrics": [{"id": "3", "key_concepts": ["a"], "hint": "think"}]}')
+        self.assertEqual(parsed, {3: Rubric(("a",), (), "think")})
+
+    def test_grader_uses_rubric_concepts_and_hint(self):
+        rubric = Rubric(("tracks changes", "code history over time"), (), "Think about git.")
+        grader = Grader()
+        answer = "Software that records every revision."
+        good = grader.grade("Q", answer, "It tracks changes and keeps the history of code over time", rubric)
+        bad = grader.grade("Q", answer, "a database", rubric)
+        self.assertEqual((good.correct, good.method), (True, "rubric"))
+        self.assertEqual(bad.feedback, "Incorrect. Hint: Think about git.")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+
+from scope import BORDERLINE, IN_SCOPE, OUT_OF_SCOPE, ScopeClassifier, build_classifier, scope_text
+from scope_eval import DEFAULT_DATA, evaluate, load_labelled
+
+
+class TestScope(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.classifier = build_classifier(["Pair programming and configuration management are covered in week 6."])
+
+    def test_decisions(self):
+        self.assertEqual(self.classifier.decide("Write my history essay").label, OUT_OF_SCOPE)
+        self.assertEqual(self.classifier.decide("What is the spiral model?").label, IN_SCOPE)
+        # Course material vocabulary keeps unseeded topics in scope.
+        self.assertEqual(self.classifier.decide("What is pair programming?").label, IN_SCOPE)
+        # Nothing known about the words either way: escalate.
+        self.assertEqual(self.classifier.decide("Who is Taylor Swift?").label, BORDERLINE)
+
+    def test_follow_ups_are_judged_with_the_previous_question(self):
+        history = [
+            {"role": "user", "content": "What is the waterfall model?"},
+            {"role": "assistant", "content": "A sequential process model."},
+        ]
+        self.assertEqual(scope_text("why?", history), "What is the waterfall model?\nwhy?")
+        self.assertEqual(scope_text("why?", []), "why?")
+        self.assertEqual(self.classifier.decide(scope_text("Tell me more", history)).label, IN_SCOPE)
+
+    def test_novelty_ignores_a_training_text_itself(self):
+        classifier = ScopeClassifier().train(["spiral model"], ["pizza recipe"])
+        self.assertEqual(classifier.novelty("spiral model"), 0.0)
+        self.assertEqual(classifier.novelty("spiral model", in_training=True), 1.0)
+        self.assertEqual(classifier.novelty("spiral pizza"), 0.5)
+        with self.assertRaises(ValueError):
+            ScopeClassifier().train(["spiral model"], [])
+
+    def test_evaluate(self):
+        report = evaluate([0.9, 0.85, 0.6, 0.1], [False, True, False, True], threshold=0.8)
+        self.assertEqual((report.precision, report.recall), (0.5, 0.5))
+        self.assertEqual((report.false_fallbacks, report.borderline, report.calls_saved), (1, 1, 2))
+
+    def test_bundled_eval_set_has_no_wrong_fallbacks_at_the_default_threshold(self):
+        rows = load_labelled(DEFAULT_DATA)
+        report = evaluate([self.classifier.probability(r["prompt"]) for r in rows], [r["in_scope"] for r in rows], 0.8)
+        self.assertEqual(report.false_fallbacks, 0)
+        self.assertGreater(report.calls_saved, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,226 @@
+import os
+import unittest
+import uuid
+from contextlib import nullcontext
+from unittest import mock
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import service
+import session_state
+from chat_store import ChatStore, Page, StoredMessage
+from conversation import RollingSummary
+from session_state import (
+    MemoryBackend, PostgresBackend, SessionState, decode, encode, new_token, open_session, session_id_for,
+)
+from test_retrieval import FakeConnection
+from transcript import make_message
+
+SESSION = "0b7c8d2e-5f4a-4e61-8c3d-2a9e1f6b7c80"
+
+
+class CountingBackend(MemoryBackend):
+    def __init__(self):
+        super().__init__()
+        self.loads = []
+        self.saves = []
+
+    def load(self, session_id, key):
+        self.loads.append(key)
+        return super().load(session_id, key)
+
+    def save(self, session_id, values):
+        self.saves.append(sorted(values))
+        super().save(session_id, values)
+
+
+class TestSessionState(unittest.TestCase):
+
+    def test_encoding_round_trips_and_compresses(self):
+        self.assertEqual(decode(encode({"screen": "quiz", "card_index": 3})), {"screen": "quiz", "card_index": 3})
+        self.assertEqual(decode(encode(RollingSummary("UML so far", 4))), RollingSummary("UML so far", 4))
+        messages = [make_message("user", "What is UML? " * 20, "2025-10-01T14:00:00-04:00")] * 5
+        data = encode(messages, drop=("html",))
+        self.assertEqual(data[:1], b"z")
+        self.assertLess(len(data), len(messages[0]["content"]))
+        self.assertNotIn("html", decode(data)[0])
+        with self.assertRaises(TypeError):
+            encode(object())
+
+    def test_keys_load_lazily_and_only_dirty_keys_are_written(self):
+        backend = CountingBackend()
+        session = SessionState(backend, SESSION, ["screen", "chapter", "card_index"])
+        self.assertEqual(session.get("screen", "chatbot"), "chatbot")
+        self.assertEqual(session.get("screen", "chatbot"), "chatbot")
+        self.assertEqual(backend.loads, ["screen"])
+
+        state = {"screen": "flashcards", "chapter": 2, "card_index": 0, "stream_id": "x"}
+        self.assertEqual(session.save(state), 3)
+        self.assertEqual(session.save(state), 0)
+        state["card_index"] = 1
+        self.assertEqual(session.save(state), 1)
+        self.assertEqual(backend.saves, [["card_index", "chapter", "screen"], ["card_index"]])
+
+    def test_backend_errors_fall_back_to_the_local_state(self):
+        backend = mock.Mock(load=mock.Mock(side_effect=RuntimeError), save=mock.Mock(side_effect=RuntimeError))
+        session = SessionState(backend, SESSION, ["screen"])
+        with self.assertLogs("session_state", "WARNING"):
+            self.assertEqual(session.get("screen", "chatbot"), "chatbot")
+            self.assertEqual(session.save({"screen": "quiz"}), 0)
+        backend.save.side_effect = None
+        self.assertEqual(session.save({"screen": "quiz"}), 1)  # still dirty after the failure
+
+    def test_save_errors_are_contained(self):
+        session = SessionState(MemoryBackend(), SESSION, ["screen"])
+        with self.assertLogs("session_state", "WARNING"):
+            self.assertEqual(session.save({"screen": object()}), 0)  # not serializable
+
+    def test_only_issued_tokens_open_a_session(self):
+        backend = MemoryBackend()
+        session, token = open_session(backend, None, ["screen"])
+        self.assertEqual(session.session_id, session_id_for(token))
+        self.assertNotIn(token, session.session_id)
+        session.save({"screen": "quiz"})
+
+        resumed, same = open_session(backend, token, ["screen"])
+        self.assertEqual((same, resumed.get("screen")), (token, "quiz"))
+        for chosen in (new_token(), SESSION, "x"):
+            fresh, issued = open_session(backend, chosen, ["screen"])
+            self.assertNotEqual(issued, chosen)
+            self.assertIsNone(fresh.get("screen"))
+
+    def test_postgres_backend_upserts_and_loads(self):
+        conn = FakeConnection()
+        backend = PostgresBackend(lambda: nullcontext(conn))
+        batches = []
+        with mock.patch.object(session_state, "execute_values", lambda cur, sql, rows, **kw: batches.append((sql, rows))):
+            backend.save(SESSION, {"screen": b"j\"quiz\""})
+        sql, rows = batches[0]
+        self.assertIn("ON CONFLICT (session_id, key)", sql)
+        self.assertEqual(rows, [(SESSION, "screen", b"j\"quiz\"")])
+
+        conn.cur.fetchone = lambda: (memoryview(b"j\"quiz\""),)
+        self.assertEqual(backend.load(SESSION, "screen"), b"j\"quiz\"")
+        self.assertEqual(conn.cur.executed[-1][1], (SESSION, "screen"))
+
+
+class TestReplicaSwitch(unittest.TestCase):
+    """A session picked up by another app replica, with the database down."""
+
+    def setUp(self):
+        self.backend = MemoryBackend()  # stands in for the store the replicas share
+        stored = Page([StoredMessage(1, "user", "What is UML?", "2025-10-01T14:00:00-04:00")], False)
+        for patcher in (
+            mock.patch.object(session_state, "make_backend", lambda kind, connect=None: self.backend),
+            mock.patch.object(ChatStore, "load_page", lambda store, *args: stored),
+            mock.patch.object(service, "EMBEDDING_PROVIDER", "hash"),
+            mock.patch.dict(os.environ, {"OPENAI_API_KEY": "test"}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        st.cache_resource.clear()
+        self.addCleanup(st.cache_resource.clear)
+
+    def replica(self, query_params):
+        st.cache_resource.clear()  # a fresh process: no service, no sessions
+        app = AppTest.from_file("app.py", default_timeout=30)
+        app.query_params.update(query_params)
+        return app.run()
+
+    def test_session_survives_switching_replicas(self):
+        invented = new_token()
+        first = self.replica({"s": invented})
+        self.assertFalse(first.exception)
+        self.assertNotIn(invented, first.query_params["s"])  # unknown tokens are not adopted
+        first.sidebar.button[0].click().run()
+        self.assertEqual(first.session_state["screen"], "flashcards")
+        first.session_state["messages"] = [make_message("user", "What is UML?", "2025-10-01T14:00:00-04:00")]
+        first.session_state["summary"] = RollingSummary("Asked about UML.", 1)
+        first.run()
+
+        second = self.replica({key: first.query_params[key] for key in ("s", "c")})
+        self.assertFalse(second.exception)
+        self.assertEqual(second.session_state["screen"], "flashcards")
+        self.assertEqual(second.session_state["conversation_id"], first.session_state["conversation_id"])
+        self.assertEqual([m["content"] for m in second.session_state["messages"]], ["What is UML?"])
+        self.assertEqual(second.session_state["summary"], RollingSummary("Asked about UML.", 1))
+        self.assertEqual(self.backend.load(session_id_for(first.query_params["s"][0]), "messages"), None)
+
+        other = self.replica({"s": str(uuid.uuid4())})
+        self.assertEqual(other.session_state["screen"], "chatbot")
+
+
+class TestHistoryPaging(unittest.TestCase):
+    """Loading older messages must not change what the model is sent."""
+
+    def setUp(self):
+        stored = [
+            StoredMessage(i, "user" if i % 2 else "assistant", f"message {i}", "2025-10-01T14:00:00-04:00")
+            for i in range(1, 6)
+        ]
+
+        def load_page(store, conversation_id, before_id=None, limit=40):
+            older = [m for m in stored if before_id is None or m.id < before_id]
+            return Page(older[-2:], len(older) > 2)
+
+        self.planned = []
+        self.chapters = []
+
+        def plan_answer(svc, question, history, summary, chapter=None):
+            self.planned.append(([m["content"] for m in history[summary.covered:]], summary.text))
+            self.chapters.append(chapter)
+            return service.ChatPlan(question, service.SOURCE_FALLBACK, text="ok")
+
+        for patcher in (
+            mock.patch.object(session_state, "make_backend", lambda kind, connect=None: MemoryBackend()),
+            mock.patch.object(service, "EMBEDDING_PROVIDER", "hash"),
+            mock.patch.dict(os.environ, {"OPENAI_API_KEY": "test"}),
+            mock.patch.object(ChatStore, "load_page", load_page),
+            mock.patch.object(ChatStore, "append", lambda store, conversation_id, message: None),
+            mock.patch.object(service.CourseHelperService, "plan_answer", plan_answer),
+            mock.patch.object(service.CourseHelperService, "chapters", lambda svc: (1, 2)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        st.cache_resource.clear()
+        self.addCleanup(st.cache_resource.clear)
+
+    def test_loading_a_page_then_asking(self):
+        app = AppTest.from_file("app.py", default_timeout=30)
+        app.query_params.update({"s": SESSION, "c": str(uuid.uuid4())})
+        app.run()
+        self.assertEqual([m["content"] for m in app.session_state["messages"]], ["message 4", "message 5"])
+        app.session_state["summary"] = RollingSummary("Talked about message 4.", 1)
+
+        next(b for b in app.button if b.label == "Load earlier messages").click()
+        app.run()
+        self.assertEqual(len(app.session_state["messages"]), 4)
+        self.assertEqual(app.session_state["summary"].covered, 3)
+
+        app.chat_input[0].set_value("And then?").run()
+        self.assertFalse(app.exception)
+        self.assertEqual(self.planned, [(["message 5"], "Talked about message 4.")])
+
+    def test_chatbot_questions_use_the_selected_chapter(self):
+        app = AppTest.from_file("app.py", default_timeout=30)
+        app.query_params.update({"s": SESSION})
+        app.run()
+        self.assertEqual(app.sidebar.selectbox[0].options, ["All chapters", "Chapter 1", "Chapter 2"])
+        app.sidebar.selectbox[0].select(2).run()
+        self.assertEqual(app.session_state["chapter"], 2)
+        app.chat_input[0].set_value("What is a use case?").run()
+        self.assertFalse(app.exception)
+        self.assertEqual(self.chapters, [2])
+
+    def test_a_failed_page_is_reported(self):
+        with mock.patch.object(ChatStore, "load_page", side_effect=RuntimeError("database down")):
+            app = AppTest.from_file("app.py", default_timeout=30)
+            app.query_params.update({"s": SESSION, "c": str(uuid.uuid4())})
+            app.run()
+        self.assertIn("database down", app.warning[0].value)
+        self.assertEqual(app.session_state["messages"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+from html import escape
+from types import SimpleNamespace
+
+from streaming import IncrementalEscaper, iter_deltas, stream_to_placeholder
+
+
+def fake_chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+class FakeClock:
+    def __init__(self, step):
+        self.now = 0.0
+        self.step = step
+
+    def __call__(self):
+        self.now += self.step
+        return self.now
+
+
+class TestStreaming(unittest.TestCase):
+
+    def test_incremental_escape_matches_full_escape(self):
+        escaper = IncrementalEscaper()
+        for delta in ["<b>", "Tom & ", "Jerry", "'s \"UML\"", "</b>"]:
+            escaper.feed(delta)
+        self.assertEqual(escaper.html, escape(escaper.text))
+
+    def test_iter_deltas_skips_empty_chunks(self):
+        stream = [fake_chunk(None), SimpleNamespace(choices=[]), fake_chunk("Hi"), fake_chunk(" there")]
+        self.assertEqual(list(iter_deltas(stream)), ["Hi", " there"])
+
+    def test_updates_are_throttled(self):
+        updates = []
+        deltas = [f"w{i} " for i in range(100)]
+        result = stream_to_placeholder(deltas, updates.append, interval=0.05, clock=FakeClock(0.01))
+        self.assertEqual(result.text, "".join(deltas))
+        self.assertLess(len(updates), 30)
+        self.assertIsNotNone(result.ttft)
+
+    def test_ttft_counts_from_the_given_start(self):
+        clock = FakeClock(0.1)
+        start = clock()
+        clock()  # the request round trip
+        result = stream_to_placeholder(["Hi"], lambda html: None, clock=clock, start=start)
+        self.assertAlmostEqual(result.ttft, 0.2)
+
+    def test_cancel_stops_consuming(self):
+        seen = []
+
+        def deltas():
+            for i in range(10):
+                seen.append(i)
+                yield str(i)
+
+        result = stream_to_placeholder(deltas(), lambda html: None, should_cancel=lambda: len(seen) >= 3)
+        self.assertTrue(result.cancelled)
+        self.assertEqual(result.text, "012")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import unittest
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from syllabus import (
+    COURSE_INFO, DEADLINES, OTHER, PREREQUISITES, IntentClassifier, SyllabusRouter, classify, find_course,
+)
+
+NOW = datetime(2025, 10, 1, 12, 0, tzinfo=timezone.utc)
+
+COURSES = {
+    "CSC 4350": ("CSC 4350", "Software Engineering", 4, "Team project course."),
+    "CSC 2720": ("CSC 2720", "Data Structures", 3, None),
+    "CSC 1301": ("CSC 1301", "Principles of Computer Science I", 4, None),
+}
+PREREQS = {"CSC 4350": ["CSC 2720", "CSC 3210"]}
+DEADLINE_ROWS = [
+    ("CSC 4350", "Sprint 1 demo", NOW - timedelta(days=3), None),
+    ("CSC 4350", "Midterm exam", NOW + timedelta(days=7), "Chapters 1-5."),
+    ("CSC 4350", "Final project", NOW + timedelta(days=40), None),
+]
+
+
+class FakeCursor:
+    def __init__(self, queries):
+        self.queries = queries
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        self.queries.append(sql)
+        code = params[0]
+        if "FROM deadlines" in sql:
+            after, limit = params[1], params[2]
+            rows = sorted((r for r in DEADLINE_ROWS if r[0] == code and r[2] >= after), key=lambda r: r[2])
+            self.rows = [r[1:] for r in rows][:limit]
+        elif "prerequisites" in sql:
+            if code not in COURSES:
+                self.rows = []
+            else:
+                prereqs = PREREQS.get(code) or [None]
+                self.rows = [(p, COURSES[p][1] if p in COURSES else None) for p in prereqs]
+        else:
+            self.rows = [COURSES[code]] if code in COURSES else []
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+
+class FakeConn:
+    def __init__(self):
+        self.queries = []
+
+    def cursor(self):
+        return FakeCursor(self.queries)
+
+
+class TestSyllabus(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = FakeConn()
+
+        @contextmanager
+        def connect():
+            yield self.conn
+
+        self.router = SyllabusRouter(connect, now=lambda: NOW)
+
+    def test_find_course(self):
+        self.assertEqual(find_course("prereqs for csc4350?"), "CSC 4350")
+        self.assertEqual(find_course("What about Csc-2720"), "CSC 2720")
+        self.assertIsNone(find_course("what is a use case"))
+
+    def test_classification(self):
+        classifier = IntentClassifier()
+        cases = {
+            "What are the prerequisites for CSC 4350?": PREREQUISITES,
+            "what classes should I take before this one": PREREQUISITES,
+            "When is the midterm?": DEADLINES,
+            "When do we present our project?": DEADLINES,
+            "How many credits is CSC 4350?": COURSE_INFO,
+            "What is CSC 2720?": COURSE_INFO,
+            "What is software engineering?": OTHER,
+            "The build failed due to a missing import, why?": OTHER,
+            "Tell me about coupling and cohesion": OTHER,
+        }
+        for question, intent in cases.items():
+            with self.subTest(question=question):
+                self.assertEqual(classify(question, classifier), intent)
+
+    def test_prerequisites_answered_from_sql(self):
+        routed = self.router.answer("What are the prerequisites for CSC 4350?")
+        self.assertEqual(routed.intent, PREREQUISITES)
+        text = routed.text.lower()
+        for code in ("csc 2720", "csc 3210"):
+            self.assertIn(code, text)
+        self.assertIn("data structures", text)
+        self.assertEqual(self.router.answer("prereqs for CSC 1301?").text, "CSC 1301 has no prerequisites.")
+        self.assertIsNone(self.router.answer("What are the prerequisites for CSC 9999?"))
+
+    def test_deadlines(self):
+        midterm = self.router.answer("When is the midterm?")
+        self.assertTrue(midterm.text.startswith("Midterm exam for CSC 4350 is due"))
+        self.assertIn("Chapters 1-5.", midterm.text)
+        listing = self.router.answer("What are the upcoming deadlines?").text
+        self.assertEqual(listing.count("\n- "), 2)  # the past demo is left out
+        self.assertIsNone(self.router.answer("What are the deadlines for CSC 2720?"))
+        self.assertEqual(self.router.answer("What's due this week?").text, listing)
+        # Naming a deadline that is not in the table falls through to the LLM.
+        self.assertIsNone(self.router.answer("When is the lab report due?"))
+        self.assertIsNone(self.router.answer("When is the quiz due?"))
+
+    def test_other_questions_fall_through_without_a_query(self):
+        self.assertIsNone(self.router.answer("Explain the waterfall model"))
+        self.assertEqual(self.conn.queries, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
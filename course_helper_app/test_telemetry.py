@@ -0,0 +1,132 @@
+import json
+import threading
+import time
+import unittest
+import urllib.request
+from unittest import mock
+
+import telemetry
+from streaming import stream_via_gateway
+from telemetry import NOOP_SPAN, REGISTRY, SamplingProfiler, count, new_trace, span, start_metrics_server, timed
+
+
+class FakeStream:
+    def __init__(self, deltas):
+        self._deltas = iter(deltas)
+        self.closed = False
+
+    def __iter__(self):
+        return self._deltas
+
+    def close(self):
+        self.closed = True
+
+
+class FakeGateway:
+    def stream(self, messages, model, priority):
+        return FakeStream(["Pointers ", "hold ", "addresses."])
+
+
+class TestTelemetry(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(telemetry, "ENABLED", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        REGISTRY.reset()
+        self.addCleanup(REGISTRY.reset)
+
+    def test_disabled_spans_are_shared_noops(self):
+        with mock.patch.object(telemetry, "ENABLED", False):
+            self.assertIs(span("db.connection", wait_ms=1), NOOP_SPAN)
+            with span("x") as s:
+                s.set(rows=3)
+            count("llm_tokens_total", 5, kind="prompt")
+        self.assertEqual(REGISTRY.snapshot(), {"spans": {}, "counters": []})
+
+    def test_spans_feed_histograms(self):
+        for _ in range(3):
+            with span("retrieval.search"):
+                pass
+        with self.assertRaises(ValueError):
+            with span("retrieval.search"):
+                raise ValueError("boom")
+        stats = REGISTRY.snapshot()
+        self.assertEqual(stats["spans"]["retrieval.search"]["count"], 4)
+        self.assertEqual(stats["spans"]["retrieval.search"]["buckets"]["0.005"], 4)
+        self.assertEqual(stats["counters"], [{"name": "span_errors_total", "labels": {"span": "retrieval.search"}, "value": 1}])
+
+    def test_prometheus_buckets_are_cumulative(self):
+        REGISTRY.observe("llm.stream", 0.2)
+        REGISTRY.observe("llm.stream", 3.0)
+        REGISTRY.inc("llm_tokens_total", 42, kind="completion")
+        text = REGISTRY.render_prometheus()
+        self.assertIn('coursehelper_span_seconds_bucket{span="llm.stream",le="0.1"} 0', text)
+        self.assertIn('coursehelper_span_seconds_bucket{span="llm.stream",le="0.25"} 1', text)
+        self.assertIn('coursehelper_span_seconds_bucket{span="llm.stream",le="+Inf"} 2', text)
+        self.assertIn('coursehelper_span_seconds_count{span="llm.stream"} 2', text)
+        self.assertIn('coursehelper_llm_tokens_total{kind="completion"} 42', text)
+
+    def test_trace_log_lines_carry_trace_id(self):
+        trace_id = new_trace()
+        with mock.patch.object(telemetry, "TRACE_LOG", True), self.assertLogs("course_helper.trace") as logs:
+            with span("render.transcript", messages=12):
+                pass
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line["trace"], line["span"], line["messages"]), (trace_id, "render.transcript", 12))
+
+    def test_timed_decorator(self):
+        @timed("grading.grade")
+        def grade():
+            return "ok"
+
+        self.assertEqual(grade(), "ok")
+        self.assertEqual(REGISTRY.snapshot()["spans"]["grading.grade"]["count"], 1)
+
+    def test_stream_span_counts_completion_tokens(self):
+        result = stream_via_gateway(FakeGateway(), [], lambda html: None, interval=0)
+        self.assertEqual(result.text, "Pointers hold addresses.")
+        stats = REGISTRY.snapshot()
+        self.assertEqual(stats["spans"]["llm.stream"]["count"], 1)
+        self.assertGreater(stats["counters"][0]["value"], 0)
+
+    def test_metrics_endpoint(self):
+        REGISTRY.observe("rerun", 0.05)
+        server = start_metrics_server(0, host="127.0.0.1")
+        self.addCleanup(server.shutdown)
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{base}/metrics") as resp:
+            self.assertIn('span="rerun"', resp.read().decode())
+        with urllib.request.urlopen(f"{base}/metrics.json") as resp:
+            self.assertEqual(json.load(resp)["spans"]["rerun"]["count"], 1)
+
+    def test_metrics_servers_of_several_workers_take_successive_ports(self):
+        first = start_metrics_server(0, host="127.0.0.1")
+        self.addCleanup(first.shutdown)
+        port = first.server_address[1]
+        second = start_metrics_server(port, host="127.0.0.1", ports=4)
+        self.addCleanup(second.shutdown)
+        self.assertGreater(second.server_address[1], port)
+        with self.assertRaises(OSError):
+            start_metrics_server(port, host="127.0.0.1")
+
+    def test_sampling_profiler_collects_stacks(self):
+        stop = threading.Event()
+
+        def busy_loop():
+            while not stop.is_set():
+                sum(range(1000))
+
+        worker = threading.Thread(target=busy_loop)
+        worker.start()
+        profiler = SamplingProfiler(interval=0.001).start()
+        time.sleep(0.05)
+        profiler.stop()
+        stop.set()
+        worker.join()
+        self.assertGreater(profiler.samples, 0)
+        self.assertTrue(any("busy_loop" in stack for stack in profiler.stacks))
+
+
+if __name__ == "__main__":
+    unittest.main()
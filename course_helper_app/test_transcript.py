@@ -0,0 +1,46 @@
+import unittest
+from unittest import mock
+
+import transcript
+from transcript import hidden_count, make_message, message_html, render_message_html, transcript_html
+
+TS = "2025-10-01T14:05:00-04:00"
+
+
+class TestTranscript(unittest.TestCase):
+
+    def test_message_html_is_escaped_and_timestamped(self):
+        html = render_message_html("user", "<b>hi</b>", TS)
+        self.assertIn("user-row", html)
+        self.assertIn("&lt;b&gt;hi&lt;/b&gt;", html)
+        self.assertIn("2:05 PM", html)
+        self.assertIn("assistant-row", render_message_html("assistant", "ok", TS))
+
+    def test_html_is_rendered_once(self):
+        messages = [make_message("user", f"q{i}", TS) for i in range(5)]
+        with mock.patch.object(transcript, "render_message_html") as render:
+            transcript_html(messages)
+        render.assert_not_called()
+
+    def test_legacy_messages_are_rendered_lazily(self):
+        message = {"role": "assistant", "content": "old", "ts": TS}
+        html = message_html(message)
+        self.assertIs(message["html"], html)
+        self.assertIn("old", html)
+
+    def test_window_keeps_the_latest_messages(self):
+        messages = [make_message("user", f"message {i}", TS) for i in range(10)]
+        html = transcript_html(messages, window=3)
+        self.assertNotIn("message 6", html)
+        self.assertIn("message 7", html)
+        self.assertIn("message 9", html)
+        self.assertEqual(hidden_count(messages, 3), 7)
+        self.assertEqual(hidden_count(messages, 50), 0)
+
+    def test_extra_fields_are_kept(self):
+        message = make_message("assistant", "a", TS, ttft=0.25)
+        self.assertEqual(message["ttft"], 0.25)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+import importlib
+import os
+import socket
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from vector_manifest import VectorManifest, resolve_store_id, sync_store_files
+
+
+class APIError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def page(items, has_more=False):
+    return SimpleNamespace(data=items, has_more=has_more, last_id=items[-1].id if items else None)
+
+
+class FakeFiles:
+    """``vector_stores.files`` listing ``self.items`` oldest first, two per page."""
+
+    def __init__(self):
+        self.items = []
+        self.calls = []
+
+    def add(self, file_id, status="completed"):
+        self.items.append(SimpleNamespace(id=file_id, status=status, created_at=len(self.items), usage_bytes=10))
+
+    def list(self, vector_store_id, order="desc", limit=20, after=None):
+        self.calls.append(after)
+        ids = [f.id for f in self.items]
+        if after and after not in ids:
+            raise APIError(400)
+        start = ids.index(after) + 1 if after else 0
+        chunk = self.items[start:start + 2]
+        return page(chunk, has_more=start + 2 < len(self.items))
+
+    def retrieve(self, file_id, vector_store_id):
+        self.calls.append(("retrieve", file_id))
+        for f in self.items:
+            if f.id == file_id:
+                return f
+        raise APIError(404)
+
+
+class FakeClient:
+    def __init__(self, stores):
+        self.store_pages = stores
+        self.store_calls = 0
+        self.files = FakeFiles()
+        self.vector_stores = SimpleNamespace(list=self._list_stores, files=self.files)
+
+    def _list_stores(self, after=None):
+        self.store_calls += 1
+        return self.store_pages[int(after or 0)]
+
+
+class TestVectorManifest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "manifest.sqlite3")
+        self.now = [1000.0]
+        self.manifest = VectorManifest(self.path, clock=lambda: self.now[0])
+        self.addCleanup(self.manifest.close)
+        stores = [
+            SimpleNamespace(data=[SimpleNamespace(id="vs_a", name="other")], has_more=True, last_id="1"),
+            SimpleNamespace(data=[SimpleNamespace(id="vs_1", name="vector1")], has_more=False, last_id="vs_1"),
+        ]
+        self.client = FakeClient(stores)
+
+    def test_store_id_is_resolved_once(self):
+        self.assertEqual(resolve_store_id(self.client, self.manifest, "vector1"), "vs_1")
+        self.assertEqual(self.client.store_calls, 2)
+        reopened = VectorManifest(self.path)
+        self.addCleanup(reopened.close)
+        self.assertEqual(resolve_store_id(self.client, reopened, "vector1"), "vs_1")
+        self.assertEqual(self.client.store_calls, 2)
+        self.assertIsNone(resolve_store_id(self.client, self.manifest, "missing"))
+
+    def test_file_sync_is_incremental(self):
+        for i in range(5):
+            self.client.files.add(f"file_{i}")
+        self.assertEqual(sync_store_files(self.client, self.manifest, "vs_1"), 5)
+        self.assertEqual([f.id for f in self.manifest.files("vs_1")], [f"file_{i}" for i in range(5)])
+
+        self.client.files.calls.clear()
+        self.client.files.add("file_5")
+        self.assertEqual(sync_store_files(self.client, self.manifest, "vs_1"), 1)
+        self.assertEqual(self.client.files.calls, ["file_4"])
+        self.assertEqual(len(self.manifest.files("vs_1")), 6)
+
+        self.assertEqual(sync_store_files(self.client, self.manifest, "vs_1"), 0)
+        self.assertEqual(self.manifest.sync_state("vs_1")[0], "file_5")
+
+    def test_full_sync_drops_deleted_files(self):
+        for i in range(3):
+            self.client.files.add(f"file_{i}")
+        sync_store_files(self.client, self.manifest, "vs_1")
+        del self.client.files.items[0]
+        sync_store_files(self.client, self.manifest, "vs_1")
+        self.assertEqual(len(self.manifest.files("vs_1")), 3)  # incremental sync can't see deletions
+
+        self.now[0] += 2 * 24 * 3600  # stale: falls back to a full sync
+        sync_store_files(self.client, self.manifest, "vs_1")
+        self.assertEqual([f.id for f in self.manifest.files("vs_1")], ["file_1", "file_2"])
+
+    def test_files_in_progress_are_refetched(self):
+        self.client.files.add("file_0", status="in_progress")
+        self.client.files.add("file_1", status="in_progress")
+        sync_store_files(self.client, self.manifest, "vs_1")
+        self.assertEqual(self.manifest.pending_files("vs_1"), ["file_0", "file_1"])
+
+        self.client.files.items[0].status = "completed"
+        self.client.files.items[1].status = "failed"
+        self.client.files.add("file_2")
+        self.client.files.calls.clear()
+        self.assertEqual(sync_store_files(self.client, self.manifest, "vs_1"), 3)
+        self.assertEqual(self.client.files.calls, ["file_1", ("retrieve", "file_0"), ("retrieve", "file_1")])
+        self.assertEqual({f.id: f.status for f in self.manifest.files("vs_1")},
+                         {"file_0": "completed", "file_1": "failed", "file_2": "completed"})
+        self.assertEqual(self.manifest.pending_files("vs_1"), [])
+
+    def test_deleted_pending_file_is_dropped(self):
+        self.client.files.add("file_0")
+        self.client.files.add("file_1", status="in_progress")
+        self.client.files.add("file_2")
+        sync_store_files(self.client, self.manifest, "vs_1")
+        del self.client.files.items[1]
+        sync_store_files(self.client, self.manifest, "vs_1")
+        self.assertEqual([f.id for f in self.manifest.files("vs_1")], ["file_0", "file_2"])
+
+    def test_rejected_cursor_falls_back_to_a_full_sync(self):
+        for i in range(3):
+            self.client.files.add(f"file_{i}")
+        sync_store_files(self.client, self.manifest, "vs_1")
+        del self.client.files.items[2]  # the cursor file
+        self.client.files.calls.clear()
+        self.assertEqual(sync_store_files(self.client, self.manifest, "vs_1"), 2)
+        self.assertEqual(self.client.files.calls, ["file_2", None])
+        self.assertEqual([f.id for f in self.manifest.files("vs_1")], ["file_0", "file_1"])
+        self.assertEqual(self.manifest.sync_state("vs_1")[0], "file_1")
+
+    def test_forget_store_clears_its_files(self):
+        self.manifest.remember_store("vector1", "vs_1")
+        self.client.files.add("file_0")
+        sync_store_files(self.client, self.manifest, "vs_1")
+        self.manifest.forget_store("vector1")
+        self.assertIsNone(self.manifest.store_id("vector1"))
+        self.assertEqual(self.manifest.files("vs_1"), [])
+        self.assertIsNone(self.manifest.sync_state("vs_1"))
+
+    def test_prototype_import_does_no_network_io(self):
+        def refuse(*args, **kwargs):
+            raise AssertionError("network I/O during import")
+
+        sys.modules.pop("VectorFetchPrototype", None)
+        self.addCleanup(sys.modules.pop, "VectorFetchPrototype", None)
+        with mock.patch.dict(os.environ, {"OPENAI_API_KEY": "test", "VECTOR_MANIFEST_PATH": self.path}), \
+                mock.patch.object(socket.socket, "connect", refuse):
+            module = importlib.import_module("VectorFetchPrototype")
+        self.assertIsNone(module._store_id)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,25 @@
+"""Local token counting.
+
+Uses tiktoken when it is installed and otherwise a regex approximation that
+splits words into pieces of up to four characters, which tracks BPE token
+counts for English text closely enough for budgeting.
+"""
+
+import re
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:  # tiktoken missing or its encoding could not be loaded
+    _encoding = None
+
+_APPROX_TOKEN_RE = re.compile(r"\w{1,4}|[^\w\s]")
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(_APPROX_TOKEN_RE.findall(text))
@@ -0,0 +1,110 @@
+"""Chat transcript rendering.
+
+Each message's bubble HTML is rendered once, when the message is added, and
+stored on the message as ``html``. A rerun then only joins the stored HTML of
+the most recent ``window`` messages and emits it as a single markdown block,
+so its cost depends on the window size rather than the length of the chat.
+"""
+
+from datetime import datetime
+from html import escape
+from typing import List, Optional
+
+from telemetry import span
+
+try:
+    from zoneinfo import ZoneInfo
+except Exception:
+    ZoneInfo = None
+
+TZ_NAME = "America/New_York"
+
+# Messages shown per rerun; "Load earlier messages" widens it by this much.
+HISTORY_WINDOW = 40
+
+
+def get_tz():
+    if ZoneInfo is None:
+        return None
+    try:
+        return ZoneInfo(TZ_NAME)
+    except Exception:
+        return None
+
+
+APP_TZ = get_tz()
+
+
+def now_in_app_tz() -> datetime:
+    if APP_TZ:
+        return datetime.now(APP_TZ)
+    return datetime.now()
+
+
+def format_ts(dt: datetime) -> str:
+    """Format datetime to 'H:MM AM/PM' cross-platform."""
+    try:
+        return dt.strftime("%-I:%M %p")
+    except Exception:
+        return dt.strftime("%#I:%M %p")
+
+
+def parse_ts(ts_iso: Optional[str]) -> datetime:
+    """Parse an ISO timestamp into APP_TZ; a missing or bad value means 'now'."""
+    if ts_iso:
+        try:
+            dt = datetime.fromisoformat(ts_iso.replace("Z", "+00:00"))
+            if APP_TZ:
+                # Stored messages come back from Postgres in UTC.
+                dt = dt.replace(tzinfo=APP_TZ) if dt.tzinfo is None else dt.astimezone(APP_TZ)
+            return dt
+        except Exception:
+            pass
+    return now_in_app_tz()
+
+
+def render_message_html(role: str, text: str, ts_iso: Optional[str] = None) -> str:
+    """Bubble HTML for one message, with its timestamp underneath."""
+    time_str = format_ts(parse_ts(ts_iso))
+    safe_text = escape(text)
+    if role == "user":
+        row_class, meta_class = "user-row", "user-meta"
+        content_html = f'<span class="avatar-emoji">🧑</span><div class="bubble user-bubble">{safe_text}</div>'
+    else:
+        row_class, meta_class = "assistant-row", "assistant-meta"
+        content_html = f'<div class="bubble assistant-bubble">{safe_text}</div><span class="avatar-emoji">🤖</span>'
+    return (
+        f'<div class="chat-row {row_class}">{content_html}</div>\n'
+        f'<div class="chat-meta {meta_class}">{time_str}</div>'
+    )
+
+
+def make_message(role: str, content: str, ts_iso: str, **extra) -> dict:
+    """A chat message with its HTML pre-rendered."""
+    return {
+        "role": role,
+        "content": content,
+        "ts": ts_iso,
+        "html": render_message_html(role, content, ts_iso),
+        **extra,
+    }
+
+
+def message_html(message: dict) -> str:
+    """The stored HTML of ``message``, rendering it once if it has none yet."""
+    html = message.get("html")
+    if html is None:
+        html = render_message_html(message.get("role", "assistant"), message.get("content", ""), message.get("ts"))
+        message["html"] = html
+    return html
+
+
+def transcript_html(messages: List[dict], window: int = HISTORY_WINDOW) -> str:
+    """HTML of the last ``window`` messages as one block."""
+    start = max(0, len(messages) - window)
+    with span("render.transcript", messages=len(messages) - start):
+        return "\n".join(message_html(messages[i]) for i in range(start, len(messages)))
+
+
+def hidden_count(messages: List[dict], window: int = HISTORY_WINDOW) -> int:
+    return max(0, len(messages) - window)
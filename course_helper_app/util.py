@@ -0,0 +1,37 @@
+"""Helpers shared by the batch jobs (ingest.py, rubrics.py, bulk_upload.py)."""
+
+import hashlib
+import random
+import time
+from pathlib import Path
+
+import openai
+
+# Errors a later attempt may not hit: the request did not get through, was
+# rate limited or failed on the server. Other API errors (4xx) are final.
+TRANSIENT_ERRORS = (
+    openai.APIConnectionError,  # includes APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+def file_hash(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def with_retries(fn, attempts: int = 4, base_delay: float = 1.0, sleep=time.sleep, retry_on=TRANSIENT_ERRORS):
+    """Call ``fn``, retrying errors in ``retry_on`` with exponential backoff and full jitter."""
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except retry_on:
+            if attempt == attempts - 1:
+                raise
+            sleep(random.uniform(0, base_delay * 2 ** attempt))
@@ -0,0 +1,261 @@
+"""Local manifest of the OpenAI vector store used by VectorFetchPrototype.py.
+
+Looking a store up by name means paging through every vector store in the
+account, and listing its files means paging through every file. Both results
+are kept in a small SQLite file instead:
+
+* the store name -> id mapping is read from the manifest at startup and only
+  looked up again when the API reports the cached id as missing,
+* the file list is synced incrementally: files are listed oldest first and
+  the last file id seen is stored as a cursor, so a sync only fetches files
+  added since the previous one. Files still being processed are fetched
+  again one by one on every sync, so their status does not stay stale. A
+  full resync (which also notices deleted files) runs on request, once the
+  last one is older than ``full_sync_after`` seconds, or when the API
+  rejects the cursor (e.g. because that file was deleted).
+"""
+
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stores (
+    name TEXT PRIMARY KEY,
+    id TEXT NOT NULL,
+    resolved_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS store_files (
+    store_id TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    status TEXT,
+    created_at INTEGER,
+    usage_bytes INTEGER,
+    sha256 TEXT,
+    filename TEXT,
+    PRIMARY KEY (store_id, file_id)
+);
+CREATE TABLE IF NOT EXISTS file_sync (
+    store_id TEXT PRIMARY KEY,
+    cursor TEXT,
+    synced_at REAL NOT NULL,
+    full_synced_at REAL NOT NULL
+);
+"""
+
+# Columns added to store_files after the first release of the manifest.
+_ADDED_COLUMNS = {"sha256": "TEXT", "filename": "TEXT"}
+
+# A full file resync runs at least this often (seconds).
+FULL_SYNC_AFTER = 24 * 3600
+
+# File statuses that no longer change; files in any other are re-fetched.
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+
+@dataclass
+class StoreFile:
+    id: str
+    status: Optional[str]
+    created_at: Optional[int]
+    usage_bytes: Optional[int]
+    sha256: Optional[str] = None
+    filename: Optional[str] = None
+
+
+class VectorManifest:
+    def __init__(self, path, clock=time.time):
+        self.path = str(path)
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(store_files)")}
+        for name, kind in _ADDED_COLUMNS.items():
+            if name not in columns:
+                self._db.execute(f"ALTER TABLE store_files ADD COLUMN {name} {kind}")
+
+    def close(self):
+        self._db.close()
+
+    # -- stores --------------------------------------------------------------
+
+    def store_id(self, name: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT id FROM stores WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def remember_store(self, name: str, store_id: str):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO stores (name, id, resolved_at) VALUES (?, ?, ?)",
+                (name, store_id, self.clock()),
+            )
+
+    def forget_store(self, name: str):
+        with self._lock, self._db:
+            row = self._db.execute("SELECT id FROM stores WHERE name = ?", (name,)).fetchone()
+            self._db.execute("DELETE FROM stores WHERE name = ?", (name,))
+            if row:
+                self._db.execute("DELETE FROM store_files WHERE store_id = ?", (row[0],))
+                self._db.execute("DELETE FROM file_sync WHERE store_id = ?", (row[0],))
+
+    # -- files ---------------------------------------------------------------
+
+    def files(self, store_id: str) -> List[StoreFile]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT file_id, status, created_at, usage_bytes, sha256, filename FROM store_files "
+                "WHERE store_id = ? ORDER BY created_at, file_id",
+                (store_id,),
+            ).fetchall()
+        return [StoreFile(*row) for row in rows]
+
+    def known_hashes(self, store_id: str) -> set:
+        """sha256 digests of the store's files attached with one (failed ones excluded)."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT sha256 FROM store_files WHERE store_id = ? AND sha256 IS NOT NULL "
+                "AND status IS NOT 'failed'",
+                (store_id,),
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def pending_files(self, store_id: str) -> List[str]:
+        """Ids of the store's files whose status may still change."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT file_id FROM store_files WHERE store_id = ? AND "
+                f"(status IS NULL OR status NOT IN ({', '.join('?' * len(TERMINAL_STATUSES))})) ORDER BY file_id",
+                (store_id, *TERMINAL_STATUSES),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def sync_state(self, store_id: str):
+        """``(cursor, synced_at, full_synced_at)`` or None if never synced."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT cursor, synced_at, full_synced_at FROM file_sync WHERE store_id = ?", (store_id,)
+            ).fetchone()
+
+    def add_files(self, store_id: str, files):
+        """Record ``files`` (API file objects) without moving the sync cursor."""
+        with self._lock, self._db:
+            self._upsert_files(store_id, files)
+
+    def apply_sync(self, store_id: str, files, cursor: Optional[str], full: bool, removed=()):
+        """Store the result of a sync; a full sync replaces the file list.
+
+        ``removed`` lists ids of files the API no longer has.
+        """
+        now = self.clock()
+        with self._lock, self._db:
+            if full:
+                self._db.execute("DELETE FROM store_files WHERE store_id = ?", (store_id,))
+            self._db.executemany(
+                "DELETE FROM store_files WHERE store_id = ? AND file_id = ?", [(store_id, f) for f in removed]
+            )
+            self._upsert_files(store_id, files)
+            previous = self._db.execute(
+                "SELECT cursor, full_synced_at FROM file_sync WHERE store_id = ?", (store_id,)
+            ).fetchone()
+            if previous and not full:
+                cursor = cursor or previous[0]
+            self._db.execute(
+                "INSERT OR REPLACE INTO file_sync (store_id, cursor, synced_at, full_synced_at) VALUES (?, ?, ?, ?)",
+                (store_id, cursor, now, now if full or not previous else previous[1]),
+            )
+
+    def _upsert_files(self, store_id: str, files):
+        rows = []
+        for f in files:
+            attributes = getattr(f, "attributes", None) or {}
+            rows.append((
+                store_id, f.id, getattr(f, "status", None), getattr(f, "created_at", None),
+                getattr(f, "usage_bytes", None), attributes.get("sha256"), attributes.get("filename"),
+            ))
+        self._db.executemany(
+            "INSERT OR REPLACE INTO store_files "
+            "(store_id, file_id, status, created_at, usage_bytes, sha256, filename) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+
+def find_vector_store(client, name: str):
+    """Page through the account's vector stores for one called ``name``."""
+    cursor = None
+    while True:
+        page = client.vector_stores.list(after=cursor) if cursor else client.vector_stores.list()
+        for vs in page.data:
+            if vs.name == name:
+                return vs
+        if not page.has_more:
+            return None
+        cursor = page.last_id
+
+
+def resolve_store_id(client, manifest: VectorManifest, name: str, refresh: bool = False) -> Optional[str]:
+    """Store id for ``name`` from the manifest, looked up through the API on a miss."""
+    if not refresh:
+        store_id = manifest.store_id(name)
+        if store_id:
+            return store_id
+    store = find_vector_store(client, name)
+    if store is None:
+        manifest.forget_store(name)
+        return None
+    manifest.remember_store(name, store.id)
+    return store.id
+
+
+def _status_code(exc) -> Optional[int]:
+    """HTTP status of an API error (``openai.APIStatusError``), else None."""
+    return getattr(exc, "status_code", None)
+
+
+def _list_files(client, store_id: str, cursor: Optional[str]):
+    """Every file of the store after ``cursor``, oldest first, and the new cursor."""
+    fetched = []
+    while True:
+        kwargs = {"vector_store_id": store_id, "order": "asc", "limit": 100}
+        if cursor:
+            kwargs["after"] = cursor
+        page = client.vector_stores.files.list(**kwargs)
+        fetched.extend(page.data)
+        if page.data:
+            cursor = page.data[-1].id
+        if not page.has_more:
+            return fetched, cursor
+
+
+def sync_store_files(client, manifest: VectorManifest, store_id: str, full: bool = False,
+                     full_sync_after: float = FULL_SYNC_AFTER) -> int:
+    """Bring the manifest's file list up to date; returns the number of files fetched."""
+    state = manifest.sync_state(store_id)
+    if state is None or state[0] is None or manifest.clock() - state[2] > full_sync_after:
+        full = True
+    fetched, removed = [], []
+    if not full:
+        try:
+            fetched, cursor = _list_files(client, store_id, state[0])
+        except Exception as e:
+            if _status_code(e) not in (400, 404):
+                raise
+            full = True  # the cursor file is gone
+    if full:
+        fetched, cursor = _list_files(client, store_id, None)
+    else:
+        seen = {f.id for f in fetched}
+        for file_id in manifest.pending_files(store_id):
+            if file_id in seen:
+                continue
+            try:
+                fetched.append(client.vector_stores.files.retrieve(file_id=file_id, vector_store_id=store_id))
+            except Exception as e:
+                if _status_code(e) != 404:
+                    raise
+                removed.append(file_id)
+    manifest.apply_sync(store_id, fetched, cursor, full, removed)
+    return len(fetched)
@@ -0,0 +1,26 @@
+"""Small helpers for passing embeddings to and from pgvector."""
+
+import math
+from typing import Sequence
+
+
+def vector_literal(vec: Sequence[float]) -> str:
+    """Format ``vec`` as a pgvector literal, to be used with ``%s::vector``."""
+    return "[" + ",".join(f"{x:.7g}" for x in vec) + "]"
+
+
+def cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    na = math.sqrt(sum(x * x for x in a))
+    nb = math.sqrt(sum(y * y for y in b))
+    if not na or not nb:
+        return 0.0
+    return dot / (na * nb)
+
+
+def is_zero(vec: Sequence[float]) -> bool:
+    """True for the all-zero vector, e.g. the embedding of a text without words.
+
+    It has no direction: pgvector's cosine distance to it is NaN.
+    """
+    return not any(vec)